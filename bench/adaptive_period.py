@@ -0,0 +1,180 @@
+# Simulation of the beacon traffic on one segment with a fixed and with
+# an adaptive beacon period
+#
+#   python3 bench/adaptive_period.py
+#   python3 bench/adaptive_period.py --bounds 1:30 --duration 1800 --json
+#
+# Nodes join and leave the segment following each scenario. One node
+# that never leaves runs the actual NeighborTable and PeriodController
+# on a simulated clock, every node of the segment sees the same
+# neighborhood and is assumed to pick the same period.
+
+import argparse
+import heapq
+import json
+import os
+import random
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+from ipnd.adaptive import PeriodController, table_counters
+from ipnd.neighbors import NeighborTable
+from ipnd.scheduler import JITTER
+
+FIXED_PERIOD = 3
+
+
+def stable(nodes: int):
+    def membership(duration, rng):
+        return [(0.0, "join", i) for i in range(nodes)]
+    return membership
+
+
+def churning(nodes: int, lifetime: float):
+    # Poisson arrivals keeping `nodes` nodes present on average, each
+    # staying an exponentially distributed time
+    def membership(duration, rng):
+        events = []
+        node = 0
+        for _ in range(nodes):
+            events.append((0.0, "join", node))
+            events.append((rng.expovariate(1 / lifetime), "leave", node))
+            node += 1
+
+        t = 0.0
+        while True:
+            t += rng.expovariate(nodes / lifetime)
+            if t >= duration:
+                return events
+            events.append((t, "join", node))
+            events.append((t + rng.expovariate(1 / lifetime), "leave", node))
+            node += 1
+    return membership
+
+
+def growing(start: int, end: int, ramp: float):
+    def membership(duration, rng):
+        return [(0.0 if i < start else ramp * (i - start) / (end - start), "join", i)
+                for i in range(end)]
+    return membership
+
+
+SCENARIOS = {
+    "dense-stable": stable(150),
+    "dense-churn": churning(100, 300),
+    "growing": growing(5, 150, 450),
+    "sparse-stable": stable(4),
+    "sparse-churn": churning(6, 40),
+}
+
+
+def simulate(membership: list, duration: float, bounds, seed: int) -> dict:
+    # bounds is None for the fixed period
+    rng = random.Random(seed)
+    table = NeighborTable()
+    controller = None
+    period = FIXED_PERIOD
+
+    if bounds is not None:
+        controller = PeriodController(FIXED_PERIOD, *bounds, clock=None)
+        controller.watch(table_counters(table))
+        period = controller.period
+
+    events = [(t, 1, kind, node) for (t, kind, node) in membership]
+    if controller is not None:
+        events.append((0.0, 2, "adjust", None))
+    heapq.heapify(events)
+
+    present = set()
+    next_beacon = {}
+    beacons = 0
+    discovery = []
+    periods = []
+
+    while len(events) > 0:
+        (t, _, kind, node) = heapq.heappop(events)
+        if t >= duration:
+            break
+
+        table.expire(t)
+
+        if kind == "join":
+            present.add(node)
+            # Time until the new node heard every node already there
+            if len(next_beacon) > 0:
+                discovery.append(max(next_beacon.values()) - t)
+            first = t + rng.uniform(0, JITTER * period)
+            next_beacon[node] = first
+            heapq.heappush(events, (first, 0, "beacon", node))
+
+        elif kind == "leave":
+            present.discard(node)
+            next_beacon.pop(node, None)
+
+        elif kind == "beacon":
+            if node not in present or next_beacon.get(node) != t:
+                continue
+            beacons += 1
+            table.update("dtn://node-{}.dtn".format(node), "tcpclv3:10.0.0.1:4556", period, now=t)
+            following = t + period * (1 + rng.uniform(0, JITTER))
+            next_beacon[node] = following
+            heapq.heappush(events, (following, 0, "beacon", node))
+
+        elif kind == "adjust":
+            period = controller.adjust(t)
+            periods.append(period)
+            heapq.heappush(events, (t + controller.interval, 2, "adjust", None))
+
+    discovery.sort()
+
+    return {
+        "beacons": beacons,
+        "beacons_per_sec": beacons / duration,
+        "discovery_mean": sum(discovery) / len(discovery) if discovery else None,
+        "discovery_p95": discovery[int(len(discovery) * 0.95)] if discovery else None,
+        "period_mean": sum(periods) / len(periods) if periods else FIXED_PERIOD,
+        "period_final": period,
+    }
+
+
+def parse_bounds(value: str):
+    (min_period, _, max_period) = value.partition(":")
+    return (int(min_period), int(max_period))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="adaptive beacon period simulation")
+    parser.add_argument("--bounds", type=parse_bounds, default=(1, 30), metavar="MIN:MAX")
+    parser.add_argument("--duration", type=float, default=900)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--json", action="store_true", help="print results as JSON")
+    args = parser.parse_args()
+
+    results = {}
+
+    for (name, scenario) in SCENARIOS.items():
+        membership = scenario(args.duration, random.Random(args.seed))
+        fixed = simulate(membership, args.duration, None, args.seed)
+        adaptive = simulate(membership, args.duration, args.bounds, args.seed)
+        results[name] = {
+            "fixed": fixed,
+            "adaptive": adaptive,
+            "traffic_saved": 1 - adaptive["beacons"] / fixed["beacons"],
+        }
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+
+    print("{:<14} {:>10} {:>10} {:>8} {:>8} {:>12} {:>12}".format(
+        "scenario", "fixed b/s", "adapt b/s", "saved", "period", "fixed disc", "adapt disc"))
+    for (name, result) in results.items():
+        print("{:<14} {:>10.1f} {:>10.1f} {:>7.0f}% {:>8.1f} {:>11.1f}s {:>11.1f}s".format(
+            name, result["fixed"]["beacons_per_sec"], result["adaptive"]["beacons_per_sec"],
+            result["traffic_saved"] * 100, result["adaptive"]["period_mean"],
+            result["fixed"]["discovery_mean"] or 0, result["adaptive"]["discovery_mean"] or 0))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,156 @@
+# Throughput and peak memory of the capture summaries of decode.py, for
+# growing synthetic captures
+#
+#   python3 bench/capture.py
+#   python3 bench/capture.py --beacons 100000 1000000 --workers 1 4 --json
+#
+# Captures are pcap files of Ethernet frames, or beacon dumps with
+# --dump. Neighbors miss some beacons, restart now and then, and send
+# with some jitter around their period. Each run is a process of its
+# own, its peak memory covers the processes of its pool.
+
+import argparse
+import ipaddress
+import json
+import multiprocessing
+import os
+import random
+import resource
+import struct
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+from ipnd.capture import DUMP_MAGIC, summarize, write_dump
+from ipnd.message import IPNDMessage
+from ipnd.service import TCPCLService
+
+PERIOD = 3
+HEADER = bytes.fromhex("ffffffffffff02000000000108004500")
+
+
+def make_beacons(n_neighbors: int) -> list:
+    beacons = []
+
+    for i in range(n_neighbors):
+        message = IPNDMessage()
+        message.eid = "dtn://neighbor-{}.dtn".format(i)
+        message.period = PERIOD
+        message.sequence_number = 0
+        message.services = (TCPCLService(ipaddress.ip_address("10.0.{}.{}".format(i >> 8 & 0xFF, i & 0xFF)), 4556),)
+        beacons.append(bytearray(message.encode()))
+
+    return beacons
+
+
+def frame(source: int, beacon: bytes) -> bytes:
+    # Ethernet, IPv4 and UDP headers, checksums left out
+    ip = struct.pack("!HHHBBH4s4s", 28 + len(beacon), 0, 0, 1, 17, 0,
+                     bytes([10, 0, source >> 8 & 0xFF, source & 0xFF]), bytes([224, 0, 0, 108]))
+    udp = struct.pack("!HHHH", 3003, 3003, 8 + len(beacon), 0)
+    return HEADER + ip + udp + beacon
+
+
+def write_capture(path: str, n_beacons: int, n_neighbors: int, dump: bool, rng: random.Random):
+    beacons = make_beacons(n_neighbors)
+    sequence_numbers = [0] * n_neighbors
+    start = 1.7e9
+
+    with open(path, "wb") as file:
+        if dump:
+            file.write(DUMP_MAGIC)
+        else:
+            file.write(struct.pack("<IHHiIII", 0xA1B2C3D4, 2, 4, 0, 0, 65535, 1))
+
+        for i in range(n_beacons):
+            neighbor = i % n_neighbors
+            timestamp = start + (i // n_neighbors) * PERIOD + rng.uniform(-0.05, 0.05)
+
+            sequence_numbers[neighbor] = (sequence_numbers[neighbor] + 1) & 0xFFFF
+            if rng.random() < 0.0005:
+                sequence_numbers[neighbor] = 1
+            # Missed, that sequence number is not seen
+            elif rng.random() < 0.02:
+                continue
+
+            beacon = beacons[neighbor]
+            beacon[2:4] = sequence_numbers[neighbor].to_bytes(2, "big")
+
+            if dump:
+                write_dump(file, timestamp, beacon)
+                continue
+
+            packet = frame(neighbor, beacon)
+            seconds = int(timestamp)
+            file.write(struct.pack("<IIII", seconds, int((timestamp - seconds) * 1e6), len(packet), len(packet)))
+            file.write(packet)
+
+
+def run(path: str, workers: int, queue):
+    start = time.perf_counter()
+    (summaries, counters) = summarize(path, workers)
+    elapsed = time.perf_counter() - start
+
+    # Kilobytes on Linux
+    rss = max(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+              resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss)
+    queue.put({
+        "seconds": elapsed,
+        "beacons_per_s": counters["beacons"] / elapsed,
+        "neighbors": len(summaries),
+        "peak_rss_mb": rss / 1024,
+    })
+
+
+def measure(path: str, workers: int) -> dict:
+    context = multiprocessing.get_context("spawn")
+    queue = context.Queue()
+    process = context.Process(target=run, args=(path, workers, queue))
+    process.start()
+    result = queue.get()
+    process.join()
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="ipnd capture summaries")
+    parser.add_argument("--beacons", type=int, nargs="+", default=[100000, 1000000, 4000000])
+    parser.add_argument("--neighbors", type=int, default=500)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, os.cpu_count()])
+    parser.add_argument("--dump", action="store_true", help="write beacon dumps instead of pcap")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--json", action="store_true", help="print results as JSON")
+    args = parser.parse_args()
+
+    results = {}
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "capture")
+
+        for n_beacons in args.beacons:
+            write_capture(path, n_beacons, args.neighbors, args.dump, random.Random(args.seed))
+            size = os.path.getsize(path)
+
+            for workers in sorted(set(args.workers)):
+                result = measure(path, workers)
+                result["file_mb"] = size / (1 << 20)
+                results["{}/{}".format(n_beacons, workers)] = result
+
+            os.remove(path)
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+
+    print("{:>10} {:>8} {:>10} {:>10} {:>14} {:>10}".format(
+        "beacons", "workers", "file", "time", "beacons/s", "peak RSS"))
+    for (key, result) in results.items():
+        (n_beacons, workers) = key.split("/")
+        print("{:>10} {:>8} {:>8.0f}MB {:>9.2f}s {:>14.0f} {:>8.1f}MB".format(
+            n_beacons, workers, result["file_mb"], result["seconds"], result["beacons_per_s"],
+            result["peak_rss_mb"]))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,142 @@
+# Cost of CLA selection on the receive path, and time until neighbors
+# advertising unreachable CLA addresses first are switched to the
+# reachable one
+#
+#   python3 bench/cla_probe.py
+#   python3 bench/cla_probe.py --neighbors 500 --json
+#
+# Each neighbor advertises, in this order, an address nothing answers
+# (TEST-NET-1, the probe times out unless the network is unreachable),
+# a closed port on loopback and a port on loopback accepting connections.
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import socket
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+from ipnd.discovery import BeaconHandler
+from ipnd.message import IPNDMessage
+from ipnd.neighbors import NeighborTable
+from ipnd.probe import CLASelector
+from ipnd.service import TCPCLService
+
+
+def listen() -> socket.socket:
+    listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    listener.bind(("127.0.0.1", 0))
+    listener.listen(1024)
+
+    def accept():
+        while True:
+            try:
+                (conn, _) = listener.accept()
+            except OSError:
+                return
+            conn.close()
+
+    threading.Thread(target=accept, daemon=True).start()
+    return listener
+
+
+def closed_port() -> int:
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.bind(("127.0.0.1", 0))
+    port = sock.getsockname()[1]
+    sock.close()
+    return port
+
+
+def make_beacons(n_neighbors: int, open_port: int) -> list:
+    closed = closed_port()
+    beacons = []
+
+    for i in range(n_neighbors):
+        message = IPNDMessage()
+        message.eid = "dtn://neighbor-{}.dtn".format(i)
+        message.period = 3
+        message.services = [
+            TCPCLService("192.0.2.{}".format(1 + i % 254), 4556),
+            TCPCLService("127.0.0.1", closed),
+            TCPCLService("127.0.0.1", open_port),
+        ]
+        beacons.append(message.encode())
+
+    return beacons
+
+
+def run(beacons: list, cla_selector, expected: str, timeout: float) -> dict:
+    handler = BeaconHandler("dtn://bench.dtn", NeighborTable(), cla_selector=cla_selector)
+
+    start = time.perf_counter()
+    for beacon in beacons:
+        handler.handle(beacon)
+    handle_time = time.perf_counter() - start
+
+    result = {
+        "handle_us_per_beacon": handle_time / len(beacons) * 1e6,
+    }
+
+    if cla_selector is None:
+        return result
+
+    switched = 0
+    deadline = start + timeout
+    while switched < len(beacons) and time.perf_counter() < deadline:
+        switched += len(handler.probed())
+        time.sleep(0.001)
+
+    table = handler.neighbors.neighbors.values()
+    result.update({
+        "converged_s": time.perf_counter() - start,
+        "switched": switched,
+        "on_reachable_cla": sum(neighbor.cla_address == expected for neighbor in table),
+        "probes": cla_selector.probes,
+        "failures": cla_selector.failures,
+    })
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="ipnd CLA selection")
+    parser.add_argument("--neighbors", type=int, default=200)
+    parser.add_argument("--probe-timeout", type=float, default=1.0)
+    parser.add_argument("--json", action="store_true", help="print results as JSON")
+    args = parser.parse_args()
+
+    listener = listen()
+    expected = "tcpclv3:127.0.0.1:{}".format(listener.getsockname()[1])
+    beacons = make_beacons(args.neighbors, listener.getsockname()[1])
+
+    cla_selector = CLASelector(timeout=args.probe_timeout)
+    cla_selector.start()
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        results = {
+            "first advertised": run(beacons, None, expected, 0),
+            "probed": run(beacons, cla_selector, expected, args.probe_timeout * 10),
+        }
+
+    cla_selector.close()
+    listener.close()
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+
+    for (name, result) in results.items():
+        print("{:<18} {:>8.1f}us/beacon".format(name, result["handle_us_per_beacon"]))
+    probed = results["probed"]
+    print("{} of {} neighbors on the reachable CLA after {:.3f}s ({} probes, {} failed)".format(
+        probed["on_reachable_cla"], args.neighbors, probed["converged_s"],
+        probed["probes"], probed["failures"]))
+
+
+if __name__ == "__main__":
+    main()
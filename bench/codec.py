@@ -0,0 +1,186 @@
+# Codec micro-benchmarks: throughput and allocations of the SDNV,
+# service and message encoding and decoding paths
+#
+#   python3 bench/codec.py --output before.json
+#   python3 bench/codec.py --output after.json --compare before.json
+
+import argparse
+import ipaddress
+import json
+import os
+import platform
+import subprocess
+import sys
+import timeit
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+from ipnd.message import IPNDMessage, LazyIPNDMessage
+from ipnd.sdnv import SDNVUtil
+from ipnd.service import TCPCLService, PrimitiveService, UnknownService
+
+PRIMITIVES = (
+    (True, "bool"),
+    (10, "uint64"),
+    (10, "sint64"),
+    (1552, "fixed16"),
+    (1337, "fixed32"),
+    (481451545454856, "fixed64"),
+    (1.5, "float"),
+    (49.3, "double"),
+    ("Hello, world", "string"),
+    (b"rrr", "bytes"),
+)
+
+# Largest UDP payloads on a 1500 bytes MTU and over IPv4 at all
+MTU_PAYLOAD = 1472
+MAX_PAYLOAD = 65507
+
+
+def make_services(n_services):
+    return [
+        TCPCLService(ipaddress.IPv4Address(0x0A000000 + i), 4556) if i % 2 == 0
+        else TCPCLService(ipaddress.IPv6Address(0xFE80 << 112 | i), 4556)
+        for i in range(n_services)]
+
+
+def make_message(n_services) -> IPNDMessage:
+    message = IPNDMessage()
+    message.eid = "dtn://bench.dtn"
+    message.period = 3
+    message.sequence_number = 42
+    message.services = make_services(n_services)
+    return message
+
+
+def make_message_fitting(size) -> IPNDMessage:
+    # Each pair of v4 and v6 services takes 32 bytes
+    n_services = 2 * ((size - len(make_message(0).encode())) // 32)
+    while len(make_message(n_services).encode()) > size:
+        n_services -= 1
+    return make_message(n_services)
+
+
+def codec_cases():
+    for value in (3, 300, 100000, 2**31):
+        encoded = SDNVUtil.encode(value)
+        yield ("sdnv.encode.{}".format(value), lambda v=value: SDNVUtil.encode(v))
+        # Appending to a reused buffer, as the message encoder does
+        yield ("sdnv.encode_into.{}".format(value),
+               lambda v=value, ba=bytearray(): (SDNVUtil.encode_into(v, ba), ba.clear()))
+        yield ("sdnv.decode.{}".format(value), lambda e=encoded: SDNVUtil.decode(e, 0))
+        yield ("sdnv.decode_many.{}x8".format(value),
+               lambda e=encoded * 8: SDNVUtil.decode_many(e, 0, 8))
+
+    for (value, type) in PRIMITIVES:
+        service = PrimitiveService(value, type)
+        encoded = service.encode()
+        yield ("primitive.encode.{}".format(type), service.encode)
+        yield ("primitive.decode.{}".format(type),
+               lambda e=encoded: PrimitiveService.decode_with_offset(e))
+
+    for (name, address) in (("v4", "192.168.0.1"), ("v6", "fe80::b453:d21:cf3c:aec2")):
+        service = TCPCLService(address, 4556)
+        encoded = service.encode()
+        yield ("tcpcl.encode.{}".format(name), service.encode)
+        yield ("tcpcl.decode.{}".format(name),
+               lambda e=encoded: TCPCLService.decode_with_offset(e))
+
+    unknown = UnknownService()
+    unknown.tag = 200
+    unknown.buffer = bytes(64)
+    encoded = unknown.encode()
+    yield ("unknown.encode", unknown.encode)
+    yield ("unknown.decode", lambda: UnknownService.decode_with_offset(encoded))
+
+    for (name, message) in (("realistic", make_message(4)),
+                            ("mtu", make_message_fitting(MTU_PAYLOAD)),
+                            ("worst", make_message_fitting(MAX_PAYLOAD))):
+        encoded = message.encode()
+        yield ("message.encode.{}".format(name), message.encode)
+        yield ("message.encode_cached.{}".format(name), message.encode_cached)
+        yield ("message.decode.{}".format(name), lambda e=encoded: IPNDMessage.decode(e))
+        yield ("message.decode_lazy_header.{}".format(name),
+               lambda e=encoded: LazyIPNDMessage.decode(e).eid)
+        yield ("message.roundtrip.{}".format(name),
+               lambda m=message: IPNDMessage.decode(m.encode()))
+
+
+def measure(fn, repeat: int) -> dict:
+    timer = timeit.Timer(fn)
+    loops, _ = timer.autorange()
+    seconds = min(timer.repeat(repeat, loops)) / loops
+
+    # Peak of memory allocated while running one operation, and what is
+    # still allocated once its result is dropped
+    fn()
+    tracemalloc.start()
+    tracemalloc.reset_peak()
+    (before, _) = tracemalloc.get_traced_memory()
+    fn()
+    (after, peak) = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {
+        "ns_per_op": seconds * 1e9,
+        "ops_per_sec": 1 / seconds,
+        "peak_bytes": peak - before,
+        "retained_bytes": after - before,
+    }
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"],
+                              cwd=os.path.dirname(os.path.abspath(__file__)),
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="ipnd codec micro-benchmarks")
+    parser.add_argument("--output", help="write results as JSON to this file")
+    parser.add_argument("--compare", help="JSON results of a previous run to compare with")
+    parser.add_argument("--filter", default="", help="only run cases whose name contains this")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    previous = {}
+    if args.compare is not None:
+        with open(args.compare) as f:
+            previous = {it["name"]: it for it in json.load(f)["results"]}
+
+    results = []
+
+    print("{:<36} {:>12} {:>12} {:>10} {:>8}".format(
+        "case", "ns/op", "ops/s", "peak B", "change"))
+
+    for (name, fn) in codec_cases():
+        if args.filter not in name:
+            continue
+
+        result = dict(name=name, **measure(fn, args.repeat))
+        results.append(result)
+
+        change = ""
+        if name in previous:
+            change = "{:+.0f}%".format(
+                (result["ns_per_op"] / previous[name]["ns_per_op"] - 1) * 100)
+
+        print("{:<36} {:>12.0f} {:>12.0f} {:>10} {:>8}".format(
+            name, result["ns_per_op"], result["ops_per_sec"], result["peak_bytes"], change))
+
+    if args.output is not None:
+        with open(args.output, "w") as f:
+            json.dump({
+                "commit": git_commit(),
+                "python": platform.python_version(),
+                "machine": platform.machine(),
+                "results": results,
+            }, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
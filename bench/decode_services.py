@@ -0,0 +1,42 @@
+# Decoding time of beacons carrying from 1 to 200 services
+#
+#   python3 bench/decode_services.py
+
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+from ipnd.message import IPNDMessage
+from ipnd.service import TCPCLService
+
+SERVICE_COUNTS = (1, 10, 50, 100, 200)
+
+
+def make_beacon(n_services):
+    message = IPNDMessage()
+    message.eid = "dtn://bench.dtn"
+    message.period = 3
+    message.services = [
+        TCPCLService("10.0.{}.{}".format(i // 256, i % 256), 4556) if i % 2 == 0
+        else TCPCLService("fe80::{:x}".format(i), 4556)
+        for i in range(n_services)]
+    return message.encode()
+
+
+def main():
+    print("{:>8} {:>8} {:>12} {:>14}".format("services", "bytes", "us/beacon", "us/service"))
+
+    for n_services in SERVICE_COUNTS:
+        beacon = make_beacon(n_services)
+        timer = timeit.Timer(lambda: IPNDMessage.decode(beacon))
+        loops, _ = timer.autorange()
+        best = min(timer.repeat(5, loops)) / loops * 1e6
+
+        print("{:>8} {:>8} {:>12.1f} {:>14.2f}".format(
+            n_services, len(beacon), best, best / n_services))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+# Stand-in for the µPCN AAP UNIX socket, for load tests without µPCN
+#
+# Answers WELCOME, REGISTER/ACK and SENDBUNDLE/SENDCONFIRM, confirming
+# each bundle `latency` seconds after it was received, in order. The
+# first time each EID appears in a bundle is recorded on the monotonic
+# clock, which is shared by all processes of the machine.
+
+import os
+import queue
+import re
+import socket
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+from pyupcn.aap import AAPMessage, AAPMessageType
+from upcn.aap import aap_frame_length, RECV_BUFSIZE
+
+NODE_EID = "dtn://ipnd-under-test.dtn"
+EID_PATTERN = re.compile(rb"dtn://[\w.\-]+")
+
+
+class FakeUPCN:
+
+    def __init__(self, socket_path: str, latency: float = 0.0, eid: str = NODE_EID):
+        self.socket_path = socket_path
+        self.latency = latency
+        self.eid = eid
+        self.bundles = 0
+        self.first_bundle = {}
+        self.lock = threading.Lock()
+        self.sock = None
+
+    def listen(self):
+        if os.path.exists(self.socket_path):
+            os.unlink(self.socket_path)
+
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.bind(self.socket_path)
+        self.sock.listen()
+
+    def serve_forever(self):
+        while True:
+            (conn, _) = self.sock.accept()
+            threading.Thread(target=self.serve, args=(conn,), daemon=True).start()
+
+    def record(self, payload: bytes, now: float):
+        match = EID_PATTERN.search(payload)
+        with self.lock:
+            self.bundles += 1
+            if match is not None:
+                self.first_bundle.setdefault(match.group().decode("ascii"), now)
+
+    def serve(self, conn):
+        confirms = queue.Queue()
+
+        def send_confirms():
+            while True:
+                (due, data) = confirms.get()
+                delay = due - time.monotonic()
+                if delay > 0:
+                    time.sleep(delay)
+                conn.sendall(data)
+
+        threading.Thread(target=send_confirms, daemon=True).start()
+
+        conn.sendall(AAPMessage(AAPMessageType.WELCOME, self.eid).serialize())
+
+        buf = bytearray()
+        bundle_id = 0
+
+        while True:
+            data = conn.recv(RECV_BUFSIZE)
+            if not data:
+                return
+            buf += data
+
+            length = aap_frame_length(buf)
+            while length is not None and len(buf) >= length:
+                msg = AAPMessage.parse(bytes(buf[:length]))
+                del buf[:length]
+                now = time.monotonic()
+
+                if msg.msg_type == AAPMessageType.REGISTER:
+                    conn.sendall(AAPMessage(AAPMessageType.ACK).serialize())
+                elif msg.msg_type == AAPMessageType.SENDBUNDLE:
+                    self.record(msg.payload, now)
+                    bundle_id += 1
+                    confirms.put((now + self.latency, AAPMessage(
+                        AAPMessageType.SENDCONFIRM, bundle_id=bundle_id).serialize()))
+
+                length = aap_frame_length(buf)
+
+
+def run(socket_path: str, latency: float, ready, results):
+    # Entry point of a dedicated process: reports (bundles, first_bundle)
+    # through the results pipe once it receives anything on it
+    upcn = FakeUPCN(socket_path, latency)
+    upcn.listen()
+    threading.Thread(target=upcn.serve_forever, daemon=True).start()
+    ready.set()
+
+    results.recv()
+    with upcn.lock:
+        results.send((upcn.bundles, dict(upcn.first_bundle)))
@@ -0,0 +1,176 @@
+# Time from a node joining until it and an established node know each
+# other, with periodic beacons only and with fast discovery
+#
+#   python3 bench/fast_discovery.py
+#   python3 bench/fast_discovery.py --joiners 100 --period 3 --json
+#
+# Every node runs in this process on its own loopback address
+# (127.0.0.1 is the established node, joiners use 127.0.0.2 and up) and
+# sends its beacons by unicast to the nodes it would reach by multicast.
+# Joiners only beacon to the established node so that they do not
+# discover each other.
+
+import argparse
+import contextlib
+import io
+import ipaddress
+import json
+import os
+import random
+import selectors
+import socket
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+from ipnd.discovery import BeaconHandler
+from ipnd.emitter import BeaconEmitter
+from ipnd.fastdiscovery import FastDiscovery
+from ipnd.message import IPNDMessage
+from ipnd.neighbors import NeighborTable
+from ipnd.scheduler import BeaconScheduler
+from ipnd.service import TCPCLService
+
+PORT = 3303
+
+
+class Node:
+
+    def __init__(self, index: int, period: int, fast: bool):
+        self.address = "127.0.0.{}".format(index + 1)
+        self.eid = "dtn://node-{}.dtn".format(index)
+
+        self.receiver = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.receiver.setblocking(False)
+        self.receiver.bind((self.address, PORT))
+        self.sender = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.sender.bind((self.address, 0))
+
+        message = IPNDMessage()
+        message.eid = self.eid
+        message.period = period
+        message.services = [TCPCLService(ipaddress.IPv4Address(self.address), 4556)]
+
+        self.emitter = BeaconEmitter(message)
+        self.scheduler = BeaconScheduler()
+        self.period = period
+        self.handler = BeaconHandler(self.eid, NeighborTable())
+
+        self.fast_discovery = None
+        if fast:
+            self.fast_discovery = FastDiscovery(PORT, sockets={socket.AF_INET: self.sender})
+            self.fast_discovery.message = message
+            self.handler.on_new_neighbor = self.fast_discovery.reply
+
+    def beacon_to(self, node):
+        self.emitter.add_destination(self.sender, (node.address, PORT))
+
+    def start(self):
+        self.scheduler.add("lo", self.period, self.emitter.emit)
+
+    def close(self):
+        self.receiver.close()
+        self.sender.close()
+
+
+def run(n_joiners: int, period: int, window: float, fast: bool, seed: int) -> dict:
+    rng = random.Random(seed)
+    established = Node(0, period, fast)
+    joiners = [Node(i + 1, period, fast) for i in range(n_joiners)]
+
+    selector = selectors.DefaultSelector()
+    for node in [established] + joiners:
+        selector.register(node.receiver, selectors.EVENT_READ, node)
+    for joiner in joiners:
+        joiner.beacon_to(established)
+
+    # Joiners arrive at random times, hence at a random phase of the
+    # beacons of the established node
+    start = time.monotonic()
+    established.start()
+    pending = sorted(((start + rng.uniform(0, window), joiner) for joiner in joiners),
+                     key=lambda it: it[0])
+    running = [established]
+    joined = {}
+    contact = {}
+
+    while len(contact) < n_joiners:
+        now = time.monotonic()
+
+        while len(pending) > 0 and pending[0][0] <= now:
+            (_, joiner) = pending.pop(0)
+            established.beacon_to(joiner)
+            joiner.start()
+            joined[joiner] = now
+            running.append(joiner)
+
+        for node in running:
+            node.scheduler.run_pending(now)
+
+        delays = [node.scheduler.next_delay(now) for node in running]
+        if len(pending) > 0:
+            delays.append(pending[0][0] - now)
+        timeout = max(0.0, min(delay for delay in delays if delay is not None))
+
+        for (key, _) in selector.select(timeout):
+            node = key.data
+            while True:
+                try:
+                    (data, source) = node.receiver.recvfrom(4096)
+                except BlockingIOError:
+                    break
+                node.handler.handle(data, source)
+
+        now = time.monotonic()
+        for joiner in joined:
+            if joiner in contact:
+                continue
+            if established.eid in joiner.handler.neighbors and joiner.eid in established.handler.neighbors:
+                contact[joiner] = now - joined[joiner]
+
+    times = sorted(contact.values())
+    replies = sum(node.fast_discovery.sent for node in [established] + joiners if node.fast_discovery)
+
+    for node in [established] + joiners:
+        node.close()
+    selector.close()
+
+    return {
+        "contact_mean": sum(times) / len(times),
+        "contact_p50": times[len(times) // 2],
+        "contact_p95": times[int(len(times) * 0.95)],
+        "contact_max": times[-1],
+        "replies": replies,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="ipnd time to bidirectional contact")
+    parser.add_argument("--joiners", type=int, default=50)
+    parser.add_argument("--period", type=int, default=3)
+    parser.add_argument("--window", type=float, default=10,
+                        help="seconds over which joiners arrive")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--json", action="store_true", help="print results as JSON")
+    args = parser.parse_args()
+
+    results = {}
+    with contextlib.redirect_stdout(io.StringIO()):
+        for (name, fast) in (("periodic", False), ("fast discovery", True)):
+            results[name] = run(args.joiners, args.period, args.window, fast, args.seed)
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+
+    print("{:<16} {:>10} {:>10} {:>10} {:>10} {:>8}".format(
+        "mode", "mean", "p50", "p95", "max", "replies"))
+    for (name, result) in results.items():
+        print("{:<16} {:>9.1f}ms {:>9.1f}ms {:>9.1f}ms {:>9.1f}ms {:>8}".format(
+            name, result["contact_mean"] * 1000, result["contact_p50"] * 1000,
+            result["contact_p95"] * 1000, result["contact_max"] * 1000, result["replies"]))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,118 @@
+# Cost of address events on the beacon emitters, and how often they make
+# the beacon be encoded again
+#
+#   python3 bench/interfaces.py
+#   python3 bench/interfaces.py --events 100000 --changes 0.01 --json
+#
+# Events are fed through a ManualWatcher. Most repeat addresses already
+# known, as the kernel does each time an IPv6 address lifetime is
+# renewed, the others add or remove an address or take a link down.
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import random
+import socket
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+from ipnd.beacons import InterfaceBeacons
+from ipnd.netwatch import ManualWatcher
+from ipnd.scheduler import BeaconScheduler
+
+INTERFACES = {
+    "eth0": {socket.AF_INET: [{"addr": "10.0.0.1"}], socket.AF_INET6: [{"addr": "fe80::1"}]},
+    "wlan0": {socket.AF_INET: [{"addr": "192.168.1.10"}], socket.AF_INET6: [{"addr": "2001:db8::10"}]},
+}
+
+
+def make_events(n_events: int, changes: float, rng: random.Random) -> list:
+    events = []
+    known = [(name, family, it["addr"]) for (name, families) in INTERFACES.items()
+             for (family, addresses) in families.items() for it in addresses]
+
+    for i in range(n_events):
+        if rng.random() >= changes:
+            (name, family, address) = rng.choice(known)
+            events.append(("add", name, family, address))
+            continue
+
+        kind = rng.choice(("address", "link"))
+        name = rng.choice(list(INTERFACES))
+        if kind == "address":
+            address = "2001:db8:1::{:x}".format(i)
+            events.append(("add", name, socket.AF_INET6, address))
+            events.append(("remove", name, socket.AF_INET6, address))
+        else:
+            events.append(("down", name, None, None))
+            events.append(("up", name, None, None))
+
+    return events
+
+
+def sender(family, interface=None):
+    return socket.socket(family, socket.SOCK_DGRAM)
+
+
+def run(events: list) -> dict:
+    watcher = ManualWatcher()
+    beacons = InterfaceBeacons("dtn://bench.dtn", BeaconScheduler(), {
+        socket.AF_INET: ("127.0.0.1", 3303),
+        socket.AF_INET6: ("::1", 3303),
+    }, 3, sender=sender)
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        beacons.start(INTERFACES)
+        messages = [emitter.message for (emitter, _) in beacons.emitters.values()]
+        templates = [message.encode_cached() for message in messages]
+        encodes = 0
+
+        start = time.perf_counter()
+        for event in events:
+            watcher.push(event)
+            beacons.watch(watcher.read())
+
+            # The beacons as the next tick would send them
+            for (i, message) in enumerate(messages):
+                template = message.encode_cached()
+                if template is not templates[i]:
+                    templates[i] = template
+                    encodes += 1
+        elapsed = time.perf_counter() - start
+
+        beacons.close()
+    watcher.close()
+
+    return {
+        "events": len(events),
+        "us_per_event": elapsed / len(events) * 1e6,
+        "services_changes": beacons.changes - 1,
+        "beacon_encodes": encodes,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="ipnd interface events")
+    parser.add_argument("--events", type=int, default=20000)
+    parser.add_argument("--changes", type=float, default=0.05,
+                        help="fraction of events actually changing something")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--json", action="store_true", help="print results as JSON")
+    args = parser.parse_args()
+
+    result = run(make_events(args.events, args.changes, random.Random(args.seed)))
+
+    if args.json:
+        print(json.dumps(result, indent=2))
+        return
+
+    print("{} events, {:.1f}us each, {} services changes, {} beacon encodes".format(
+        result["events"], result["us_per_event"], result["services_changes"], result["beacon_encodes"]))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+# Memory held per decoded beacon, by the decoded message itself and by
+# the neighbor table entry it leads to
+#
+#   python3 bench/memory.py
+#   python3 bench/memory.py --beacons 20000 --services 4 --json
+
+import argparse
+import contextlib
+import gc
+import io
+import ipaddress
+import json
+import os
+import sys
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+from ipnd.discovery import BeaconHandler
+from ipnd.message import IPNDMessage, LazyIPNDMessage
+from ipnd.neighbors import NeighborTable
+from ipnd.service import TCPCLService
+
+
+def make_beacons(n_beacons: int, n_services: int) -> list:
+    beacons = []
+
+    for i in range(n_beacons):
+        message = IPNDMessage()
+        message.eid = "dtn://neighbor-{}.dtn".format(i)
+        message.period = 3
+        message.services = [
+            TCPCLService(ipaddress.IPv4Address(0x0A000000 + i * n_services + j), 4556) if j % 2 == 0
+            else TCPCLService(ipaddress.IPv6Address(0xFE80 << 112 | i * n_services + j), 4556)
+            for j in range(n_services)]
+        beacons.append(message.encode())
+
+    return beacons
+
+
+def decode_all(beacons):
+    return [IPNDMessage.decode(beacon) for beacon in beacons]
+
+
+def decode_lazy_all(beacons):
+    messages = [LazyIPNDMessage.decode(beacon) for beacon in beacons]
+    for message in messages:
+        message.decode_body()
+    return messages
+
+
+def handle_all(beacons):
+    handler = BeaconHandler("dtn://bench.dtn", NeighborTable())
+    with contextlib.redirect_stdout(io.StringIO()):
+        for beacon in beacons:
+            handler.handle(beacon)
+    return handler
+
+
+def measure(fn, beacons) -> dict:
+    # Bytes still allocated once fn returned, divided by the beacon count
+    gc.collect()
+    tracemalloc.start()
+    (before, _) = tracemalloc.get_traced_memory()
+    result = fn(beacons)
+    gc.collect()
+    (after, peak) = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del result
+
+    return {
+        "bytes_per_beacon": (after - before) / len(beacons),
+        "peak_bytes_per_beacon": (peak - before) / len(beacons),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="ipnd memory per decoded beacon")
+    parser.add_argument("--beacons", type=int, default=10000)
+    parser.add_argument("--services", type=int, default=2,
+                        help="TCPCL services advertised by each beacon")
+    parser.add_argument("--json", action="store_true", help="print results as JSON")
+    args = parser.parse_args()
+
+    beacons = make_beacons(args.beacons, args.services)
+
+    results = {
+        "decoded message": measure(decode_all, beacons),
+        "lazy message, body decoded": measure(decode_lazy_all, beacons),
+        "neighbor table": measure(handle_all, beacons),
+    }
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+
+    print("{:<28} {:>16} {:>16}".format("case", "bytes/beacon", "peak/beacon"))
+    for (name, result) in results.items():
+        print("{:<28} {:>16.0f} {:>16.0f}".format(
+            name, result["bytes_per_beacon"], result["peak_bytes_per_beacon"]))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,196 @@
+# Encoding and decoding time of each primitive type, table-driven codec
+# against the former if/elif implementation. legacy_encode and
+# legacy_decode are the PrimitiveService methods of the baseline as they
+# were, only SDNVUtil is today's. The table is not faster for every type,
+# the speedup column is below 1.0 where it is slower.
+#
+#   python3 bench/primitive_codec.py
+
+import os
+import struct
+import sys
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+from ipnd.sdnv import SDNVUtil
+from ipnd.service import (BOOL_TYPE, BYTES_TYPE, DOUBLE_TYPE, FIXED16_TYPE, FIXED32_TYPE, FIXED64_TYPE,
+                          FLOAT_TYPE, SINT_TYPE, STRING_TYPE, UINT_TYPE, PrimitiveService,
+                          encode_primitive_array)
+
+# Differences below are within the noise of a run
+NOISE = 1.05
+
+VALUES = (
+    (True, "bool"),
+    (10, "uint64"),
+    (1552, "fixed16"),
+    (1337, "fixed32"),
+    (481451545454856, "fixed64"),
+    (1.5, "float"),
+    (49.3, "double"),
+    ("Hello, world", "string"),
+    (b"rrr", "bytes"),
+)
+
+
+def legacy_encode(self) -> bytes:
+    ba = bytearray()
+
+    tag = 0
+    get_val = None
+
+    if self.type == BOOL_TYPE:
+        tag = 0
+        def get_val(v): return (int(v),)
+
+    elif self.type == UINT_TYPE:
+        tag = 1
+        def get_val(v): return SDNVUtil.encode(v)
+
+    elif self.type == SINT_TYPE:
+        tag = 2
+        def get_val(v): return SDNVUtil.encode(v)
+
+    elif self.type == FIXED16_TYPE:
+        tag = 3
+        def get_val(v): return int(v).to_bytes(2, 'big')
+
+    elif self.type == FIXED32_TYPE:
+        tag = 4
+        def get_val(v): return int(v).to_bytes(4, 'big')
+
+    elif self.type == FIXED64_TYPE:
+        tag = 5
+        def get_val(v): return int(v).to_bytes(8, 'big')
+
+    elif self.type == FLOAT_TYPE:
+        tag = 6
+        def get_val(v): return struct.pack("!f", v)
+
+    elif self.type == DOUBLE_TYPE:
+        tag = 7
+        def get_val(v): return struct.pack("!d", v)
+
+    elif self.type == STRING_TYPE:
+        tag = 8
+        def get_val(v): return encode_primitive_array(
+            str(self.value).encode("ascii"))
+
+    elif self.type == BYTES_TYPE:
+        tag = 9
+        def get_val(v): return encode_primitive_array(bytes(self.value))
+
+    else:
+        raise Exception(
+            "Unknown primitive service type {}".format(self.type))
+
+    ba.append(tag)
+
+    if self.type != BYTES_TYPE and isinstance(self.value, bytes):
+        ba.extend(self.value)
+    else:
+        ba.extend(get_val(self.value))
+
+    return bytes(ba)
+
+
+def legacy_decode(bytes: bytes):
+    tag = bytes[0]
+    offset = 1
+
+    type = None
+    value = None
+
+    if tag == 0:
+        type = BOOL_TYPE
+        value = bytes[offset] == 1
+        offset += 1
+
+    elif tag == 1:
+        type = UINT_TYPE
+        (v, num_bytes) = SDNVUtil.decode(bytes, offset)
+        value = v
+        offset += num_bytes
+
+    elif tag == 2:
+        type = SINT_TYPE
+        (v, num_bytes) = SDNVUtil.decode(bytes, offset)
+        value = v
+        offset += num_bytes
+
+    elif tag == 3:
+        type = FIXED16_TYPE
+        value = int.from_bytes(bytes[offset:offset+2], 'big')
+        offset += 2
+
+    elif tag == 4:
+        type = FIXED32_TYPE
+        value = int.from_bytes(bytes[offset:offset+4], 'big')
+        offset += 4
+
+    elif tag == 5:
+        type = FIXED64_TYPE
+        value = int.from_bytes(bytes[offset:offset+8], 'big')
+        offset += 8
+
+    elif tag == 6:
+        type = FLOAT_TYPE
+        value = struct.unpack("!f", bytes[offset:offset+4])
+        offset += 4
+
+    elif tag == 7:
+        type = DOUBLE_TYPE
+        value = struct.unpack("!d", bytes[offset:offset+8])
+        offset += 8
+
+    elif tag == 8:
+        type = STRING_TYPE
+        (length, num_bytes) = SDNVUtil.decode(bytes, offset)
+        offset += num_bytes
+        value = bytes[offset:offset+length].decode("ascii")
+        offset += length
+
+    elif tag == 9:
+        type = BYTES_TYPE
+        (length, num_bytes) = SDNVUtil.decode(bytes, offset)
+        offset += num_bytes
+        value = bytes[offset:offset+length]
+        offset += length
+
+    self = PrimitiveService(value, type)
+
+    return (self, offset)
+
+
+def best(fn) -> float:
+    timer = timeit.Timer(fn)
+    loops, _ = timer.autorange()
+    return min(timer.repeat(5, loops)) / loops * 1e9
+
+
+def main():
+    print("{:>8} {:>12} {:>12} {:>8} {:>12} {:>12} {:>8}".format(
+        "type", "enc legacy", "enc table", "speedup", "dec legacy", "dec table", "speedup"))
+
+    slower = []
+    for (value, type) in VALUES:
+        service = PrimitiveService(value, type)
+        encoded = service.encode()
+        assert legacy_encode(service) == encoded
+
+        encode = (best(lambda: legacy_encode(service)), best(service.encode))
+        decode = (best(lambda: legacy_decode(encoded)),
+                  best(lambda: PrimitiveService.decode_with_offset(encoded)))
+
+        print("{:>8} {:>10.0f}ns {:>10.0f}ns {:>7.2f}x {:>10.0f}ns {:>10.0f}ns {:>7.2f}x".format(
+            type, encode[0], encode[1], encode[0] / encode[1], decode[0], decode[1], decode[0] / decode[1]))
+
+        slower += ["{} {}".format(type, step) for (step, (legacy, table)) in
+                   (("encoding", encode), ("decoding", decode)) if table > legacy * NOISE]
+
+    print("Slower with the table by more than {:.0f}% : {}".format((NOISE - 1) * 100,", ".join(slower) if len(slower) > 0 else "none"))
+
+
+if __name__ == "__main__":
+    main()
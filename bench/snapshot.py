@@ -0,0 +1,86 @@
+# Time to write the neighbor table snapshot and to restore it on startup
+#
+#   python3 bench/snapshot.py
+#   python3 bench/snapshot.py --neighbors 1000 10000 50000 --json
+
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+from ipnd.neighbors import NeighborTable
+from ipnd.snapshot import Snapshot
+
+
+def make_table(n_neighbors: int) -> NeighborTable:
+    table = NeighborTable()
+    now = time.monotonic()
+
+    for i in range(n_neighbors):
+        table.update("dtn://neighbor-{}.dtn".format(i),
+                     "tcpclv3:10.{}.{}.{}:4556".format(i >> 16 & 0xFF, i >> 8 & 0xFF, i & 0xFF),
+                     3, now=now - (i % 6), sequence_number=i & 0xFFFF)
+
+    return table
+
+
+def run(n_neighbors: int, repeat: int) -> dict:
+    table = make_table(n_neighbors)
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "neighbors")
+
+        snapshot = Snapshot(path)
+        snapshot.open()
+        # The first write grows the file
+        snapshot.write(table)
+
+        start = time.perf_counter()
+        for _ in range(repeat):
+            snapshot.write(table)
+        write_time = (time.perf_counter() - start) / repeat
+        snapshot.close()
+        size = os.path.getsize(path)
+
+        start = time.perf_counter()
+        snapshot = Snapshot(path)
+        snapshot.open()
+        restored = snapshot.restore(NeighborTable())
+        restore_time = time.perf_counter() - start
+        snapshot.close()
+
+    return {
+        "write_ms": write_time * 1000,
+        "restore_ms": restore_time * 1000,
+        "file_bytes": size,
+        "restored": len(restored),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="ipnd neighbor table snapshot")
+    parser.add_argument("--neighbors", type=int, nargs="+", default=[100, 1000, 10000])
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--json", action="store_true", help="print results as JSON")
+    args = parser.parse_args()
+
+    results = {n: run(n, args.repeat) for n in args.neighbors}
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+
+    print("{:>10} {:>10} {:>10} {:>12} {:>10}".format(
+        "neighbors", "write", "restore", "file", "restored"))
+    for (n, result) in results.items():
+        print("{:>10} {:>8.2f}ms {:>8.2f}ms {:>10}KB {:>10}".format(
+            n, result["write_ms"], result["restore_ms"], result["file_bytes"] // 1024,
+            result["restored"]))
+
+
+if __name__ == "__main__":
+    main()
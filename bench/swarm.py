@@ -0,0 +1,301 @@
+# End-to-end load test of the ipnd receive path against a swarm of
+# virtual neighbors and a local µPCN AAP stand-in
+#
+#   python3 bench/swarm.py --neighbors 2000 --period 3 --duration 15
+#   python3 bench/swarm.py --asyncio --transport multicast --latency 0.002
+#   python3 bench/swarm.py --workers 4 --neighbors 20000 --period 1
+#
+# Beacons are generated and AAP is served from separate processes, the
+# ipnd pipeline under test runs in this one, behind the same admission
+# stage as the daemon. Over UDP, virtual neighbors send from --sources
+# loopback addresses (127.1.0.0 and up), each charged to its own token
+# bucket: with fewer sources than neighbors, sources may exceed
+# --source-rate. Multicast is sent from the host address alone, its
+# bucket is sized for the whole swarm unless --source-rate is given.
+
+import argparse
+import asyncio
+import contextlib
+import ipaddress
+import json
+import multiprocessing
+import os
+import queue
+import socket
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+import fake_upcn
+import server
+import upcn
+from ipnd import sockets
+from ipnd.admission import Admission, MAX_SOURCES, SOURCE_RATE
+from ipnd.discovery import BeaconHandler
+from ipnd.engine import BeaconEngine
+from ipnd.message import IPNDMessage
+from ipnd.neighbors import NeighborTable
+from ipnd.receiver import BatchReceiver, QUEUE_SIZE
+from ipnd.scheduler import BeaconScheduler
+from ipnd.service import TCPCLService
+from ipnd.workers import WorkerPool
+from pyupcn.agents import make_contact
+
+MULTICAST_GROUP = "224.0.0.26"
+SOURCE_NETWORK = 0x7F010000
+
+
+def neighbor_eid(i: int) -> str:
+    return "dtn://swarm-{}.dtn".format(i)
+
+
+def generate(args, address, ready, results):
+    # Neighbor i sends its first beacon i * period / neighbors seconds
+    # after the start, then every period
+    if args.transport == "multicast":
+        senders = [sockets.multicast_sender(socket.AF_INET)]
+    else:
+        senders = []
+        for i in range(args.sources):
+            sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+            sock.bind((str(ipaddress.IPv4Address(SOURCE_NETWORK + i)), 0))
+            senders.append(sock)
+
+    messages = []
+    for i in range(args.neighbors):
+        message = IPNDMessage()
+        message.eid = neighbor_eid(i)
+        message.period = args.period
+        message.services = [
+            TCPCLService(ipaddress.IPv4Address(0x0A000000 + i * args.services + j), 4556)
+            for j in range(args.services)]
+        messages.append(message)
+
+    interval = args.period / args.neighbors
+    first_sent = {}
+    sent = 0
+
+    ready.wait()
+    start = time.monotonic()
+
+    while True:
+        now = time.monotonic()
+        due = start + sent * interval
+
+        if due - start >= args.duration:
+            break
+
+        if due > now:
+            time.sleep(due - now)
+
+        message = messages[sent % args.neighbors]
+        senders[sent % args.neighbors % args.sources].sendto(message.encode_cached(), address)
+        message.sequence_number = (message.sequence_number + 1) & 0xFFFF
+
+        if sent < args.neighbors:
+            first_sent[message.eid] = time.monotonic()
+        sent += 1
+
+    results.send((sent, first_sent, time.monotonic() - start))
+
+
+def make_admission(args) -> Admission:
+    # As the daemon sizes it
+    return Admission(args.source_rate, 2 * args.source_rate)
+
+
+def run_threads(args, socket_path, sock):
+    aap = upcn.upcn_sock("ipcn/client", socket_path=socket_path).__enter__()
+    receiver = BatchReceiver(queue.Queue(QUEUE_SIZE), admission=make_admission(args))
+    receiver.add_socket(sock)
+    handler = BeaconHandler(aap.eid, NeighborTable())
+
+    threading.Thread(target=server.run_beacon_client,
+                     args=(aap, receiver, handler), daemon=True).start()
+
+    return (receiver, lambda name: getattr(handler, name), lambda: None)
+
+
+def run_workers(args, socket_path, sock):
+    aap = upcn.upcn_sock("ipcn/client", socket_path=socket_path).__enter__()
+
+    # Workers print to the standard output file descriptor they inherit
+    stdout = os.dup(1)
+    with open(os.devnull, "w") as devnull:
+        os.dup2(devnull.fileno(), 1)
+        pool = WorkerPool(aap.eid, args.workers)
+        os.dup2(stdout, 1)
+    os.close(stdout)
+
+    receiver = BatchReceiver(pool, admission=make_admission(args))
+    receiver.add_socket(sock)
+
+    threading.Thread(target=server.run_sharded_client,
+                     args=(aap, receiver, pool), daemon=True).start()
+
+    return (receiver, pool.total, pool.close)
+
+
+def run_asyncio(args, socket_path, sock):
+    loop = asyncio.new_event_loop()
+    started = threading.Event()
+    state = {}
+
+    async def main():
+        neighbors = NeighborTable()
+
+        async with upcn.upcn_async_sock("ipcn/daemon", socket_path=socket_path) as aap:
+
+            async def push(neighbor):
+                await aap.set_contact(neighbor.eid, neighbor.cla_address, contacts=[
+                    make_contact(0, neighbors.contact_duration(neighbor.period), 1000)
+                ])
+
+            async def withdraw(neighbor):
+                await aap.delete_contact(neighbor.eid, neighbor.cla_address)
+
+            engine = BeaconEngine(BeaconScheduler(), BeaconHandler(aap.eid, neighbors), push, withdraw,
+                                  admission=make_admission(args))
+            engine.add_receiver(sock)
+            state["engine"] = engine
+            loop.call_soon(started.set)
+            await engine.run()
+
+    threading.Thread(target=loop.run_until_complete, args=(main(),), daemon=True).start()
+    started.wait()
+    engine = state["engine"]
+
+    return (engine.receiver, lambda name: getattr(engine.handler, name),
+            lambda: loop.call_soon_threadsafe(engine.stop))
+
+
+def percentile(values, p):
+    if len(values) == 0:
+        return None
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p / 100))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="ipnd swarm load test")
+    parser.add_argument("--neighbors", type=int, default=2000)
+    parser.add_argument("--period", type=int, default=3)
+    parser.add_argument("--duration", type=float, default=15)
+    parser.add_argument("--services", type=int, default=2,
+                        help="TCPCL services advertised by each neighbor")
+    parser.add_argument("--latency", type=float, default=0.0,
+                        help="delay before the AAP stand-in confirms a bundle, in seconds")
+    parser.add_argument("--transport", choices=("udp", "multicast"), default="udp")
+    parser.add_argument("--sources", type=int, default=0,
+                        help="UDP source addresses the neighbors send from (default: one per neighbor, "
+                             "up to {})".format(MAX_SOURCES))
+    parser.add_argument("--source-rate", type=float,
+                        help="beacons per second admitted from a source address (default: {} over UDP, "
+                             "twice the swarm rate over multicast)".format(SOURCE_RATE))
+    parser.add_argument("--port", type=int, default=13003)
+    parser.add_argument("--asyncio", action="store_true", help="test the asyncio engine")
+    parser.add_argument("--workers", type=int, default=0,
+                        help="test decoding in this many worker processes")
+    parser.add_argument("--grace", type=float, default=2,
+                        help="time left to ipnd to catch up once generation ended")
+    parser.add_argument("--json", action="store_true", help="print results as JSON")
+    args = parser.parse_args()
+
+    if args.transport == "multicast":
+        args.sources = 1
+    elif args.sources <= 0:
+        args.sources = min(args.neighbors, MAX_SOURCES)
+
+    if args.source_rate is None:
+        args.source_rate = SOURCE_RATE if args.transport == "udp" else \
+            max(SOURCE_RATE, 2 * args.neighbors / args.period)
+
+    socket_path = os.path.join(tempfile.gettempdir(), "ipnd-swarm-{}.socket".format(os.getpid()))
+
+    upcn_ready = multiprocessing.Event()
+    (upcn_results, upcn_conn) = multiprocessing.Pipe()
+    upcn_process = multiprocessing.Process(
+        target=fake_upcn.run, args=(socket_path, args.latency, upcn_ready, upcn_conn), daemon=True)
+    upcn_process.start()
+    upcn_ready.wait()
+
+    if args.transport == "multicast":
+        sock = sockets.multicast_receiver(socket.AF_INET, MULTICAST_GROUP, args.port)
+        address = (MULTICAST_GROUP, args.port)
+    else:
+        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        sock.bind(("127.0.0.1", args.port))
+        address = ("127.0.0.1", args.port)
+
+    generator_ready = multiprocessing.Event()
+    (generator_results, generator_conn) = multiprocessing.Pipe()
+    generator = multiprocessing.Process(
+        target=generate, args=(args, address, generator_ready, generator_conn), daemon=True)
+    generator.start()
+
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        if args.asyncio:
+            (receiver, counter, stop) = run_asyncio(args, socket_path, sock)
+        elif args.workers > 0:
+            (receiver, counter, stop) = run_workers(args, socket_path, sock)
+        else:
+            (receiver, counter, stop) = run_threads(args, socket_path, sock)
+
+        generator_ready.set()
+        (sent, first_sent, elapsed) = generator_results.recv()
+        processed_in_time = counter("received")
+        time.sleep(args.grace)
+        processed = counter("received")
+        stop()
+
+    upcn_results.send(None)
+    (bundles, first_bundle) = upcn_results.recv()
+    upcn_process.terminate()
+    os.unlink(socket_path)
+
+    latencies = [first_bundle[eid] - first_sent[eid] for eid in first_sent if eid in first_bundle]
+
+    results = {
+        "mode": "asyncio" if args.asyncio else "workers" if args.workers > 0 else "threads",
+        "workers": args.workers,
+        "transport": args.transport,
+        "neighbors": args.neighbors,
+        "period": args.period,
+        "aap_latency": args.latency,
+        "duration": elapsed,
+        "beacons_sent": sent,
+        "sources": args.sources,
+        "source_rate": args.source_rate,
+        "beacons_admitted": receiver.admission.admitted,
+        "rejected_rate": receiver.admission.rejected["rate"],
+        "rejected_other": sum(receiver.admission.rejected.values()) - receiver.admission.rejected["rate"],
+        "beacons_received": receiver.received,
+        "beacons_processed": processed,
+        "duplicates_dropped": counter("duplicates"),
+        "kernel_drops": receiver.kernel_drops,
+        "queue_overflows": receiver.overflows + getattr(receiver.queue, "overflows", 0),
+        "drop_rate": 1 - processed / sent if sent > 0 else 0,
+        "processed_per_sec": processed_in_time / elapsed,
+        "bundles": bundles,
+        "neighbors_contacted": len(latencies),
+        "contact_latency_p50_ms": percentile(latencies, 50) * 1000 if latencies else None,
+        "contact_latency_p95_ms": percentile(latencies, 95) * 1000 if latencies else None,
+        "contact_latency_p99_ms": percentile(latencies, 99) * 1000 if latencies else None,
+        "contact_latency_max_ms": max(latencies) * 1000 if latencies else None,
+    }
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+
+    for (name, value) in results.items():
+        if isinstance(value, float):
+            value = "{:.3f}".format(value)
+        print("{:<24} {}".format(name, value))
+
+
+if __name__ == "__main__":
+    main()
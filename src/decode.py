@@ -1,7 +1,56 @@
-from time import sleep
+from ipnd.capture import BEACON_PORT, CHUNK_SIZE, COUNTERS, FIELDS, summarize
 from ipnd.message import IPNDMessage
-from ipnd.service import TCPCLService
-import ipaddress
+import argparse
+import csv
+import json
+import os
 import sys
 
-print(IPNDMessage.decode(sys.stdin.buffer.read()))
\ No newline at end of file
+
+def write_summaries(summaries: dict, format: str):
+    if format == "json":
+        for summary in summaries.values():
+            sys.stdout.write(json.dumps(summary.to_dict()) + "\n")
+        return
+
+    writer = csv.DictWriter(sys.stdout, FIELDS)
+    writer.writeheader()
+    for summary in summaries.values():
+        row = summary.to_dict()
+        row["clas"] = " ".join(row["clas"])
+        writer.writerow(row)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Decode one beacon read on stdin, or summarize the neighbors of beacon captures")
+    parser.add_argument("captures", nargs="*",
+                        help="pcap captures or beacon dumps, read in order")
+    parser.add_argument("--format", choices=("csv", "json"), default="csv",
+                        help="CSV or JSON lines summaries (default: csv)")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(),
+                        help="decoding processes (default: one per CPU)")
+    parser.add_argument("--port", type=int, default=BEACON_PORT,
+                        help="UDP port of beacons in pcap captures, 0 for any (default: {})".format(BEACON_PORT))
+    parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE >> 20,
+                        help="MiB of capture decoded at once by a process (default: {})".format(CHUNK_SIZE >> 20))
+    args = parser.parse_args()
+
+    if len(args.captures) == 0:
+        print(IPNDMessage.decode(sys.stdin.buffer.read()))
+        return
+
+    summaries = {}
+    counters = dict.fromkeys(COUNTERS, 0)
+    for path in args.captures:
+        summarize(path, args.workers, args.port, args.chunk_size << 20, summaries, counters)
+
+    write_summaries(summaries, args.format)
+
+    print("{} records, {} beacons from {} neighbors, {} other packets, {} invalid".format(
+        counters["records"], counters["beacons"], len(summaries), counters["skipped"],
+        counters["invalid"]), file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+import time
+
+# Beacons per second the whole segment should carry, shared by all nodes
+TARGET_RATE = 10.0
+# Beacon period as a fraction of the mean time a neighbor stays around
+LIFETIME_FRACTION = 0.1
+ADJUST_INTERVAL = 10
+SMOOTHING = 0.5
+# Largest change of the period in one adjustment, as a factor
+MAX_STEP = 2.0
+
+
+def table_counters(table):
+    # Counters of a NeighborTable, as watched by a PeriodController
+    return lambda: (len(table), table.updates + table.skipped, table.added + table.expired)
+
+
+class PeriodController:
+    """
+    Beacon period following the neighborhood seen by the client.
+
+    Nodes share `target_rate` beacons per second on the segment: the
+    period grows from the configured one with the neighbor count, and
+    further when neighbors already send more than the target. Only churn,
+    neighbors appearing and expiring, makes it shorter than configured,
+    down to a fraction of how long neighbors stay. Rates are
+    smoothed, the period changes by at most `MAX_STEP` per adjustment and
+    stays within [min_period, max_period] whole seconds.
+
+    `counters` returns the current neighbor count with the totals of
+    beacons received and of neighbors added or expired. `adjust` is meant
+    to run every `interval` seconds, `on_change` is called with each new
+    period.
+    """
+
+    def __init__(self, period: int, min_period: int, max_period: int,
+                 target_rate: float = TARGET_RATE, interval: float = ADJUST_INTERVAL,
+                 clock=time.monotonic):
+        assert 1 <= min_period <= max_period, "Period bounds must satisfy 1 <= min <= max"
+        self.min_period = min_period
+        self.max_period = max_period
+        self.period = min(max_period, max(min_period, period))
+        self.base_period = self.period
+        self.target_rate = target_rate
+        self.interval = interval
+        self.clock = clock
+        self.counters = None
+        self.on_change = None
+        self.arrival_rate = None
+        self.churn_rate = None
+        self.last = None
+
+    def watch(self, counters):
+        self.counters = counters
+        self.last = None
+
+    def target(self, neighbors: int, arrival_rate: float, churn_rate: float) -> float:
+        period = max(self.base_period, (neighbors + 1) / self.target_rate)
+
+        if arrival_rate > self.target_rate:
+            period *= arrival_rate / self.target_rate
+
+        if churn_rate > 0:
+            period = min(period, LIFETIME_FRACTION * max(neighbors, 1) / churn_rate)
+
+        return min(self.max_period, max(self.min_period, period))
+
+    def adjust(self, now: float = None) -> int:
+        if self.counters is None:
+            return self.period
+
+        if now is None:
+            now = self.clock()
+
+        (neighbors, beacons, churn) = self.counters()
+
+        if self.last is None or now <= self.last[0]:
+            self.last = (now, beacons, churn)
+            return self.period
+
+        (last_time, last_beacons, last_churn) = self.last
+        self.last = (now, beacons, churn)
+
+        arrival_rate = (beacons - last_beacons) / (now - last_time)
+        churn_rate = (churn - last_churn) / (now - last_time)
+
+        if self.arrival_rate is None:
+            (self.arrival_rate, self.churn_rate) = (arrival_rate, churn_rate)
+        else:
+            self.arrival_rate += SMOOTHING * (arrival_rate - self.arrival_rate)
+            self.churn_rate += SMOOTHING * (churn_rate - self.churn_rate)
+
+        period = self.target(neighbors, self.arrival_rate, self.churn_rate)
+        period = min(self.period * MAX_STEP, max(self.period / MAX_STEP, period))
+        period = min(self.max_period, max(self.min_period, int(round(period))))
+
+        if period != self.period:
+            self.period = period
+            if self.on_change is not None:
+                self.on_change(period)
+
+        return period
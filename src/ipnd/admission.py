@@ -0,0 +1,130 @@
+import heapq
+
+EID_FLAG = 0b00000001
+SERVICES_FLAG = 0b00000010
+PERIOD_FLAG = 0b00001000
+KNOWN_FLAGS = EID_FLAG | SERVICES_FLAG | PERIOD_FLAG
+
+VERSION = 0x04
+# Version, flags, sequence number, at least a one byte EID, then the period
+MIN_LENGTH = 7
+MAX_LENGTH = 4096
+
+SOURCE_RATE = 5.0
+SOURCE_BURST = 10.0
+MAX_SOURCES = 4096
+
+REJECTIONS = ("truncated", "length", "version", "flags", "eid", "services", "period", "rate")
+
+
+def check_header(data: bytes, max_length: int = MAX_LENGTH) -> str:
+    # Reason to reject the beacon, or None when its header is plausible
+    # and it has the EID and period neighbors need. SDNVs of the header
+    # longer than 2 bytes are rejected
+    length = len(data)
+
+    if length < MIN_LENGTH or length > max_length:
+        return "length"
+
+    if data[0] != VERSION:
+        return "version"
+
+    flags = data[1]
+    if flags & ~KNOWN_FLAGS:
+        return "flags"
+
+    if not flags & EID_FLAG:
+        return "eid"
+
+    # Neighbors are expired after a number of their periods
+    if not flags & PERIOD_FLAG:
+        return "period"
+
+    eid_length = data[4]
+    offset = 5
+    if eid_length >= 0x80:
+        if data[5] >= 0x80:
+            return "eid"
+        eid_length = ((eid_length & 0x7F) << 7) | data[5]
+        offset = 6
+
+    offset += eid_length
+    if eid_length == 0 or offset > length:
+        return "eid"
+
+    if flags & SERVICES_FLAG:
+        if offset >= length:
+            return "services"
+
+        services = data[offset]
+        offset += 1
+        if services >= 0x80:
+            if offset >= length or data[offset] >= 0x80:
+                return "services"
+            services = ((services & 0x7F) << 7) | data[offset]
+            offset += 1
+
+        # A service takes at least a tag and one byte
+        if services * 2 > length - offset:
+            return "services"
+
+    return None
+
+
+class Admission:
+    """
+    Checks run on each received datagram before it is queued for
+    decoding: a header check with `check_header`, then a token bucket per
+    source address refilled with `rate` tokens per second up to `burst`.
+
+    Rejected datagrams are counted by reason in `rejected`. At most
+    `max_sources` buckets are kept, those of quiet sources are dropped
+    first.
+    """
+
+    def __init__(self, rate: float = SOURCE_RATE, burst: float = SOURCE_BURST,
+                 max_length: int = MAX_LENGTH, max_sources: int = MAX_SOURCES):
+        self.rate = rate
+        self.burst = burst
+        self.max_length = max_length
+        self.max_sources = max_sources
+        # Source address to [tokens, last refill]
+        self.buckets = {}
+        self.admitted = 0
+        self.rejected = dict.fromkeys(REJECTIONS, 0)
+
+    def admit(self, data: bytes, source, now: float, truncated: bool = False) -> bool:
+        reason = "truncated" if truncated else check_header(data, self.max_length)
+
+        if reason is None:
+            bucket = self.buckets.get(source[0])
+
+            if bucket is None:
+                if len(self.buckets) >= self.max_sources:
+                    self.evict(now)
+                bucket = [self.burst, now]
+                self.buckets[source[0]] = bucket
+            else:
+                tokens = bucket[0] + (now - bucket[1]) * self.rate
+                bucket[0] = tokens if tokens < self.burst else self.burst
+                bucket[1] = now
+
+            if bucket[0] >= 1:
+                bucket[0] -= 1
+                self.admitted += 1
+                return True
+
+            reason = "rate"
+
+        self.rejected[reason] += 1
+        return False
+
+    def evict(self, now: float):
+        # Buckets refilled by now are those of sources gone quiet. Under a
+        # flood of spoofed sources the least recently seen go too, leaving
+        # room for a quarter of max_sources before the next eviction
+        refill = self.burst / self.rate
+        buckets = [(address, bucket) for (address, bucket) in self.buckets.items()
+                   if now - bucket[1] < refill]
+        self.buckets = dict(heapq.nlargest(self.max_sources * 3 // 4, buckets,
+                                           key=lambda it: it[1][1]))
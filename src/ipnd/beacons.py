@@ -0,0 +1,202 @@
+import socket
+
+from . import metrics, sockets
+from .emitter import BeaconEmitter
+from .message import IPNDMessage
+from .netwatch import Interfaces
+from .scheduler import BeaconScheduler, Timer
+from .service import TCPCLService
+
+TCPCL_PORT = 4556
+
+
+def format_destination(family: int, destination: tuple) -> str:
+    if family == socket.AF_INET6:
+        return "[{}]:{}".format(*destination)
+    return "{}:{}".format(*destination)
+
+
+class InterfaceBeacons:
+    """
+    One beacon emitter per network interface having addresses, each on
+    its own timer of `scheduler`, advertising the TCPCL services of all
+    interfaces.
+
+    `watch` applies events of a `netwatch` watcher: emitters get senders
+    for the address families an interface gains, lose those of families
+    it no longer has, and their timer stops while they have none. The
+    services of the beacons are replaced only when the addresses
+    advertised actually changed, so that their encoding stays cached.
+    Receivers given to `add_receiver` join the group of their family on
+    the interfaces sent on, and leave it with their sender.
+
+    Interfaces in `periods` keep their own period, the period of the
+    others is `period` or follows `controller`. `destinations` maps each
+    address family to the group and port beacons are sent to.
+    """
+
+    def __init__(self, eid: str, scheduler: BeaconScheduler, destinations: dict, period: int,
+                 periods: dict = {}, controller=None, fast_discovery=None,
+                 sender=sockets.multicast_sender):
+        self.eid = eid
+        self.scheduler = scheduler
+        self.destinations = destinations
+        self.period = period
+        self.periods = periods
+        self.controller = controller
+        self.fast_discovery = fast_discovery
+        self.sender = sender
+        self.interfaces = Interfaces()
+        # Interface name to (emitter, timer)
+        self.emitters = {}
+        # Address family to receiving sockets
+        self.receivers = {}
+        self.advertised = None
+        self.services = ()
+        self.changes = 0
+
+        if controller is not None:
+            controller.on_change = self.set_period
+
+    def start(self, interfaces: dict):
+        self.interfaces = Interfaces(interfaces)
+        self.sync(self.interfaces.current().keys())
+
+        if self.controller is not None:
+            self.scheduler.add("adaptive-period", self.controller.interval, self.controller.adjust)
+            print("Adapting the beacon period between {}s and {}s".format(
+                self.controller.min_period, self.controller.max_period))
+
+    def watch(self, events, interfaces=None):
+        # interfaces lists the addresses again, after a resync event
+        if any(kind == "resync" for (kind, _, _, _) in events) and interfaces is not None:
+            names = set(self.interfaces.current()) | set(interfaces)
+            self.interfaces = Interfaces(interfaces)
+            self.sync(names)
+            return
+
+        changed = self.interfaces.apply(events)
+        if len(changed) > 0:
+            self.sync(changed)
+
+    def sync(self, names):
+        current = self.interfaces.current()
+
+        advertised = tuple((family, it["addr"]) for addresses in current.values()
+                           for family in (socket.AF_INET, socket.AF_INET6)
+                           for it in addresses.get(family, []))
+
+        if advertised != self.advertised:
+            self.advertised = advertised
+            self.services = tuple(TCPCLService(address, TCPCL_PORT) for (_, address) in advertised)
+            self.changes += 1
+
+            print("Advertizing services :")
+            for it in self.services:
+                print("\t", it)
+
+            for (emitter, _) in self.emitters.values():
+                emitter.message.services = self.services
+
+        for name in names:
+            self.sync_interface(name, current.get(name, {}))
+
+    def sync_interface(self, name: str, addresses: dict):
+        entry = self.emitters.get(name)
+
+        if entry is None:
+            if len(addresses) == 0:
+                return
+            entry = self.add_interface(name)
+
+        (emitter, timer) = entry
+
+        for (family, destination) in self.destinations.items():
+            sending = any(address == destination for (_, address) in emitter.destinations)
+
+            if family in addresses and not sending:
+                try:
+                    sender = self.sender(family, interface=name)
+                except OSError as e:
+                    # Gone again before its events were read
+                    print("Cannot emit on {} {} : {}".format(name, format_destination(family, destination), e))
+                    continue
+                emitter.add_destination(sender, destination)
+                print("Emitting on {} {}".format(name, format_destination(family, destination)))
+                self.set_membership(family, name, True)
+            elif family not in addresses and sending:
+                emitter.remove_destination(destination)
+                print("Stopped emitting on {} {}".format(name, format_destination(family, destination)))
+                self.set_membership(family, name, False)
+
+        if len(emitter.destinations) > 0 and timer.entry is None:
+            self.scheduler.resume(timer)
+            print("Advertizing {} on {} (period: {}s)".format(self.eid, name, timer.period))
+        elif len(emitter.destinations) == 0 and timer.entry is not None:
+            self.scheduler.cancel(timer)
+            print("Stopped advertizing on {}".format(name))
+
+    def add_receiver(self, family, sock: socket.socket):
+        self.receivers.setdefault(family, []).append(sock)
+
+        destination = self.destinations[family]
+        for (name, (emitter, _)) in self.emitters.items():
+            if any(address == destination for (_, address) in emitter.destinations):
+                self.join(sock, family, name, True)
+
+    def set_membership(self, family, name: str, joined: bool):
+        for sock in self.receivers.get(family, []):
+            self.join(sock, family, name, joined)
+
+    def join(self, sock: socket.socket, family, name: str, joined: bool):
+        (group, _) = self.destinations[family]
+        try:
+            if joined:
+                sockets.join_group(sock, family, group, name)
+            else:
+                sockets.leave_group(sock, family, group, name)
+        except OSError as e:
+            # Memberships of a removed interface are already dropped
+            print("Cannot {} {} on {} : {}".format("join" if joined else "leave", group, name, e))
+            return
+        print("{} {} on {}".format("Joined" if joined else "Left", group, name))
+
+    def add_interface(self, name: str) -> tuple:
+        period = self.periods.get(name, self.period if self.controller is None else self.controller.period)
+
+        message = IPNDMessage()
+        message.eid = self.eid
+        message.period = period
+        message.sequence_number = 0
+        message.services = self.services
+
+        # Replies to new neighbors are the beacon of the first interface
+        if self.fast_discovery is not None and self.fast_discovery.message is None:
+            self.fast_discovery.message = message
+
+        emitter = BeaconEmitter(message)
+        # Started once the interface has a sender
+        timer = Timer(name, period, emitter.emit)
+
+        metrics.register_emitter(emitter, name)
+        metrics.register_timer(timer)
+
+        self.emitters[name] = (emitter, timer)
+        return (emitter, timer)
+
+    def set_period(self, period: int):
+        for (name, (emitter, timer)) in self.emitters.items():
+            if name in self.periods:
+                continue
+            emitter.message.period = period
+            if timer.entry is not None:
+                self.scheduler.set_period(timer, period)
+            else:
+                timer.period = period
+        print("\rBeacon period set to {}s".format(period))
+
+    def close(self):
+        for (emitter, timer) in self.emitters.values():
+            self.scheduler.cancel(timer)
+            emitter.close()
+        self.emitters = {}
@@ -0,0 +1,447 @@
+import collections
+import math
+import mmap
+import multiprocessing
+import struct
+
+from .message import LazyIPNDMessage
+from .service import CLAService
+
+# Beacon dumps: this magic, then for each beacon its reception time in
+# seconds since the epoch, its length and the beacon itself
+DUMP_MAGIC = b"IPNDCAP1"
+DUMP_RECORD = struct.Struct("!dI")
+
+PCAP_HEADER_SIZE = 24
+PCAP_MAGICS = {
+    b"\xd4\xc3\xb2\xa1": ("<", 1e-6),
+    b"\xa1\xb2\xc3\xd4": (">", 1e-6),
+    b"\x4d\x3c\xb2\xa1": ("<", 1e-9),
+    b"\xa1\xb2\x3c\x4d": (">", 1e-9),
+}
+
+LINKTYPE_NULL = 0
+LINKTYPE_ETHERNET = 1
+LINKTYPE_RAW = (12, 101)
+LINKTYPE_IPV4 = 228
+LINKTYPE_IPV6 = 229
+LINKTYPE_LINUX_SLL = 113
+LINKTYPE_LINUX_SLL2 = 276
+
+ETHERTYPE_IPV4 = 0x0800
+ETHERTYPE_IPV6 = 0x86DD
+ETHERTYPE_VLAN = (0x8100, 0x88A8)
+IPPROTO_UDP = 17
+
+BEACON_PORT = 3003
+CHUNK_SIZE = 16 << 20
+# Advertised CLA addresses kept per neighbor
+MAX_CLAS = 16
+
+COUNTERS = ("records", "beacons", "skipped", "invalid")
+FIELDS = ("eid", "first_seen", "last_seen", "beacons", "duplicates", "missed", "restarts",
+          "period", "interval_mean", "interval_stddev", "clas")
+
+
+class CaptureFormat:
+
+    def __init__(self, kind: str, endian: str = "!", resolution: float = 1.0, linktype: int = None):
+        self.kind = kind
+        self.endian = endian
+        self.resolution = resolution
+        self.linktype = linktype
+        self.record = DUMP_RECORD if kind == "dump" else struct.Struct(endian + "IIII")
+        self.start = len(DUMP_MAGIC) if kind == "dump" else PCAP_HEADER_SIZE
+
+    def __reduce__(self):
+        # Sent to pool processes, structs cannot be pickled
+        return (CaptureFormat, (self.kind, self.endian, self.resolution, self.linktype))
+
+    def record_length(self, buffer, offset: int) -> int:
+        # Length of the record at offset, header included
+        if self.kind == "dump":
+            return DUMP_RECORD.size + DUMP_RECORD.unpack_from(buffer, offset)[1]
+        return self.record.size + self.record.unpack_from(buffer, offset)[2]
+
+
+def detect(buffer) -> CaptureFormat:
+    if buffer[:len(DUMP_MAGIC)] == DUMP_MAGIC:
+        return CaptureFormat("dump")
+
+    magic = bytes(buffer[:4])
+    if magic in PCAP_MAGICS and len(buffer) >= PCAP_HEADER_SIZE:
+        (endian, resolution) = PCAP_MAGICS[magic]
+        linktype = struct.unpack_from(endian + "I", buffer, 20)[0] & 0x0FFFFFFF
+        return CaptureFormat("pcap", endian, resolution, linktype)
+
+    raise Exception("Unknown capture format, expected a pcap capture or a beacon dump "
+                    "(pcapng captures can be converted with editcap -F pcap)")
+
+
+def chunk_ranges(buffer, format: CaptureFormat, chunk_size: int = CHUNK_SIZE):
+    # (start, end) ranges of about chunk_size bytes, cut between records.
+    # Only record headers are read, pages already walked are dropped
+    offset = format.start
+    start = offset
+    end = len(buffer)
+
+    while offset + format.record.size <= end:
+        length = format.record_length(buffer, offset)
+        if offset + length > end:
+            break
+        offset += length
+
+        if offset - start >= chunk_size:
+            yield (start, offset)
+            release(buffer, start, offset)
+            start = offset
+
+    if offset > start:
+        yield (start, offset)
+
+
+def release(buffer, start: int, end: int):
+    # Drops the pages of a read-only mapping between start and end
+    if not hasattr(buffer, "madvise"):
+        return
+    start -= start % mmap.PAGESIZE
+    end -= end % mmap.PAGESIZE
+    if end > start:
+        buffer.madvise(mmap.MADV_DONTNEED, start, end - start)
+
+
+def udp_payload(packet, linktype: int, port: int) -> tuple:
+    # (start, end) of the UDP payload of a captured packet sent to port,
+    # None for any other packet. Port 0 matches any
+    offset = 0
+    version = None
+
+    if linktype == LINKTYPE_ETHERNET:
+        ethertype = int.from_bytes(packet[12:14], "big")
+        offset = 14
+        while ethertype in ETHERTYPE_VLAN:
+            ethertype = int.from_bytes(packet[offset+2:offset+4], "big")
+            offset += 4
+        version = 4 if ethertype == ETHERTYPE_IPV4 else 6 if ethertype == ETHERTYPE_IPV6 else None
+    elif linktype == LINKTYPE_LINUX_SLL:
+        ethertype = int.from_bytes(packet[14:16], "big")
+        offset = 16
+        version = 4 if ethertype == ETHERTYPE_IPV4 else 6 if ethertype == ETHERTYPE_IPV6 else None
+    elif linktype == LINKTYPE_LINUX_SLL2:
+        ethertype = int.from_bytes(packet[0:2], "big")
+        offset = 20
+        version = 4 if ethertype == ETHERTYPE_IPV4 else 6 if ethertype == ETHERTYPE_IPV6 else None
+    elif linktype == LINKTYPE_NULL:
+        offset = 4
+        version = packet[4] >> 4 if len(packet) > 4 else None
+    elif linktype in LINKTYPE_RAW or linktype in (LINKTYPE_IPV4, LINKTYPE_IPV6):
+        version = packet[0] >> 4 if len(packet) > 0 else None
+
+    if version == 4:
+        if len(packet) < offset + 20 or packet[offset+9] != IPPROTO_UDP:
+            return None
+        # Fragments other than the first are not reassembled
+        if int.from_bytes(packet[offset+6:offset+8], "big") & 0x1FFF:
+            return None
+        end = min(len(packet), offset + int.from_bytes(packet[offset+2:offset+4], "big"))
+        offset += (packet[offset] & 0x0F) * 4
+    elif version == 6:
+        # Extension headers are not followed
+        if len(packet) < offset + 40 or packet[offset+6] != IPPROTO_UDP:
+            return None
+        end = min(len(packet), offset + 40 + int.from_bytes(packet[offset+4:offset+6], "big"))
+        offset += 40
+    else:
+        return None
+
+    if offset + 8 > end:
+        return None
+    if port != 0 and int.from_bytes(packet[offset+2:offset+4], "big") != port:
+        return None
+
+    return (offset + 8, min(end, offset + int.from_bytes(packet[offset+4:offset+6], "big")))
+
+
+def records(buffer, format: CaptureFormat, start: int, end: int, port: int, counters: dict):
+    # (timestamp, beacon) of the records between start and end
+    offset = start
+    record = format.record
+
+    while offset + record.size <= end:
+        counters["records"] += 1
+
+        if format.kind == "dump":
+            (timestamp, length) = record.unpack_from(buffer, offset)
+            offset += record.size
+            yield (timestamp, buffer[offset:offset+length])
+            offset += length
+            continue
+
+        (seconds, fraction, length, _) = record.unpack_from(buffer, offset)
+        offset += record.size
+        packet = buffer[offset:offset+length]
+        offset += length
+
+        payload = udp_payload(packet, format.linktype, port)
+        if payload is None:
+            counters["skipped"] += 1
+            continue
+
+        yield (seconds + fraction * format.resolution, packet[payload[0]:payload[1]])
+
+
+class NeighborSummary:
+    """
+    Beacons of one neighbor in a capture.
+
+    Intervals between beacons are divided by the number of sequence
+    numbers they span, so beacons missed do not count as jitter. Their
+    mean and variance are kept with Welford's method, summaries of
+    consecutive parts of a capture are combined with `merge`.
+
+    The interval following the first beacon is held back in `lead` until
+    `settle`: when a part starts with a copy of the last beacon of the
+    previous one, `merge` measures it from the original beacon instead.
+    """
+
+    __slots__ = ("eid", "first_seen", "last_seen", "first_sequence", "last_sequence", "beacons",
+                 "duplicates", "missed", "restarts", "period", "intervals", "interval_mean",
+                 "interval_m2", "lead", "clas", "body")
+
+    def __init__(self, eid: str):
+        self.eid = eid
+        self.first_seen = None
+        self.last_seen = None
+        self.first_sequence = None
+        self.last_sequence = None
+        self.beacons = 0
+        self.duplicates = 0
+        self.missed = 0
+        self.restarts = 0
+        self.period = None
+        self.intervals = 0
+        self.interval_mean = 0.0
+        self.interval_m2 = 0.0
+        # (timestamp, sequence numbers spanned) of the second beacon
+        self.lead = None
+        self.clas = {}
+        # Body of the last beacon, services are only decoded when it changes
+        self.body = None
+
+    def add_interval(self, interval: float, count: int = 1, mean: float = None, m2: float = 0.0):
+        if mean is None:
+            mean = interval
+        total = self.intervals + count
+        delta = mean - self.interval_mean
+        self.interval_mean += delta * count / total
+        self.interval_m2 += m2 + delta * delta * self.intervals * count / total
+        self.intervals = total
+
+    def follow(self, timestamp: float, sequence_number: int) -> bool:
+        # Accounts for a beacon following the last one, False for a duplicate
+        if self.last_sequence is None:
+            self.first_seen = timestamp
+            self.first_sequence = sequence_number
+            return True
+
+        step = (sequence_number - self.last_sequence) & 0xFFFF
+
+        if step == 0:
+            self.duplicates += 1
+            return False
+
+        # Far behind the last one, the neighbor started over
+        if step >= 0x8000:
+            self.restarts += 1
+        else:
+            self.missed += step - 1
+            if self.beacons == 1:
+                self.lead = (timestamp, step)
+            else:
+                self.add_interval((timestamp - self.last_seen) / step)
+
+        return True
+
+    def settle(self):
+        # Accounts for the interval held back in lead
+        if self.lead is not None:
+            (timestamp, step) = self.lead
+            self.lead = None
+            self.add_interval((timestamp - self.first_seen) / step)
+
+    def add(self, timestamp: float, message: LazyIPNDMessage):
+        body = message.body
+        if body != self.body:
+            # Decoded first, a beacon failing to decode is not accounted
+            message.decode_body()
+            self.body = body
+            self.period = message.period
+            for service in message.services:
+                if isinstance(service, CLAService) and len(self.clas) < MAX_CLAS:
+                    self.clas[service.get_cla_address()] = None
+
+        if not self.follow(timestamp, message.sequence_number):
+            return
+
+        self.beacons += 1
+        self.last_seen = timestamp
+        self.last_sequence = message.sequence_number
+
+    def merge(self, other):
+        # Adds the summary of the part of the capture right after this one
+        if other.first_sequence is None:
+            return
+
+        if self.last_sequence is None:
+            self.first_seen = other.first_seen
+            self.first_sequence = other.first_sequence
+            self.beacons = other.beacons
+            self.lead = other.lead
+        elif self.follow(other.first_seen, other.first_sequence):
+            self.beacons += other.beacons
+            other.settle()
+        else:
+            # A copy of our last beacon, the second beacon of other
+            # actually follows that last beacon
+            self.beacons += other.beacons - 1
+            if other.lead is not None:
+                (timestamp, step) = other.lead
+                other.lead = None
+                self.add_interval((timestamp - self.last_seen) / step)
+            if other.beacons == 1:
+                other.last_seen = self.last_seen
+
+        self.last_seen = other.last_seen
+        self.last_sequence = other.last_sequence
+        self.duplicates += other.duplicates
+        self.missed += other.missed
+        self.restarts += other.restarts
+        self.period = other.period
+        if other.intervals > 0:
+            self.add_interval(None, other.intervals, other.interval_mean, other.interval_m2)
+        for cla_address in other.clas:
+            if len(self.clas) < MAX_CLAS:
+                self.clas[cla_address] = None
+        self.body = other.body
+
+    def to_dict(self) -> dict:
+        self.settle()
+        stddev = math.sqrt(self.interval_m2 / self.intervals) if self.intervals > 0 else None
+        return {
+            "eid": self.eid,
+            "first_seen": self.first_seen,
+            "last_seen": self.last_seen,
+            "beacons": self.beacons,
+            "duplicates": self.duplicates,
+            "missed": self.missed,
+            "restarts": self.restarts,
+            "period": self.period,
+            "interval_mean": self.interval_mean if self.intervals > 0 else None,
+            "interval_stddev": stddev,
+            "clas": list(self.clas),
+        }
+
+
+def summarize_range(buffer, format: CaptureFormat, start: int, end: int,
+                    port: int = BEACON_PORT) -> tuple:
+    # (summaries by EID, counters) of the records between start and end
+    summaries = {}
+    counters = dict.fromkeys(COUNTERS, 0)
+
+    for (timestamp, data) in records(buffer, format, start, end, port, counters):
+        try:
+            message = LazyIPNDMessage.decode(data)
+            if message.eid is None:
+                raise Exception("No EID")
+
+            summary = summaries.get(message.eid)
+            if summary is None:
+                summary = NeighborSummary(message.eid)
+                summaries[message.eid] = summary
+
+            summary.add(timestamp, message)
+        except Exception:
+            counters["invalid"] += 1
+            continue
+
+        counters["beacons"] += 1
+
+    return (summaries, counters)
+
+
+def summarize_chunk(path: str, format: CaptureFormat, port: int, chunk: tuple) -> tuple:
+    # Entry point of pool processes, maps only the pages of its chunk
+    (start, end) = chunk
+    offset = start - start % mmap.ALLOCATIONGRANULARITY
+
+    with open(path, "rb") as file, \
+            mmap.mmap(file.fileno(), end - offset, access=mmap.ACCESS_READ, offset=offset) as buffer:
+        (summaries, counters) = summarize_range(buffer, format, start - offset, end - offset, port)
+
+    for summary in summaries.values():
+        summary.body = None
+
+    return (summaries, counters)
+
+
+def merge(summaries: dict, counters: dict, result: tuple):
+    (more_summaries, more_counters) = result
+
+    for (eid, summary) in more_summaries.items():
+        if eid in summaries:
+            summaries[eid].merge(summary)
+        else:
+            summaries[eid] = summary
+
+    for (name, value) in more_counters.items():
+        counters[name] += value
+
+
+def summarize(path: str, workers: int = 1, port: int = BEACON_PORT, chunk_size: int = CHUNK_SIZE,
+              summaries: dict = None, counters: dict = None) -> tuple:
+    """
+    Summaries by EID of the neighbors whose beacons are in a capture,
+    with counters of the records read.
+
+    The capture is split in chunks decoded by `workers` processes, each
+    mapping its chunk alone. At most two chunks per worker are in flight
+    and their summaries are merged in capture order, memory use depends
+    on the number of neighbors but not on the size of the capture.
+    Summaries of earlier captures can be passed to be continued.
+    """
+    if summaries is None:
+        summaries = {}
+    if counters is None:
+        counters = dict.fromkeys(COUNTERS, 0)
+
+    with open(path, "rb") as file:
+        if file.seek(0, 2) == 0:
+            return (summaries, counters)
+
+        with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as buffer:
+            format = detect(buffer)
+            ranges = chunk_ranges(buffer, format, chunk_size)
+
+            if workers <= 1:
+                for chunk in ranges:
+                    merge(summaries, counters, summarize_chunk(path, format, port, chunk))
+                return (summaries, counters)
+
+            with multiprocessing.get_context("spawn").Pool(workers) as pool:
+                pending = collections.deque()
+
+                for chunk in ranges:
+                    pending.append(pool.apply_async(summarize_chunk, (path, format, port, chunk)))
+                    if len(pending) >= 2 * workers:
+                        merge(summaries, counters, pending.popleft().get())
+
+                while len(pending) > 0:
+                    merge(summaries, counters, pending.popleft().get())
+
+    return (summaries, counters)
+
+
+def write_dump(file, timestamp: float, beacon: bytes):
+    # Appends a beacon to a dump, the file starts with DUMP_MAGIC
+    file.write(DUMP_RECORD.pack(timestamp, len(beacon)))
+    file.write(beacon)
@@ -0,0 +1,178 @@
+import time
+
+from .message import LazyIPNDMessage
+from .metrics import Histogram
+from .neighbors import NeighborTable, Neighbor
+from .service import CLAService
+
+# Only one header decode in this many is timed, timing them all would take
+# a third of the decoding time
+HEADER_SAMPLING = 16
+DUPLICATE_WINDOW = 8192
+# Lifetime of the keys of beacons from neighbors whose period is unknown
+DUPLICATE_LIFETIME = 1.0
+
+
+class DuplicateFilter:
+    """
+    Keys of the last `window` beacons received, to drop the copies of a
+    beacon received over both IPv4 and IPv6 or on several interfaces.
+
+    Keys are forgotten after the lifetime given to `seen`, about a period
+    of the neighbor: copies arrive within it, while a neighbor that
+    restarted sends its old sequence numbers again only later.
+    """
+
+    def __init__(self, window: int = DUPLICATE_WINDOW):
+        # Key to expiry time, in the order keys were added
+        self.keys = {}
+        self.window = window
+
+    def seen(self, key, now: float, lifetime: float) -> bool:
+        # True when key was seen less than its lifetime ago, otherwise it
+        # is remembered
+        expiry = self.keys.pop(key, None)
+        if expiry is not None and expiry > now:
+            self.keys[key] = expiry
+            return True
+
+        self.keys[key] = now + lifetime
+        if len(self.keys) > self.window:
+            del self.keys[next(iter(self.keys))]
+
+        return False
+
+
+class BeaconHandler:
+    """
+    Turns received beacons into neighbor contacts to push to µPCN.
+
+    `handle` returns the neighbor whose contact has to be pushed, or None
+    when the beacon is invalid, our own, a duplicate, or changes nothing.
+    Beacons without a period are invalid.
+    Duplicates are beacons with the same EID, sequence number and body as
+    one received less than a period ago. They still count as a sign of
+    life of their neighbor, but are dropped before decoding the body.
+
+    Among several CLA addresses advertised, the one used is picked by
+    `cla_selector` if any, otherwise it is the first one. `probed`
+    returns the neighbors whose pick changed since.
+    """
+
+    def __init__(self, own_eid: str, neighbors: NeighborTable, duplicates: DuplicateFilter = None,
+                 cla_selector=None):
+        self.own_eid = own_eid
+        self.neighbors = neighbors
+        self.duplicate_filter = duplicates if duplicates is not None else DuplicateFilter()
+        self.cla_selector = cla_selector
+        # Called with the EID and source address of each new neighbor
+        self.on_new_neighbor = None
+        self.received = 0
+        self.rejected = 0
+        self.self_echoed = 0
+        self.duplicates = 0
+        # Decoding of the header, sampled, then of the body when it changed
+        self.header_latency = Histogram()
+        self.body_latency = Histogram()
+
+    def handle(self, data: bytes, source: tuple = None) -> Neighbor:
+        self.received += 1
+
+        sampled = self.received % HEADER_SAMPLING == 0
+        start = time.perf_counter() if sampled else 0.0
+
+        try:
+            ipnd_mess = LazyIPNDMessage.decode(data)
+        except Exception as e:
+            print("Invalid ipnd packet received : {}".format(e))
+            self.rejected += 1
+            return None
+
+        if sampled:
+            self.header_latency.observe(time.perf_counter() - start)
+
+        if ipnd_mess.eid is None:
+            print("received message from unknown eid, skipping...")
+            self.rejected += 1
+            return None
+
+        if ipnd_mess.eid == self.own_eid:
+            # Advertized myself, skipping
+            self.self_echoed += 1
+            return None
+
+        body = ipnd_mess.body
+        now = time.monotonic()
+
+        if self.neighbors.refresh(ipnd_mess.eid, body, now, ipnd_mess.sequence_number):
+            return None
+
+        neighbor = self.neighbors.get(ipnd_mess.eid)
+        lifetime = neighbor.period if neighbor is not None else DUPLICATE_LIFETIME
+        if self.duplicate_filter.seen((ipnd_mess.eid, ipnd_mess.sequence_number, hash(body)),
+                                      now, lifetime):
+            self.duplicates += 1
+            return None
+
+        print("Received message from {}".format(
+            ipnd_mess.eid))
+
+        start = time.perf_counter()
+        try:
+            ipnd_mess.decode_body()
+        except Exception as e:
+            print("Invalid ipnd packet received : {}".format(e))
+            self.rejected += 1
+            return None
+        self.body_latency.observe(time.perf_counter() - start)
+
+        cla_service = list(filter(lambda it: isinstance(
+            it, CLAService), ipnd_mess.services))
+
+        if len(cla_service) == 0:
+            print("No CLA Service available")
+            self.rejected += 1
+            return None
+
+        cla_addresses = [service.get_cla_address() for service in cla_service]
+        if self.cla_selector is not None:
+            cla_address = self.cla_selector.select(ipnd_mess.eid, cla_addresses)
+        else:
+            cla_address = cla_addresses[0]
+
+        new = ipnd_mess.eid not in self.neighbors
+
+        try:
+            updated = self.neighbors.update(ipnd_mess.eid, cla_address,
+                                            ipnd_mess.period, ipnd_mess.services,
+                                            advertisement=body, sequence_number=ipnd_mess.sequence_number)
+        except Exception as e:
+            print("Invalid ipnd packet received : {}".format(e))
+            self.rejected += 1
+            return None
+
+        if not updated:
+            return None
+
+        print("Updating contact with {} ({} updates skipped, {} duplicates dropped)".format(
+            ipnd_mess.eid, self.neighbors.skipped, self.duplicates))
+
+        if new and source is not None and self.on_new_neighbor is not None:
+            self.on_new_neighbor(ipnd_mess.eid, source)
+
+        return self.neighbors.get(ipnd_mess.eid)
+
+    def probed(self) -> list[Neighbor]:
+        # Neighbors whose contact has to be pushed again as probes found
+        # a better CLA address for them
+        if self.cla_selector is None:
+            return []
+
+        neighbors = []
+        for (eid, cla_address) in self.cla_selector.completed():
+            neighbor = self.neighbors.set_cla_address(eid, cla_address)
+            if neighbor is not None:
+                print("Switching contact with {} to {}".format(eid, cla_address))
+                neighbors.append(neighbor)
+
+        return neighbors
@@ -0,0 +1,45 @@
+import time
+
+from .message import IPNDMessage
+from .metrics import Histogram
+
+
+class BeaconEmitter:
+
+    def __init__(self, message: IPNDMessage):
+        self.message = message
+        self.destinations = []
+        self.sent = 0
+        self.errors = 0
+        self.encode_latency = Histogram()
+
+    def add_destination(self, sock, address):
+        self.destinations.append((sock, address))
+
+    def remove_destination(self, address):
+        for (sock, it) in self.destinations:
+            if it == address:
+                sock.close()
+        self.destinations = [(sock, it) for (sock, it) in self.destinations if it != address]
+
+    def emit(self):
+        print("\rBeacon {} ".format(self.message.sequence_number), end="")
+
+        start = time.perf_counter()
+        encoded_message = self.message.encode_cached()
+        self.encode_latency.observe(time.perf_counter() - start)
+
+        for (sock, address) in self.destinations:
+            try:
+                sock.sendto(encoded_message, address)
+                self.sent += 1
+            except OSError as e:
+                self.errors += 1
+                print("Failed to send beacon to {} : {}".format(address, e))
+
+        self.message.sequence_number = (self.message.sequence_number + 1) & 0xFFFF
+
+    def close(self):
+        for (sock, _) in self.destinations:
+            sock.close()
+        self.destinations = []
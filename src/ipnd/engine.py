@@ -0,0 +1,111 @@
+import asyncio
+from .discovery import BeaconHandler
+from .receiver import BatchReceiver, QUEUE_SIZE
+from .scheduler import BeaconScheduler
+
+
+class BeaconEngine:
+    """
+    Beacon timers, beacon receivers and contact pushes on one event loop.
+
+    Receiving sockets are drained on each wakeup by a `BatchReceiver`
+    feeding the processing stage through a bounded queue. `push` is a
+    coroutine function called with each neighbor whose contact has to be
+    sent to µPCN; pushes of a batch run concurrently. `withdraw` is
+    called likewise with each neighbor expired from the neighbor table.
+    """
+
+    def __init__(self, scheduler: BeaconScheduler, handler: BeaconHandler, push, withdraw=None,
+                 queue_size=QUEUE_SIZE, admission=None):
+        self.scheduler = scheduler
+        self.handler = handler
+        self.push = push
+        self.withdraw = withdraw
+        self.queue = asyncio.Queue(queue_size)
+        self.receiver = BatchReceiver(self.queue, admission=admission)
+        self.stopping = None
+
+    def add_receiver(self, sock):
+        self.receiver.add_socket(sock)
+
+    async def emit(self):
+        changed = asyncio.Event()
+        self.scheduler.on_change = changed.set
+
+        try:
+            while True:
+                self.scheduler.run_pending()
+                changed.clear()
+
+                delay = self.scheduler.next_delay()
+                try:
+                    await asyncio.wait_for(changed.wait(), delay)
+                except asyncio.TimeoutError:
+                    pass
+        finally:
+            self.scheduler.on_change = None
+
+    async def process(self):
+        table = self.handler.neighbors
+
+        while True:
+            try:
+                batch = await asyncio.wait_for(self.queue.get(), table.next_expiry())
+            except asyncio.TimeoutError:
+                batch = []
+            while not self.queue.empty():
+                batch += self.queue.get_nowait()
+
+            neighbors = self.handler.probed()
+            for (data, source) in batch:
+                try:
+                    neighbor = self.handler.handle(data, source)
+                except Exception as e:
+                    print("Failed to handle beacon from {} : {}".format(source[0], e))
+                    continue
+                if neighbor is not None:
+                    neighbors.append(neighbor)
+
+            expired = table.expire()
+            for neighbor in expired:
+                print("Neighbor {} expired".format(neighbor.eid))
+
+            if len(neighbors) > 0:
+                await self.apply(self.push, neighbors, "push contact with")
+
+            if len(expired) > 0 and self.withdraw is not None:
+                await self.apply(self.withdraw, expired, "withdraw contact with")
+
+    async def apply(self, fn, neighbors, action: str):
+        results = await asyncio.gather(*map(fn, neighbors), return_exceptions=True)
+        for (neighbor, result) in zip(neighbors, results):
+            if isinstance(result, Exception):
+                print("Failed to {} {} : {}".format(action, neighbor.eid, result))
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        self.stopping = asyncio.Event()
+
+        for sock in self.receiver.sockets:
+            loop.add_reader(sock, self.receiver.receive, sock)
+
+        tasks = [asyncio.create_task(self.emit()),
+                 asyncio.create_task(self.process())]
+
+        try:
+            stop_task = asyncio.create_task(self.stopping.wait())
+            (done, _) = await asyncio.wait(tasks + [stop_task],
+                                           return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task is not stop_task:
+                    task.result()
+        finally:
+            for task in tasks + [stop_task]:
+                task.cancel()
+            await asyncio.gather(*tasks, stop_task, return_exceptions=True)
+            for sock in self.receiver.sockets:
+                loop.remove_reader(sock)
+            self.receiver.close()
+
+    def stop(self):
+        self.stopping.set()
@@ -0,0 +1,72 @@
+import socket
+import time
+
+from .message import IPNDMessage
+
+REPLY_INTERVAL = 10
+MAX_REPLIED = 4096
+
+
+class FastDiscovery:
+    """
+    Answers the first beacon of a new neighbor with our own beacon, sent
+    by unicast to the port beacons are received on, so that the neighbor
+    does not wait for our next periodic beacon to know us.
+
+    At most one reply is sent to an EID every `interval` seconds. The
+    beacon sent is `message`, encoded again for each reply as it belongs
+    to the emitter.
+    """
+
+    def __init__(self, port: int, interval: float = REPLY_INTERVAL, sockets: dict = None,
+                 clock=time.monotonic):
+        self.port = port
+        self.interval = interval
+        self.message: IPNDMessage = None
+        # Sending socket of each address family
+        self.sockets = sockets if sockets is not None else {}
+        self.clock = clock
+        self.replied = {}
+        self.sent = 0
+        self.limited = 0
+        self.errors = 0
+
+    def reply(self, eid: str, source: tuple) -> bool:
+        if self.message is None:
+            return False
+
+        now = self.clock()
+
+        last = self.replied.get(eid)
+        if last is not None and now - last < self.interval:
+            self.limited += 1
+            return False
+
+        if len(self.replied) >= MAX_REPLIED:
+            self.replied = {eid: last for (eid, last) in self.replied.items()
+                            if now - last < self.interval}
+        self.replied[eid] = now
+
+        # IPv6 source addresses come with their flow info and scope id
+        family = socket.AF_INET6 if len(source) == 4 else socket.AF_INET
+        destination = (source[0], self.port) + tuple(source[2:])
+
+        sock = self.sockets.get(family)
+        if sock is None:
+            sock = socket.socket(family, socket.SOCK_DGRAM)
+            self.sockets[family] = sock
+
+        try:
+            sock.sendto(self.message.encode(), destination)
+            self.sent += 1
+        except OSError as e:
+            self.errors += 1
+            print("Failed to reply to {} at {} : {}".format(eid, source[0], e))
+            return False
+
+        return True
+
+    def close(self):
+        for sock in self.sockets.values():
+            sock.close()
+        self.sockets = {}
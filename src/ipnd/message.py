@@ -1,14 +1,32 @@
+import struct
 from .sdnv import SDNVUtil
 from .service import Service, decode_services
 
+SEQUENCE_NUMBER = struct.Struct("!H")
+SEQUENCE_NUMBER_OFFSET = 2
+
 class IPNDMessage:
 
-    version:bytes = 0x04
+    __slots__ = ("version", "eid", "period", "sequence_number", "_services",
+                 "_template", "_template_key")
+
+    def __init__(self):
+        self.version = 0x04
+        self.eid = None
+        self.period = None
+        self.sequence_number = 0
+        self._services = ()
+        self._template = None
+        self._template_key = None
+
+    @property
+    def services(self) -> tuple:
+        return self._services
 
-    eid:str = None
-    period:int = None
-    sequence_number:int = 0
-    services = []
+    @services.setter
+    def services(self, services):
+        # Always a tuple, so no list is shared between messages
+        self._services = tuple(services)
 
     def encode(self) -> bytes:
         ba = bytearray()
@@ -34,65 +52,80 @@ class IPNDMessage:
 
         # Set sequence number
 
-        ba += self.sequence_number.to_bytes(2, 'big', signed=False)
+        ba += (self.sequence_number & 0xFFFF).to_bytes(2, 'big', signed=False)
 
         # Set eid
 
         if self.eid is not None:
             beid = self.eid.encode("ascii")
-            ba += SDNVUtil.encode(len(beid))
+            SDNVUtil.encode_into(len(beid), ba)
             ba += beid
         
         # Set services definition
         if len(self.services) > 0:
-            ba += SDNVUtil.encode(len(self.services))
+            SDNVUtil.encode_into(len(self.services), ba)
             for s in self.services:
-                ba.extend(bytes(s))
+                s.encode_into(ba)
 
         # Set period
 
         if self.period is not None:
-            ba += SDNVUtil.encode(self.period)
+            SDNVUtil.encode_into(self.period, ba)
 
         return bytes(ba)
-    
-    def decode_with_offset(bytes: bytes):
+
+    def encode_cached(self) -> bytearray:
+        # The template is encoded again only when the header fields or
+        # the services changed, services themselves are not inspected.
+        # The returned buffer is reused by the next call.
+        key = (self.version, self.eid, self.period, self.services)
+
+        if self._template is None or self._template_key != key:
+            self._template = bytearray(self.encode())
+            self._template_key = key
+
+        SEQUENCE_NUMBER.pack_into(self._template, SEQUENCE_NUMBER_OFFSET,
+                                  self.sequence_number & 0xFFFF)
+
+        return self._template
+
+    def decode_with_offset(buffer: bytes, offset: int = 0):
         self = IPNDMessage()
         
-        self.version = bytes[0]
+        self.version = buffer[offset]
         
-        flags = bytes[1]
+        flags = buffer[offset+1]
 
-        self.sequence_number = int.from_bytes(bytes[2:4], 'big')
+        self.sequence_number = int.from_bytes(buffer[offset+2:offset+4], 'big')
 
-        offset = 4
+        offset += 4
 
         # if we have a eid
         if flags & 0b00000001:
-            (eid_length, num_bytes) = SDNVUtil.decode(bytes, offset)
+            (eid_length, num_bytes) = SDNVUtil.decode(buffer, offset)
             offset += num_bytes
-            self.eid = bytes[offset:offset+eid_length].decode("ascii")
+            self.eid = str(buffer[offset:offset+eid_length], "ascii")
             offset = offset+eid_length
         
         # if we have services
         if (flags & 0b00000010) >> 1:
-            (service_number, num_bytes) = SDNVUtil.decode(bytes, offset)
+            (service_number, num_bytes) = SDNVUtil.decode(buffer, offset)
             offset += num_bytes
 
-            (services, num_bytes) = decode_services(service_number, bytes[offset:])
-            self.services = services
-            offset += num_bytes
+            (self._services, offset) = decode_services(service_number, buffer, offset=offset)
         
         # if we have period
         if (flags & 0b00001000) >> 3:
-            (period, num_bytes) = SDNVUtil.decode(bytes, offset)
+            (period, num_bytes) = SDNVUtil.decode(buffer, offset)
             self.period = period
             offset += num_bytes
 
         return (self, offset)
 
-    def decode(bytes:bytes):
-        return IPNDMessage.decode_with_offset(bytes)[0]
+    def decode(buffer: bytes):
+        # Decode on a single view, values are only copied out when returned
+        with memoryview(buffer) as view:
+            return IPNDMessage.decode_with_offset(view)[0]
 
     def __bytes__(self) -> bytes:
         return self.encode()
@@ -110,3 +143,84 @@ class IPNDMessage:
             self.period, 
             self.sequence_number,
             ",\n\t\t".join(map(str, self.services)))
+
+
+class LazyIPNDMessage(IPNDMessage):
+
+    # Only the header and the eid are decoded up front, services and
+    # period are decoded from the kept buffer on first access
+
+    __slots__ = ("buffer", "flags", "body_offset", "decoded", "_period")
+
+    def __init__(self, buffer: bytes):
+        self.buffer = buffer
+        self.eid = None
+        self._template = None
+        self._template_key = None
+        self.version = buffer[0]
+        self.flags = buffer[1]
+        self.sequence_number = int.from_bytes(buffer[2:4], 'big')
+
+        offset = 4
+
+        # if we have a eid
+        if self.flags & 0b00000001:
+            (eid_length, num_bytes) = SDNVUtil.decode(buffer, offset)
+            offset += num_bytes
+            self.eid = str(buffer[offset:offset+eid_length], "ascii")
+            offset = offset+eid_length
+
+        self.body_offset = offset
+        self.decoded = False
+        self._services = ()
+        self._period = None
+
+    def decode_body(self):
+        if self.decoded:
+            return
+
+        offset = self.body_offset
+
+        with memoryview(self.buffer) as view:
+
+            # if we have services
+            if (self.flags & 0b00000010) >> 1:
+                (service_number, num_bytes) = SDNVUtil.decode(view, offset)
+                offset += num_bytes
+
+                (self._services, offset) = decode_services(service_number, view, offset=offset)
+
+            # if we have period
+            if (self.flags & 0b00001000) >> 3:
+                (self._period, num_bytes) = SDNVUtil.decode(view, offset)
+                offset += num_bytes
+
+        self.decoded = True
+
+    @property
+    def body(self) -> bytes:
+        # Services and period as received, equal bodies advertise the same
+        return self.buffer[self.body_offset:]
+
+    @property
+    def services(self):
+        self.decode_body()
+        return self._services
+
+    @services.setter
+    def services(self, services):
+        self.decode_body()
+        self._services = tuple(services)
+
+    @property
+    def period(self):
+        self.decode_body()
+        return self._period
+
+    @period.setter
+    def period(self, period):
+        self.decode_body()
+        self._period = period
+
+    def decode(buffer: bytes):
+        return LazyIPNDMessage(bytes(buffer))
@@ -0,0 +1,277 @@
+import atexit
+import bisect
+import http.server
+import os
+import socketserver
+import stat
+import threading
+
+# Upper bounds in seconds, from 10us to 1s
+DURATION_BUCKETS = (1e-5, 2.5e-5, 5e-5, 1e-4, 2.5e-4, 5e-4, 1e-3,
+                    2.5e-3, 5e-3, 1e-2, 2.5e-2, 5e-2, 0.1, 0.25, 0.5, 1.0)
+
+
+class Histogram:
+
+    def __init__(self, buckets=DURATION_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.total = 0.0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.total += value
+
+
+def format_labels(labels: dict) -> str:
+    if len(labels) == 0:
+        return ""
+
+    return "{" + ",".join('{}="{}"'.format(k, str(v).replace('"', '\\"'))
+                          for (k, v) in labels.items()) + "}"
+
+
+class Registry:
+    """
+    Metrics rendered in the Prometheus text format.
+
+    Counters and gauges are read from the instrumented objects only when
+    rendered, histograms are any object with `buckets`, `counts`, `count`
+    and `total` attributes, such as `Histogram`.
+    """
+
+    def __init__(self):
+        self.metrics = {}
+        self.lock = threading.Lock()
+
+    def add(self, type: str, name: str, help: str, source, labels: dict):
+        with self.lock:
+            if name not in self.metrics:
+                self.metrics[name] = (type, help, [])
+            self.metrics[name][2].append((labels, source))
+
+    def counter(self, name: str, help: str, fn, **labels):
+        self.add("counter", name, help, fn, labels)
+
+    def gauge(self, name: str, help: str, fn, **labels):
+        self.add("gauge", name, help, fn, labels)
+
+    def histogram(self, name: str, help: str, histogram, **labels):
+        self.add("histogram", name, help, histogram, labels)
+
+    def render(self) -> str:
+        lines = []
+
+        with self.lock:
+            metrics = [(name, type, help, list(sources))
+                       for (name, (type, help, sources)) in self.metrics.items()]
+
+        for (name, type, help, sources) in metrics:
+            lines.append("# HELP {} {}".format(name, help))
+            lines.append("# TYPE {} {}".format(name, type))
+
+            for (labels, source) in sources:
+                if type != "histogram":
+                    lines.append("{}{} {}".format(name, format_labels(labels), source()))
+                    continue
+
+                cumulative = 0
+                for (bound, count) in zip(source.buckets + (float("inf"),), source.counts):
+                    cumulative += count
+                    le = "+Inf" if bound == float("inf") else repr(bound)
+                    lines.append("{}_bucket{} {}".format(
+                        name, format_labels(dict(labels, le=le)), cumulative))
+                lines.append("{}_sum{} {}".format(name, format_labels(labels), source.total))
+                lines.append("{}_count{} {}".format(name, format_labels(labels), source.count))
+
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+
+class MetricsRequestHandler(http.server.BaseHTTPRequestHandler):
+
+    registry = REGISTRY
+
+    def do_GET(self):
+        if self.path not in ("/", "/metrics"):
+            self.send_error(404)
+            return
+
+        body = self.registry.render().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def address_string(self):
+        # Peers of UNIX sockets have no address
+        return str(self.client_address)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class UnixHTTPServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+    bound = False
+
+    def server_bind(self):
+        # A socket left behind by an unclean shutdown would fail the bind
+        try:
+            if stat.S_ISSOCK(os.stat(self.server_address).st_mode):
+                os.unlink(self.server_address)
+        except FileNotFoundError:
+            pass
+        super().server_bind()
+        self.bound = True
+
+    def server_close(self):
+        super().server_close()
+        # Only the socket this server created is removed
+        if self.bound:
+            self.bound = False
+            try:
+                os.unlink(self.server_address)
+            except FileNotFoundError:
+                pass
+
+
+def serve_metrics(address: str, registry: Registry = REGISTRY):
+    # address is either [host:]port or the path of a UNIX socket
+    handler = type("RequestHandler", (MetricsRequestHandler,), {"registry": registry})
+
+    if address.startswith("/"):
+        server = UnixHTTPServer(address, handler)
+        atexit.register(server.server_close)
+    else:
+        (host, _, port) = address.rpartition(":")
+        server = http.server.ThreadingHTTPServer(
+            (host.strip("[]") or "127.0.0.1", int(port)), handler)
+
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def register_emitter(emitter, interface: str, registry: Registry = REGISTRY):
+    registry.counter("ipnd_beacons_sent_total", "Beacons sent",
+                     lambda: emitter.sent, interface=interface)
+    registry.counter("ipnd_beacon_send_errors_total", "Beacons that could not be sent",
+                     lambda: emitter.errors, interface=interface)
+    registry.gauge("ipnd_beacon_period_seconds", "Beacon period advertised",
+                   lambda: emitter.message.period, interface=interface)
+    registry.histogram("ipnd_beacon_encode_seconds", "Time spent encoding a beacon",
+                       emitter.encode_latency, interface=interface)
+
+
+def register_beacons(beacons, registry: Registry = REGISTRY):
+    registry.counter("ipnd_services_changes_total", "Changes of the services advertised",
+                     lambda: beacons.changes)
+
+
+def register_watcher(watcher, registry: Registry = REGISTRY):
+    registry.counter("ipnd_interface_events_total", "Address and link events of network interfaces",
+                     lambda: watcher.events)
+
+
+def register_timer(timer, registry: Registry = REGISTRY):
+    registry.gauge("ipnd_beacon_lateness_max_seconds", "Largest delay of a beacon past its deadline",
+                   lambda: timer.lateness_max, interface=timer.name)
+
+
+def register_handler(handler, registry: Registry = REGISTRY):
+    registry.counter("ipnd_beacons_received_total", "Beacons handled",
+                     lambda: handler.received)
+    registry.counter("ipnd_beacons_rejected_total", "Invalid beacons and beacons without CLA",
+                     lambda: handler.rejected)
+    registry.counter("ipnd_beacons_self_echoed_total", "Own beacons received back",
+                     lambda: handler.self_echoed)
+    registry.counter("ipnd_beacons_duplicate_total", "Copies of a recent beacon dropped",
+                     lambda: handler.duplicates)
+    # Only a sample of header decodes is timed, see HEADER_SAMPLING
+    registry.histogram("ipnd_beacon_decode_seconds", "Time spent decoding a beacon",
+                       handler.header_latency, stage="header")
+    registry.histogram("ipnd_beacon_decode_seconds", "Time spent decoding a beacon",
+                       handler.body_latency, stage="body")
+    registry.gauge("ipnd_neighbors", "Neighbors in the neighbor table",
+                   lambda: len(handler.neighbors))
+    registry.counter("ipnd_neighbors_expired_total", "Neighbors removed after missing their beacons",
+                     lambda: handler.neighbors.expired)
+    registry.counter("ipnd_contact_updates_total", "Contacts pushed to µPCN",
+                     lambda: handler.neighbors.updates)
+    registry.counter("ipnd_contact_updates_skipped_total", "Unchanged beacons not pushed to µPCN",
+                     lambda: handler.neighbors.skipped)
+
+
+def register_pool(pool, registry: Registry = REGISTRY):
+    # Same metrics as register_handler, summed over the worker processes
+    for (name, help, counter, type) in (
+            ("ipnd_beacons_received_total", "Beacons handled", "received", "counter"),
+            ("ipnd_beacons_rejected_total", "Invalid beacons and beacons without CLA", "rejected", "counter"),
+            ("ipnd_beacons_self_echoed_total", "Own beacons received back", "self_echoed", "counter"),
+            ("ipnd_beacons_duplicate_total", "Copies of a recent beacon dropped", "duplicates", "counter"),
+            ("ipnd_neighbors", "Neighbors in the neighbor table", "neighbors", "gauge"),
+            ("ipnd_neighbors_expired_total", "Neighbors removed after missing their beacons", "expired", "counter"),
+            ("ipnd_contact_updates_total", "Contacts pushed to µPCN", "updates", "counter"),
+            ("ipnd_contact_updates_skipped_total", "Unchanged beacons not pushed to µPCN", "skipped", "counter")):
+        registry.add(type, name, help, lambda counter=counter: pool.total(counter), {})
+
+    registry.counter("ipnd_datagrams_dropped_total", "Datagrams dropped before being handled",
+                     lambda: pool.overflows, reason="worker_queue")
+
+
+def register_receiver(receiver, registry: Registry = REGISTRY):
+    registry.counter("ipnd_datagrams_received_total", "Datagrams read from the sockets",
+                     lambda: receiver.received)
+    registry.counter("ipnd_datagrams_dropped_total", "Datagrams dropped before being handled",
+                     lambda: receiver.kernel_drops, reason="kernel")
+    registry.counter("ipnd_datagrams_dropped_total", "Datagrams dropped before being handled",
+                     lambda: receiver.overflows, reason="queue")
+
+
+def register_admission(admission, registry: Registry = REGISTRY):
+    for reason in admission.rejected:
+        registry.counter("ipnd_datagrams_rejected_total", "Datagrams rejected before decoding",
+                         lambda reason=reason: admission.rejected[reason], reason=reason)
+    registry.gauge("ipnd_admission_sources", "Source addresses with a token bucket",
+                   lambda: len(admission.buckets))
+
+
+def register_fast_discovery(fast_discovery, registry: Registry = REGISTRY):
+    registry.counter("ipnd_fast_replies_total", "Beacons sent by unicast to new neighbors",
+                     lambda: fast_discovery.sent)
+    registry.counter("ipnd_fast_replies_limited_total", "Replies to new neighbors not sent, too frequent",
+                     lambda: fast_discovery.limited)
+
+
+def register_cla_selector(cla_selector, registry: Registry = REGISTRY):
+    registry.counter("ipnd_cla_probes_total", "TCP connections attempted to CLA addresses of neighbors",
+                     lambda: cla_selector.probes)
+    registry.counter("ipnd_cla_probe_failures_total", "CLA addresses not reachable within the probe timeout",
+                     lambda: cla_selector.failures)
+    registry.histogram("ipnd_cla_probe_seconds", "Time to connect to CLA addresses of neighbors",
+                       cla_selector.latency)
+    registry.gauge("ipnd_cla_probes_pending", "Neighbors waiting for their CLA addresses to be probed",
+                   lambda: len(cla_selector.pending))
+
+
+def register_snapshot(snapshot, registry: Registry = REGISTRY):
+    registry.counter("ipnd_snapshot_writes_total", "Neighbor table snapshots written",
+                     lambda: snapshot.writes)
+    registry.histogram("ipnd_snapshot_write_seconds", "Time to write a neighbor table snapshot",
+                       snapshot.write_latency)
+    registry.gauge("ipnd_snapshot_restored", "Neighbors restored from the snapshot on startup",
+                   lambda: snapshot.restored)
+    registry.gauge("ipnd_startup_to_routes_seconds", "Time from startup until restored contacts were pushed",
+                   lambda: snapshot.startup_to_routes or 0)
+
+
+def register_aap(aap, registry: Registry = REGISTRY):
+    registry.histogram("upcn_aap_round_trip_seconds", "Time from sending a bundle to its confirmation",
+                       aap.send_latency, agent=aap.eid_suffix)
+    registry.histogram("upcn_aap_receive_seconds", "Time spent waiting for a message from µPCN",
+                       aap.recv_latency, agent=aap.eid_suffix)
@@ -0,0 +1,219 @@
+import heapq
+import itertools
+import time
+
+
+class Neighbor:
+
+    __slots__ = ("eid", "cla_address", "period", "services", "last_seen",
+                 "contact_expiry", "advertisement", "expiry_entry", "sequence_number")
+
+    def __init__(self, eid: str):
+        self.eid = eid
+        self.cla_address = None
+        self.period = None
+        self.services = ()
+        self.last_seen = None
+        self.contact_expiry = None
+        self.advertisement = None
+        self.expiry_entry = None
+        self.sequence_number = None
+
+    def __repr__(self):
+        return """Neighbor {{ eid={}, cla_address={}, period={}, services={} }}""".format(
+            self.eid, self.cla_address, self.period, len(self.services))
+
+
+class NeighborTable:
+    """
+    Neighbors known from received beacons, keyed by EID.
+
+    `update` tells whether the contact of a neighbor has to be pushed
+    to µPCN: the neighbor is new, its CLA address or period changed, or
+    the contact previously pushed expires within `refresh_periods`
+    periods. Contacts pushed last `contact_periods` periods.
+
+    Neighbors not heard from for `expiry_periods` of their own periods
+    are removed by `expire`. Deadlines are kept on a heap holding one
+    entry per neighbor: a beacon only updates `last_seen`, entries popped
+    before the actual deadline of their neighbor are pushed back.
+    """
+
+    def __init__(self, contact_periods: float = 4, refresh_periods: float = 1.5,
+                 expiry_periods: float = 3):
+        self.contact_periods = contact_periods
+        self.refresh_periods = refresh_periods
+        self.expiry_periods = expiry_periods
+        self.neighbors: dict[str, Neighbor] = {}
+        self.expiry_heap = []
+        self.counter = itertools.count()
+        self.added = 0
+        self.updates = 0
+        self.skipped = 0
+        self.expired = 0
+
+    def check_period(self, period: int):
+        # Deadlines are multiples of the period, the period flag of a
+        # beacon is optional though
+        if period is None or period <= 0:
+            raise Exception("Invalid period: {}".format(period))
+
+    def contact_duration(self, period: int) -> float:
+        return period * self.contact_periods
+
+    def refresh(self, eid: str, advertisement: bytes, now: float = None,
+                sequence_number: int = None) -> bool:
+        # Any beacon of a known neighbor keeps it from expiring. True when
+        # it advertised exactly the same services and period as last time
+        # and its contact is not about to expire, the beacon can then be
+        # skipped without decoding its services
+        if now is None:
+            now = time.monotonic()
+
+        neighbor = self.neighbors.get(eid)
+
+        if neighbor is None:
+            return False
+
+        neighbor.last_seen = now
+        neighbor.sequence_number = sequence_number
+
+        if neighbor.advertisement is None or neighbor.advertisement != advertisement:
+            return False
+
+        if neighbor.contact_expiry - now < neighbor.period * self.refresh_periods:
+            return False
+
+        self.skipped += 1
+        return True
+
+    def update(self, eid: str, cla_address: str, period: int, services=(), now: float = None,
+               advertisement: bytes = None, sequence_number: int = None) -> bool:
+        # Raises on a missing or non positive period, leaving the table as
+        # it was
+        self.check_period(period)
+
+        if now is None:
+            now = time.monotonic()
+
+        neighbor = self.neighbors.get(eid)
+
+        if neighbor is None:
+            neighbor = Neighbor(eid)
+            self.neighbors[eid] = neighbor
+            self.added += 1
+
+        neighbor.last_seen = now
+        neighbor.sequence_number = sequence_number
+        neighbor.services = tuple(services)
+        neighbor.advertisement = advertisement
+
+        # A shorter period brings the deadline before the queued entry
+        deadline = self.deadline(neighbor, period)
+        if neighbor.expiry_entry is None or deadline < neighbor.expiry_entry[0]:
+            self.schedule_expiry(neighbor, deadline)
+
+        changed = neighbor.cla_address != cla_address or neighbor.period != period
+        expiring = neighbor.contact_expiry is None or \
+            neighbor.contact_expiry - now < period * self.refresh_periods
+
+        if not changed and not expiring:
+            self.skipped += 1
+            return False
+
+        neighbor.cla_address = cla_address
+        neighbor.period = period
+        neighbor.contact_expiry = now + self.contact_duration(period)
+        self.updates += 1
+        return True
+
+    def restore(self, eid: str, cla_address: str, period: int, last_seen: float,
+                sequence_number: int = None, now: float = None) -> Neighbor:
+        # Adds back a neighbor saved before a restart, unless it expired
+        # since or its period is invalid. Its contact has to be pushed again
+        if now is None:
+            now = time.monotonic()
+
+        if eid in self.neighbors or period is None or period <= 0 or \
+                last_seen + period * self.expiry_periods <= now:
+            return None
+
+        neighbor = Neighbor(eid)
+        neighbor.cla_address = cla_address
+        neighbor.period = period
+        neighbor.last_seen = last_seen
+        neighbor.sequence_number = sequence_number
+        neighbor.contact_expiry = now + self.contact_duration(period)
+        self.neighbors[eid] = neighbor
+        self.schedule_expiry(neighbor, self.deadline(neighbor))
+        return neighbor
+
+    def set_cla_address(self, eid: str, cla_address: str, now: float = None) -> Neighbor:
+        # Changes the CLA address of a known neighbor, returned when its
+        # contact has to be pushed again
+        neighbor = self.neighbors.get(eid)
+
+        if neighbor is None or neighbor.cla_address == cla_address:
+            return None
+
+        if now is None:
+            now = time.monotonic()
+
+        neighbor.cla_address = cla_address
+        neighbor.contact_expiry = now + self.contact_duration(neighbor.period)
+        self.updates += 1
+        return neighbor
+
+    def deadline(self, neighbor: Neighbor, period: int = None) -> float:
+        if period is None:
+            period = neighbor.period
+        return neighbor.last_seen + period * self.expiry_periods
+
+    def schedule_expiry(self, neighbor: Neighbor, deadline: float):
+        neighbor.expiry_entry = (deadline, next(self.counter), neighbor)
+        heapq.heappush(self.expiry_heap, neighbor.expiry_entry)
+
+    def next_expiry(self, now: float = None) -> float:
+        # Delay until the next neighbor may expire, or None without neighbors
+        if len(self.expiry_heap) == 0:
+            return None
+
+        if now is None:
+            now = time.monotonic()
+
+        return max(0.0, self.expiry_heap[0][0] - now)
+
+    def expire(self, now: float = None) -> list[Neighbor]:
+        # Removes and returns the neighbors past their deadline
+        if now is None:
+            now = time.monotonic()
+
+        expired = []
+
+        while len(self.expiry_heap) > 0 and self.expiry_heap[0][0] <= now:
+            entry = heapq.heappop(self.expiry_heap)
+            neighbor = entry[2]
+
+            if neighbor.expiry_entry is not entry:
+                continue
+
+            deadline = self.deadline(neighbor)
+            if deadline > now:
+                self.schedule_expiry(neighbor, deadline)
+                continue
+
+            neighbor.expiry_entry = None
+            del self.neighbors[neighbor.eid]
+            expired.append(neighbor)
+
+        self.expired += len(expired)
+        return expired
+
+    def get(self, eid: str) -> Neighbor:
+        return self.neighbors.get(eid)
+
+    def __len__(self):
+        return len(self.neighbors)
+
+    def __contains__(self, eid: str):
+        return eid in self.neighbors
@@ -0,0 +1,288 @@
+import collections
+import errno
+import socket
+import struct
+
+# rtnetlink multicast groups and message types, from linux/rtnetlink.h
+RTMGRP_LINK = 0x1
+RTMGRP_IPV4_IFADDR = 0x10
+RTMGRP_IPV6_IFADDR = 0x100
+RTM_NEWLINK = 16
+RTM_DELLINK = 17
+RTM_NEWADDR = 20
+RTM_DELADDR = 21
+
+NLMSG_HEADER = struct.Struct("=IHHII")
+# struct ifinfomsg and struct ifaddrmsg
+IFINFO = struct.Struct("=BxHiII")
+IFADDR = struct.Struct("=BBBBI")
+RTATTR = struct.Struct("=HH")
+
+IFLA_IFNAME = 3
+IFA_ADDRESS = 1
+IFA_LOCAL = 2
+IFF_UP = 0x1
+IFF_RUNNING = 0x40
+# Addresses still checked for duplicates, or found to be one
+IFA_F_DADFAILED = 0x08
+IFA_F_TENTATIVE = 0x40
+
+FAMILIES = (socket.AF_INET, socket.AF_INET6)
+
+
+class Interfaces:
+    """
+    Addresses of the network interfaces, updated from watcher events.
+
+    Events are (kind, interface name, family, address) tuples, kind being
+    "add" or "remove" for an address, "up" or "down" for a link. `apply`
+    returns the names of the interfaces whose usable addresses changed,
+    events repeating what is already known change nothing. `current`
+    gives the addresses of interfaces up in the form of netifaces.
+    """
+
+    def __init__(self, interfaces: dict = {}, ignored=("lo",)):
+        self.ignored = ignored
+        # Interface name to family to addresses, in the order seen
+        self.addresses = {}
+        self.down = set()
+
+        for (name, families) in interfaces.items():
+            for family in FAMILIES:
+                for it in families.get(family, []):
+                    self.add(name, family, it["addr"])
+
+    def add(self, name: str, family: int, address: str) -> bool:
+        # Link-local addresses from netifaces come with their scope
+        address = address.partition("%")[0]
+        addresses = self.addresses.setdefault(name, {}).setdefault(family, {})
+
+        if address in addresses:
+            return False
+
+        addresses[address] = None
+        return name not in self.down
+
+    def remove(self, name: str, family: int, address: str) -> bool:
+        addresses = self.addresses.get(name, {}).get(family, {})
+
+        if address not in addresses:
+            return False
+
+        del addresses[address]
+        return name not in self.down
+
+    def set_up(self, name: str, up: bool) -> bool:
+        if up == (name not in self.down):
+            return False
+
+        if up:
+            self.down.discard(name)
+        else:
+            self.down.add(name)
+
+        return any(len(addresses) > 0 for addresses in self.addresses.get(name, {}).values())
+
+    def apply(self, events) -> set:
+        changed = set()
+
+        for (kind, name, family, address) in events:
+            if name in self.ignored:
+                continue
+
+            if kind == "add":
+                modified = self.add(name, family, address)
+            elif kind == "remove":
+                modified = self.remove(name, family, address)
+            else:
+                modified = self.set_up(name, kind == "up")
+
+            if modified:
+                changed.add(name)
+
+        return changed
+
+    def current(self) -> dict:
+        interfaces = {}
+
+        for (name, families) in self.addresses.items():
+            if name in self.down or name in self.ignored:
+                continue
+
+            addresses = {family: [{"addr": address} for address in families[family]]
+                         for family in FAMILIES if len(families.get(family, {})) > 0}
+            if len(addresses) > 0:
+                interfaces[name] = addresses
+
+        return interfaces
+
+
+def attributes(data: bytes, offset: int, end: int):
+    # (type, value) of the rtattrs between offset and end
+    while offset + RTATTR.size <= end:
+        (length, type) = RTATTR.unpack_from(data, offset)
+        if length < RTATTR.size:
+            return
+        yield (type, data[offset+RTATTR.size:offset+length])
+        offset += (length + 3) & ~3
+
+
+class NetlinkWatcher:
+    """
+    Address and link changes reported by the kernel over rtnetlink.
+
+    `read` returns the pending events without blocking, it is meant to be
+    called when `fileno` is readable. When the kernel dropped events as
+    the socket buffer was full, a ("resync", None, None, None) event asks
+    for the addresses to be listed again.
+    """
+
+    def __init__(self):
+        self.sock = socket.socket(socket.AF_NETLINK, socket.SOCK_RAW, socket.NETLINK_ROUTE)
+        self.sock.bind((0, RTMGRP_LINK | RTMGRP_IPV4_IFADDR | RTMGRP_IPV6_IFADDR))
+        self.sock.setblocking(False)
+        # Interface index to name, names of deleted links cannot be looked up
+        self.names = {}
+        self.events = 0
+
+    def fileno(self) -> int:
+        return self.sock.fileno()
+
+    def name(self, index: int) -> str:
+        name = self.names.get(index)
+
+        if name is None:
+            try:
+                name = socket.if_indextoname(index)
+            except OSError:
+                return None
+            self.names[index] = name
+
+        return name
+
+    def read(self) -> list:
+        events = []
+
+        while True:
+            try:
+                data = self.sock.recv(65536)
+            except BlockingIOError:
+                break
+            except OSError as e:
+                if e.errno != errno.ENOBUFS:
+                    raise
+                events.append(("resync", None, None, None))
+                continue
+
+            events += self.parse(data)
+
+        self.events += len(events)
+        return events
+
+    def parse(self, data: bytes) -> list:
+        events = []
+        offset = 0
+
+        while offset + NLMSG_HEADER.size <= len(data):
+            (length, type, _, _, _) = NLMSG_HEADER.unpack_from(data, offset)
+            if length < NLMSG_HEADER.size:
+                break
+
+            body = offset + NLMSG_HEADER.size
+            end = offset + length
+
+            if type in (RTM_NEWADDR, RTM_DELADDR):
+                event = self.parse_address(type, data, body, end)
+            elif type in (RTM_NEWLINK, RTM_DELLINK):
+                event = self.parse_link(type, data, body, end)
+            else:
+                event = None
+
+            if event is not None:
+                events.append(event)
+
+            offset += (length + 3) & ~3
+
+        return events
+
+    def parse_address(self, type: int, data: bytes, body: int, end: int) -> tuple:
+        (family, _, flags, _, index) = IFADDR.unpack_from(data, body)
+        if family not in FAMILIES:
+            return None
+
+        attrs = dict(attributes(data, body + IFADDR.size, end))
+        # IFA_LOCAL is the address of the interface on point to point links
+        raw = attrs.get(IFA_LOCAL, attrs.get(IFA_ADDRESS))
+        name = self.name(index)
+        if raw is None or name is None:
+            return None
+
+        address = socket.inet_ntop(family, raw)
+
+        if type == RTM_DELADDR or flags & IFA_F_DADFAILED:
+            return ("remove", name, family, address)
+        if flags & IFA_F_TENTATIVE:
+            return None
+        return ("add", name, family, address)
+
+    def parse_link(self, type: int, data: bytes, body: int, end: int) -> tuple:
+        (_, _, index, flags, _) = IFINFO.unpack_from(data, body)
+
+        attrs = dict(attributes(data, body + IFINFO.size, end))
+        if IFLA_IFNAME in attrs:
+            self.names[index] = bytes(attrs[IFLA_IFNAME]).rstrip(b"\0").decode()
+
+        name = self.names.get(index)
+        if name is None:
+            return None
+
+        if type == RTM_DELLINK:
+            del self.names[index]
+            return ("down", name, None, None)
+
+        up = flags & IFF_UP and flags & IFF_RUNNING
+        return ("up" if up else "down", name, None, None)
+
+    def close(self):
+        self.sock.close()
+
+
+class ManualWatcher:
+    """
+    Stand-in for a `NetlinkWatcher`, reporting the events given to `push`.
+    """
+
+    def __init__(self):
+        self.pending = collections.deque()
+        self.wakeup = socket.socketpair()
+        for sock in self.wakeup:
+            sock.setblocking(False)
+        self.events = 0
+
+    def push(self, *events):
+        self.pending.extend(events)
+        try:
+            self.wakeup[1].send(b"\0")
+        except BlockingIOError:
+            pass
+
+    def fileno(self) -> int:
+        return self.wakeup[0].fileno()
+
+    def read(self) -> list:
+        try:
+            while self.wakeup[0].recv(4096):
+                pass
+        except BlockingIOError:
+            pass
+
+        events = []
+        while len(self.pending) > 0:
+            events.append(self.pending.popleft())
+
+        self.events += len(events)
+        return events
+
+    def close(self):
+        for sock in self.wakeup:
+            sock.close()
@@ -0,0 +1,260 @@
+import collections
+import errno
+import selectors
+import socket
+import threading
+import time
+
+from .metrics import Histogram
+
+PROBE_TTL = 60
+PROBE_TIMEOUT = 1.0
+# Connections attempted at the same time, further probes wait their turn
+MAX_CONNECTS = 64
+MAX_PENDING = 1024
+MAX_CACHED = 4096
+
+PROBE_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0)
+
+
+def parse_cla_address(cla_address: str) -> tuple:
+    # "tcpclv3:<address>:<port>" to a socket address, None for other CLAs
+    (cla, _, rest) = cla_address.partition(":")
+    (host, _, port) = rest.rpartition(":")
+
+    if cla != "tcpclv3" or host == "" or not port.isdigit():
+        return None
+
+    return (host, int(port))
+
+
+class Probe:
+
+    __slots__ = ("eid", "candidates", "rtts", "remaining", "waiting", "sockets")
+
+    def __init__(self, eid: str, candidates: tuple):
+        self.eid = eid
+        self.candidates = candidates
+        # Connect time of each reachable candidate
+        self.rtts = {}
+        self.remaining = len(candidates)
+        self.waiting = len(candidates)
+        self.sockets = []
+
+
+class CLASelector:
+    """
+    Picks the CLA address of a neighbor advertising several of them, by
+    the time a TCP connection to each takes.
+
+    `select` never waits for the network: it answers from a cache holding
+    the ranking of each neighbor for `ttl` seconds, or with the first
+    advertised address, and queues a probe when the ranking is missing or
+    stale. Probes run on a thread connecting to all candidates at once
+    with non-blocking sockets. Once all candidates of a neighbor were
+    tried, the first one to answer is the best and the probe ends there,
+    candidates not answering rank last in advertised order. `completed` hands the new
+    rankings over to the caller of `select`, as the neighbors whose best
+    address changed.
+    """
+
+    def __init__(self, ttl: float = PROBE_TTL, timeout: float = PROBE_TIMEOUT,
+                 clock=time.monotonic):
+        self.ttl = ttl
+        self.timeout = timeout
+        self.clock = clock
+        # EID to [candidates, ranked candidates, expiry]
+        self.cache = {}
+        self.pending = set()
+        self.requests = collections.deque()
+        self.results = collections.deque()
+        self.selector = None
+        self.wakeup = None
+        self.thread = None
+        self.closing = False
+        self.probes = 0
+        self.failures = 0
+        self.latency = Histogram(PROBE_BUCKETS)
+
+    def start(self):
+        self.selector = selectors.DefaultSelector()
+        self.wakeup = socket.socketpair()
+        for sock in self.wakeup:
+            sock.setblocking(False)
+        self.selector.register(self.wakeup[0], selectors.EVENT_READ)
+
+        self.thread = threading.Thread(target=self.run, name="ipnd-cla-probe", daemon=True)
+        self.thread.start()
+
+    def select(self, eid: str, candidates: list, now: float = None) -> str:
+        if len(candidates) == 1 or self.thread is None:
+            return candidates[0]
+
+        if now is None:
+            now = self.clock()
+
+        candidates = tuple(candidates)
+        entry = self.cache.get(eid)
+
+        if entry is None or entry[0] != candidates:
+            if len(self.cache) >= MAX_CACHED:
+                self.cache = {key: cached for (key, cached) in self.cache.items() if cached[2] > now}
+            entry = [candidates, candidates, 0.0]
+            self.cache[eid] = entry
+
+        if entry[2] <= now and eid not in self.pending and len(self.pending) < MAX_PENDING:
+            self.pending.add(eid)
+            self.requests.append(Probe(eid, candidates))
+            try:
+                self.wakeup[1].send(b"\0")
+            except BlockingIOError:
+                pass
+
+        return entry[1][0]
+
+    def completed(self, now: float = None) -> list:
+        # (eid, cla_address) of the neighbors whose best address changed
+        # since the previous call
+        if now is None:
+            now = self.clock()
+
+        changed = []
+
+        while len(self.results) > 0:
+            probe = self.results.popleft()
+            self.pending.discard(probe.eid)
+
+            entry = self.cache.get(probe.eid)
+            if entry is None or entry[0] != probe.candidates:
+                continue
+
+            # Sorting is stable, unreachable candidates keep their order
+            ranked = tuple(sorted(probe.candidates,
+                                  key=lambda it: probe.rtts.get(it, self.timeout)))
+            best = entry[1][0]
+            entry[1] = ranked
+            entry[2] = now + self.ttl
+
+            if ranked[0] != best:
+                changed.append((probe.eid, ranked[0]))
+
+        return changed
+
+    def run(self):
+        # Socket to (probe, candidate, connect start)
+        connecting = {}
+        waiting = collections.deque()
+
+        while not self.closing:
+            now = self.clock()
+
+            timeout = None
+            if len(connecting) > 0:
+                timeout = max(0.0, min(started for (_, _, started) in connecting.values())
+                              + self.timeout - now)
+
+            for (key, _) in self.selector.select(timeout):
+                if key.fileobj is self.wakeup[0]:
+                    try:
+                        while self.wakeup[0].recv(4096):
+                            pass
+                    except BlockingIOError:
+                        pass
+                    continue
+
+                sock = key.fileobj
+                if sock not in connecting:
+                    continue
+                (probe, candidate, started) = connecting.pop(sock)
+                error = sock.getsockopt(socket.SOL_SOCKET, socket.SO_ERROR)
+                self.finish(sock, probe, candidate, self.clock() - started if error == 0 else None)
+
+                # Candidates still connecting would all rank after this one
+                if error == 0 and probe.waiting == 0 and probe.remaining > 0:
+                    for other in probe.sockets:
+                        if other in connecting:
+                            del connecting[other]
+                            self.selector.unregister(other)
+                            other.close()
+                            probe.remaining -= 1
+                    self.results.append(probe)
+
+            now = self.clock()
+            for (sock, (probe, candidate, started)) in list(connecting.items()):
+                if now - started >= self.timeout:
+                    del connecting[sock]
+                    self.finish(sock, probe, candidate, None)
+
+            while len(self.requests) > 0:
+                probe = self.requests.popleft()
+                for candidate in probe.candidates:
+                    waiting.append((probe, candidate))
+
+            while len(waiting) > 0 and len(connecting) < MAX_CONNECTS:
+                (probe, candidate) = waiting.popleft()
+                self.connect(connecting, probe, candidate)
+
+        for sock in connecting:
+            sock.close()
+
+    def connect(self, connecting: dict, probe: Probe, candidate: str):
+        probe.waiting -= 1
+        address = parse_cla_address(candidate)
+        if address is None:
+            self.finish(None, probe, candidate, None)
+            return
+
+        self.probes += 1
+        sock = None
+        started = self.clock()
+
+        try:
+            sock = socket.socket(socket.AF_INET6 if ":" in address[0] else socket.AF_INET,
+                                 socket.SOCK_STREAM)
+            sock.setblocking(False)
+            error = sock.connect_ex(address)
+        except OSError as e:
+            error = e.errno
+
+        if error == 0:
+            self.finish(sock, probe, candidate, self.clock() - started)
+        elif error == errno.EINPROGRESS:
+            connecting[sock] = (probe, candidate, started)
+            probe.sockets.append(sock)
+            self.selector.register(sock, selectors.EVENT_WRITE)
+        else:
+            self.finish(sock, probe, candidate, None)
+
+    def finish(self, sock, probe: Probe, candidate: str, rtt: float):
+        if sock is not None:
+            try:
+                self.selector.unregister(sock)
+            except KeyError:
+                pass
+            sock.close()
+
+        if rtt is None:
+            self.failures += 1
+        else:
+            probe.rtts[candidate] = rtt
+            self.latency.observe(rtt)
+
+        probe.remaining -= 1
+        if probe.remaining == 0:
+            self.results.append(probe)
+
+    def close(self):
+        if self.thread is None:
+            return
+
+        self.closing = True
+        try:
+            self.wakeup[1].send(b"\0")
+        except OSError:
+            pass
+        self.thread.join(1)
+        self.thread = None
+
+        self.selector.close()
+        for sock in self.wakeup:
+            sock.close()
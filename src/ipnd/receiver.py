@@ -0,0 +1,121 @@
+import asyncio
+import queue
+import selectors
+import socket
+import struct
+import time
+
+RECV_BUFSIZE = 4096
+RCVBUF_SIZE = 1 << 20
+BATCH_SIZE = 256
+QUEUE_SIZE = 1024
+
+# Linux only, the kernel then reports the datagrams it dropped on each
+# socket as ancillary data of every datagram received
+SO_RXQ_OVFL = getattr(socket, "SO_RXQ_OVFL", 40)
+DROP_COUNTER = struct.Struct("=I")
+
+
+class BatchReceiver:
+    """
+    Drains every pending datagram of its sockets on each wakeup and hands
+    them to a processing stage as one batch through a bounded queue.
+
+    `queue` is either a `queue.Queue` or an `asyncio.Queue`, batches that
+    do not fit are dropped and their datagrams counted in `overflows`.
+    Datagrams the kernel dropped because a socket buffer was full are
+    counted in `kernel_drops`. With an `admission` stage, datagrams it
+    rejects are dropped before being queued.
+    """
+
+    def __init__(self, queue, rcvbuf: int = RCVBUF_SIZE, batch_size: int = BATCH_SIZE,
+                 admission=None):
+        self.queue = queue
+        self.rcvbuf = rcvbuf
+        self.batch_size = batch_size
+        self.admission = admission
+        self.sockets = []
+        self.drop_counters = {}
+        self.selector = None
+        self.received = 0
+        self.batches = 0
+        self.kernel_drops = 0
+        self.overflows = 0
+
+    def add_socket(self, sock):
+        sock.setblocking(False)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, self.rcvbuf)
+
+        try:
+            sock.setsockopt(socket.SOL_SOCKET, SO_RXQ_OVFL, 1)
+        except OSError:
+            pass
+
+        self.sockets.append(sock)
+        self.drop_counters[sock] = 0
+
+        if self.selector is not None:
+            self.selector.register(sock, selectors.EVENT_READ)
+
+    def drain(self, sock) -> list:
+        batch = []
+        reads = 0
+        now = time.monotonic()
+
+        while reads < self.batch_size:
+            try:
+                (data, ancdata, flags, addr) = sock.recvmsg(
+                    RECV_BUFSIZE, socket.CMSG_SPACE(DROP_COUNTER.size))
+            except (BlockingIOError, InterruptedError):
+                break
+
+            reads += 1
+
+            for (level, type, cdata) in ancdata:
+                if level == socket.SOL_SOCKET and type == SO_RXQ_OVFL:
+                    # The counter is cumulative and wraps at 32 bits
+                    count = DROP_COUNTER.unpack(cdata[:DROP_COUNTER.size])[0]
+                    self.kernel_drops += (count - self.drop_counters[sock]) & 0xFFFFFFFF
+                    self.drop_counters[sock] = count
+
+            if self.admission is not None and \
+                    not self.admission.admit(data, addr, now, flags & socket.MSG_TRUNC):
+                continue
+
+            batch.append((data, addr))
+
+        return batch
+
+    def receive(self, sock):
+        batch = self.drain(sock)
+
+        if len(batch) == 0:
+            return
+
+        self.received += len(batch)
+
+        try:
+            self.queue.put_nowait(batch)
+            self.batches += 1
+        except (queue.Full, asyncio.QueueFull):
+            self.overflows += len(batch)
+
+    def poll(self, timeout: float = None):
+        if self.selector is None:
+            self.selector = selectors.DefaultSelector()
+            for sock in self.sockets:
+                self.selector.register(sock, selectors.EVENT_READ)
+
+        for (key, _) in self.selector.select(timeout):
+            self.receive(key.fileobj)
+
+    def run_forever(self):
+        while True:
+            self.poll()
+
+    def close(self):
+        if self.selector is not None:
+            self.selector.close()
+        for sock in self.sockets:
+            sock.close()
+        self.sockets = []
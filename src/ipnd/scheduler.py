@@ -0,0 +1,141 @@
+import heapq
+import itertools
+import random
+import time
+
+# Each beacon is delayed by up to this fraction of its period so nodes
+# started together do not keep emitting at the same instant
+JITTER = 0.1
+
+
+class Timer:
+
+    def __init__(self, name: str, period: float, callback):
+        self.name = name
+        self.period = period
+        self.callback = callback
+        self.base: float = None
+        self.deadline: float = None
+        self.entry = None
+        self.fired = 0
+        self.lateness_last = 0.0
+        self.lateness_max = 0.0
+        self.lateness_total = 0.0
+
+    @property
+    def lateness_mean(self) -> float:
+        return self.lateness_total / self.fired if self.fired > 0 else 0.0
+
+    def __repr__(self):
+        return """Timer {{ name={}, period={}, fired={}, lateness_mean={:.3f}ms, lateness_max={:.3f}ms }}""".format(
+            self.name, self.period, self.fired, self.lateness_mean * 1000, self.lateness_max * 1000)
+
+
+class BeaconScheduler:
+    """
+    Periodic timers on a heap ordered by deadline, using the monotonic
+    clock.
+
+    Deadlines advance from a base time by exactly one period, jitter is
+    only added on top of each deadline so it never accumulates. Ticks
+    missed while the process was stalled are skipped rather than sent in
+    a burst. `run_pending` is driven either by `run_forever` or by an
+    event loop sleeping `next_delay()`.
+    """
+
+    def __init__(self, jitter: float = JITTER, clock=time.monotonic, rng: random.Random = None):
+        self.jitter = jitter
+        self.clock = clock
+        self.rng = rng if rng is not None else random.Random()
+        self.heap = []
+        self.counter = itertools.count()
+        self.timers: dict[str, Timer] = {}
+        self.on_change = None
+
+    def schedule(self, timer: Timer):
+        timer.deadline = timer.base + self.rng.uniform(0, self.jitter * timer.period)
+        timer.entry = (timer.deadline, next(self.counter), timer)
+        heapq.heappush(self.heap, timer.entry)
+
+        if self.on_change is not None:
+            self.on_change()
+
+    def add(self, name: str, period: float, callback) -> Timer:
+        timer = Timer(name, period, callback)
+        self.resume(timer)
+        return timer
+
+    def resume(self, timer: Timer):
+        # Starts a new or cancelled timer, its first tick is due now
+        if timer.name in self.timers:
+            self.cancel(self.timers[timer.name])
+
+        timer.base = self.clock()
+        self.timers[timer.name] = timer
+        self.schedule(timer)
+
+    def cancel(self, timer: Timer):
+        # The heap entry stays until popped, it is ignored once detached
+        timer.entry = None
+        if self.timers.get(timer.name) is timer:
+            del self.timers[timer.name]
+
+    def set_period(self, timer: Timer, period: float):
+        if period == timer.period or timer.entry is None:
+            return
+
+        timer.base += period - timer.period
+        timer.period = period
+        self.schedule(timer)
+
+    def next_delay(self, now: float = None) -> float:
+        while len(self.heap) > 0 and self.heap[0][2].entry is not self.heap[0]:
+            heapq.heappop(self.heap)
+
+        if len(self.heap) == 0:
+            return None
+
+        if now is None:
+            now = self.clock()
+
+        return max(0.0, self.heap[0][0] - now)
+
+    def run_pending(self, now: float = None) -> int:
+        if now is None:
+            now = self.clock()
+
+        fired = 0
+
+        while len(self.heap) > 0 and self.heap[0][0] <= now:
+            entry = heapq.heappop(self.heap)
+            timer = entry[2]
+
+            if timer.entry is not entry:
+                continue
+
+            lateness = now - timer.deadline
+            timer.fired += 1
+            timer.lateness_last = lateness
+            timer.lateness_total += lateness
+            if lateness > timer.lateness_max:
+                timer.lateness_max = lateness
+
+            timer.base += timer.period
+            if timer.base <= now:
+                missed = int((now - timer.base) // timer.period) + 1
+                timer.base += missed * timer.period
+
+            timer.callback()
+            fired += 1
+
+            # Unless the callback cancelled or rescheduled its timer
+            if timer.entry is entry:
+                self.schedule(timer)
+
+        return fired
+
+    def run_forever(self, sleep=time.sleep):
+        while True:
+            delay = self.next_delay()
+            sleep(delay if delay is not None else 1)
+            self.run_pending()
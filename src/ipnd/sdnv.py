@@ -19,51 +19,111 @@ class SDNVValueError(Exception):
         self.maxValue = maxValue
 
 
+def encode_unchecked(number):
+    # Bytes are packed into one integer, lowest group of 7 bits last.
+    # Negative numbers keep their low 7 bits only, as they always did
+    packed = number & 0x7F
+    number >>= 7
+    size = 1
+
+    while number > 0:
+        packed |= ((number & 0x7F) | 0x80) << (size * 8)
+        number >>= 7
+        size += 1
+
+    return packed.to_bytes(size, 'big')
+
+
+def encode_table(size):
+    return tuple(encode_unchecked(number) for number in range(size))
+
+
+# Values below SMALL_VALUES are encoded from a precomputed table
+SMALL_VALUES = 1024
+SMALL_SDNVS = encode_table(SMALL_VALUES)
+
+
 class SDNV:
     def __init__(self, maxValue=2**32 - 1):
-        self.maxValue = maxValue
+        self.setMax(maxValue)
         return
 
     def setMax(self, maxValue):
         self.maxValue = maxValue
+        # A value above this would exceed maxValue once shifted by 7 bits
+        self.shiftLimit = maxValue >> 7
 
     def getMax(self):
         return self.maxValue
 
-    def encode(self, number):
+    def encode_into(self, number, ba):
+        # Appends the encoding to ba byte by byte, without building it
+        # apart first, and returns its length
         if number > self.maxValue:
             raise SDNVValueError(self.maxValue)
 
-        foo = bytearray()
-        foo.append(number & 0x7F)
-        number = number >> 7
+        if 0 <= number < SMALL_VALUES:
+            ba += SMALL_SDNVS[number]
+            return len(SMALL_SDNVS[number])
 
-        while (number > 0):
-            thisByte = number & 0x7F
-            thisByte |= 0x80
-            number = number >> 7
-            temp = bytearray()
-            temp.append(thisByte)
-            foo = temp + foo
+        size = (number.bit_length() + 6) // 7 if number > 0 else 1
+        for shift in range((size - 1) * 7, 0, -7):
+            ba.append(((number >> shift) & 0x7F) | 0x80)
+        ba.append(number & 0x7F)
+        return size
 
-        return foo
+    def encode(self, number):
+        if number > self.maxValue:
+            raise SDNVValueError(self.maxValue)
 
-    def decode(self, ba, offset):
-        number = 0
-        numBytes = 1
+        if 0 <= number < SMALL_VALUES:
+            return SMALL_SDNVS[number]
 
+        return encode_unchecked(number)
+
+    def decode(self, ba, offset):
         b = ba[offset]
-        number = (b & 0x7F)
-        while (b & 0x80 == 0x80):
-            number = number << 7
-            if (number > self.maxValue):
+        if b < 0x80:
+            if b > self.maxValue:
                 raise SDNVValueError(self.maxValue)
-            b = ba[offset + numBytes]
-            number += (b & 0x7F)
-            numBytes += 1
+            return b, 1
+
+        number = b & 0x7F
+        end = offset + 1
+        while True:
+            if (number > self.shiftLimit):
+                raise SDNVValueError(self.maxValue)
+            b = ba[end]
+            end += 1
+            number = (number << 7) | (b & 0x7F)
+            if b < 0x80:
+                break
         if (number > self.maxValue):
             raise SDNVValueError(self.maxValue)
-        return number, numBytes
+        return number, end - offset
+
+    def decode_many(self, ba, offset, count):
+        # Decodes count consecutive SDNVs in one loop, returns them with
+        # the offset following the last one
+        maxValue = self.maxValue
+        shiftLimit = self.shiftLimit
+        numbers = []
+
+        for _ in range(count):
+            b = ba[offset]
+            offset += 1
+            number = b & 0x7F
+            while b >= 0x80:
+                if (number > shiftLimit):
+                    raise SDNVValueError(maxValue)
+                b = ba[offset]
+                offset += 1
+                number = (number << 7) | (b & 0x7F)
+            if (number > maxValue):
+                raise SDNVValueError(maxValue)
+            numbers.append(number)
+
+        return numbers, offset
 
 
-SDNVUtil = SDNV()
\ No newline at end of file
+SDNVUtil = SDNV()
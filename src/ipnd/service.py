@@ -18,161 +18,159 @@ BYTES_TYPE = 'bytes'
 
 class Service(ABC):
 
-    def decode_with_offset(bytes: bytes, services_by_tag=None):
+    __slots__ = ()
+
+    def decode_with_offset(buffer: bytes, services_by_tag=None, offset: int = 0):
         if services_by_tag is None:
             services_by_tag = DEFAULT_SERVICES
 
-        tag = bytes[0]
+        tag = buffer[offset]
 
         if tag not in services_by_tag:
-            return UnknownService.decode_with_offset(bytes)
+            return UnknownService.decode_with_offset(buffer, offset)
 
         else:
-            return services_by_tag[tag].decode_with_offset(bytes)
+            return services_by_tag[tag].decode_with_offset(buffer, offset)
 
     @abstractmethod
     def encode(self) -> bytes:
         pass
 
+    def encode_into(self, ba: bytearray):
+        ba += self.encode()
+
     def __bytes__(self) -> bytes:
         return self.encode()
 
 
-class PrimitiveService:
+def encode_primitive_array(a):
+    ba = bytearray()
 
-    value = None
-    type: str = None
+    if len(a) == 0:
+        ba.append(1)
+        ba.append(0)
+    else:
+        SDNVUtil.encode_into(len(a), ba)
+        ba.extend(a)
 
-    def __init__(self, value, type=None):
-        self.value = value
+    return bytes(ba)
+
+
+class PrimitiveCodec:
+
+    def __init__(self, tag: int, type: str, encode, decode):
+        self.tag = tag
         self.type = type
+        # encode(value, ba) appends the value to a bytearray
+        self.encode = encode
+        # decode(buffer, offset) returns the value and the following offset
+        self.decode = decode
 
-    def encode(self) -> bytes:
-        ba = bytearray()
 
-        tag = 0
-        get_val = None
+def struct_codec(tag: int, type: str, fmt: str) -> PrimitiveCodec:
+    packer = struct.Struct(fmt)
 
-        if self.type == BOOL_TYPE:
-            tag = 0
-            def get_val(v): return (int(v),)
+    def encode(v, ba):
+        ba += packer.pack(v)
 
-        elif self.type == UINT_TYPE:
-            tag = 1
-            def get_val(v): return SDNVUtil.encode(v)
+    def decode(buffer, offset):
+        return (packer.unpack_from(buffer, offset)[0], offset + packer.size)
 
-        elif self.type == SINT_TYPE:
-            tag = 2
-            def get_val(v): return SDNVUtil.encode(v)
+    return PrimitiveCodec(tag, type, encode, decode)
 
-        elif self.type == FIXED16_TYPE:
-            tag = 3
-            def get_val(v): return int(v).to_bytes(2, 'big')
 
-        elif self.type == FIXED32_TYPE:
-            tag = 4
-            def get_val(v): return int(v).to_bytes(4, 'big')
+def encode_bool(v, ba):
+    ba.append(int(v))
 
-        elif self.type == FIXED64_TYPE:
-            tag = 5
-            def get_val(v): return int(v).to_bytes(8, 'big')
 
-        elif self.type == FLOAT_TYPE:
-            tag = 6
-            def get_val(v): return struct.pack("!f", v)
+def decode_bool(buffer, offset):
+    return (buffer[offset] == 1, offset + 1)
 
-        elif self.type == DOUBLE_TYPE:
-            tag = 7
-            def get_val(v): return struct.pack("!d", v)
 
-        elif self.type == STRING_TYPE:
-            tag = 8
-            def get_val(v): return encode_primitive_array(
-                str(self.value).encode("ascii"))
+def encode_sdnv(v, ba):
+    SDNVUtil.encode_into(v, ba)
 
-        elif self.type == BYTES_TYPE:
-            tag = 9
-            def get_val(v): return encode_primitive_array(bytes(self.value))
 
-        else:
+def decode_sdnv(buffer, offset):
+    (v, num_bytes) = SDNVUtil.decode(buffer, offset)
+    return (v, offset + num_bytes)
+
+
+def encode_string(v, ba):
+    ba += encode_primitive_array(str(v).encode("ascii"))
+
+
+def decode_string(buffer, offset):
+    (length, num_bytes) = SDNVUtil.decode(buffer, offset)
+    offset += num_bytes
+    return (str(buffer[offset:offset+length], "ascii"), offset + length)
+
+
+def encode_bytes(v, ba):
+    ba += encode_primitive_array(bytes(v))
+
+
+def decode_bytes(buffer, offset):
+    (length, num_bytes) = SDNVUtil.decode(buffer, offset)
+    offset += num_bytes
+    return (bytes(buffer[offset:offset+length]), offset + length)
+
+
+PRIMITIVE_CODECS = (
+    PrimitiveCodec(0, BOOL_TYPE, encode_bool, decode_bool),
+    PrimitiveCodec(1, UINT_TYPE, encode_sdnv, decode_sdnv),
+    PrimitiveCodec(2, SINT_TYPE, encode_sdnv, decode_sdnv),
+    struct_codec(3, FIXED16_TYPE, "!H"),
+    struct_codec(4, FIXED32_TYPE, "!I"),
+    struct_codec(5, FIXED64_TYPE, "!Q"),
+    struct_codec(6, FLOAT_TYPE, "!f"),
+    struct_codec(7, DOUBLE_TYPE, "!d"),
+    PrimitiveCodec(8, STRING_TYPE, encode_string, decode_string),
+    PrimitiveCodec(9, BYTES_TYPE, encode_bytes, decode_bytes),
+)
+
+PRIMITIVE_CODECS_BY_TAG = {codec.tag: codec for codec in PRIMITIVE_CODECS}
+PRIMITIVE_CODECS_BY_TYPE = {codec.type: codec for codec in PRIMITIVE_CODECS}
+
+
+class PrimitiveService:
+
+    __slots__ = ("value", "type")
+
+    def __init__(self, value, type=None):
+        self.value = value
+        self.type = type
+
+    def encode_into(self, ba: bytearray):
+        codec = PRIMITIVE_CODECS_BY_TYPE.get(self.type)
+
+        if codec is None:
             raise Exception(
                 "Unknown primitive service type {}".format(self.type))
 
-        ba.append(tag)
+        ba.append(codec.tag)
 
+        # Values given as bytes are already encoded
         if self.type != BYTES_TYPE and isinstance(self.value, bytes):
-            ba.extend(self.value)
+            ba += self.value
         else:
-            ba.extend(get_val(self.value))
+            codec.encode(self.value, ba)
 
+    def encode(self) -> bytes:
+        ba = bytearray()
+        self.encode_into(ba)
         return bytes(ba)
 
-    def decode_with_offset(bytes: bytes):
-        tag = bytes[0]
-        offset = 1
-
-        type = None
-        value = None
-
-        if tag == 0:
-            type = BOOL_TYPE
-            value = bytes[offset] == 1
-            offset += 1
-
-        elif tag == 1:
-            type = UINT_TYPE
-            (v, num_bytes) = SDNVUtil.decode(bytes, offset)
-            value = v
-            offset += num_bytes
-
-        elif tag == 2:
-            type = SINT_TYPE
-            (v, num_bytes) = SDNVUtil.decode(bytes, offset)
-            value = v
-            offset += num_bytes
-
-        elif tag == 3:
-            type = FIXED16_TYPE
-            value = int.from_bytes(bytes[offset:offset+2], 'big')
-            offset += 2
-
-        elif tag == 4:
-            type = FIXED32_TYPE
-            value = int.from_bytes(bytes[offset:offset+4], 'big')
-            offset += 4
-
-        elif tag == 5:
-            type = FIXED64_TYPE
-            value = int.from_bytes(bytes[offset:offset+8], 'big')
-            offset += 8
-
-        elif tag == 6:
-            type = FLOAT_TYPE
-            value = struct.unpack("!f", bytes[offset:offset+4])
-            offset += 4
-
-        elif tag == 7:
-            type = DOUBLE_TYPE
-            value = struct.unpack("!d", bytes[offset:offset+8])
-            offset += 8
-
-        elif tag == 8:
-            type = STRING_TYPE
-            (length, num_bytes) = SDNVUtil.decode(bytes, offset)
-            offset += num_bytes
-            value = bytes[offset:offset+length].decode("ascii")
-            offset += length
-
-        elif tag == 9:
-            type = BYTES_TYPE
-            (length, num_bytes) = SDNVUtil.decode(bytes, offset)
-            offset += num_bytes
-            value = bytes[offset:offset+length]
-            offset += length
-
-        self = PrimitiveService(value, type)
+    def decode_with_offset(buffer: bytes, offset: int = 0):
+        codec = PRIMITIVE_CODECS_BY_TAG.get(buffer[offset])
+        offset += 1
 
-        return (self, offset)
+        if codec is None:
+            return (PrimitiveService(None, None), offset)
+
+        (value, offset) = codec.decode(buffer, offset)
+
+        return (PrimitiveService(value, codec.type), offset)
 
     def __bytes__(self) -> bytes:
         return self.encode()
@@ -181,21 +179,9 @@ class PrimitiveService:
         return """PrimitiveService {{ type={}, value={} }}""".format(self.type, self.value)
 
 
-def encode_primitive_array(a):
-    ba = bytearray()
-
-    if len(a) == 0:
-        ba.append(1)
-        ba.append(0)
-    else:
-        ba.extend(SDNVUtil.encode(len(a)))
-        ba.extend(a)
-
-    return bytes(ba)
-
-
 class ConstructedService(Service):
-    tag: int = None
+
+    __slots__ = ("tag",)
 
     def __init__(self, tag: int):
         self.tag = tag
@@ -210,20 +196,22 @@ class ConstructedService(Service):
 
         contentba = bytearray()
         for s in self.get_services():
-            contentba.extend(bytes(s))
+            s.encode_into(contentba)
 
-        ba.extend(SDNVUtil.encode(len(contentba)))
+        SDNVUtil.encode_into(len(contentba), ba)
         ba.extend(contentba)
 
         return bytes(ba)
 
     @abstractmethod
-    def decode_with_offset(bytes: bytes):
+    def decode_with_offset(buffer: bytes, offset: int = 0):
         pass
 
 
 class CLAService(ConstructedService):
 
+    __slots__ = ()
+
     @abstractmethod
     def get_cla_address(self):
         pass
@@ -231,8 +219,7 @@ class CLAService(ConstructedService):
 
 class TCPCLService(CLAService):
 
-    address: IPv4Address = None
-    port: int = None
+    __slots__ = ("address", "port")
 
     def __init__(self, address: Union[IPv4Address, IPv6Address, str], port: int):
         if isinstance(address, str):
@@ -260,15 +247,14 @@ class TCPCLService(CLAService):
             PrimitiveService(self.port, type=FIXED16_TYPE)
         )
 
-    def decode_with_offset(bytes: bytes):
-        offset = 1
+    def decode_with_offset(buffer: bytes, offset: int = 0):
+        offset += 1
 
-        (length, num_bytes) = SDNVUtil.decode(bytes, offset)
+        (length, num_bytes) = SDNVUtil.decode(buffer, offset)
         offset += num_bytes
 
-        (services, num_bytes) = decode_services(
-            2, bytes[offset: offset+length])
-        offset += num_bytes
+        (services, _) = decode_services(2, buffer, offset=offset)
+        offset += length
 
         address = ip_address(services[0].value)
         port = services[1].value
@@ -290,16 +276,19 @@ class TCPCLService(CLAService):
 
 
 class UnknownService(Service):
-    def decode_with_offset(bytes: bytes):
+
+    __slots__ = ("tag", "buffer")
+
+    def decode_with_offset(buffer: bytes, offset: int = 0):
         self = UnknownService()
 
-        self.tag = bytes[0]
-        offset = 1
+        self.tag = buffer[offset]
+        offset += 1
 
-        (length, num_bytes) = SDNVUtil.decode(bytes, offset)
+        (length, num_bytes) = SDNVUtil.decode(buffer, offset)
         offset += num_bytes
 
-        self.buffer = bytes[offset: offset+length]
+        self.buffer = bytes(buffer[offset: offset+length])
 
         return (self, offset+length)
 
@@ -307,7 +296,7 @@ class UnknownService(Service):
         ba = bytearray()
         ba.append(self.tag)
 
-        ba.extend(SDNVUtil.encode(len(self.buffer)))
+        SDNVUtil.encode_into(len(self.buffer), ba)
         ba.extend(self.buffer)
 
         return bytes(ba)
@@ -316,17 +305,28 @@ class UnknownService(Service):
         return """UnknownService {{ tag={}, length={} }}""".format(self.tag, len(self.buffer))
 
 
-def decode_services(n_services, bytes, services_by_tag=None):
-    offset = 0
+def decode_services(n_services, buffer, services_by_tag=None, offset: int = 0):
+    # Offsets are absolute so a memoryview is walked without copying
+    if services_by_tag is None:
+        services_by_tag = DEFAULT_SERVICES
+
     service_list = []
 
     for _ in range(n_services):
-        (service, num_bytes) = Service.decode_with_offset(
-            bytes[offset:], services_by_tag)
+        tag = buffer[offset]
+
+        # Primitives are decoded straight from their codec
+        if services_by_tag.get(tag) is PrimitiveService:
+            codec = PRIMITIVE_CODECS_BY_TAG[tag]
+            (value, offset) = codec.decode(buffer, offset + 1)
+            service = PrimitiveService(value, codec.type)
+        else:
+            (service, offset) = Service.decode_with_offset(
+                buffer, services_by_tag, offset)
+
         service_list += (service,)
-        offset += num_bytes
 
-    return (service_list, offset)
+    return (tuple(service_list), offset)
 
 
 DEFAULT_SERVICES = {
@@ -0,0 +1,157 @@
+import mmap
+import os
+import struct
+import time
+import zlib
+
+from .metrics import Histogram
+from .neighbors import NeighborTable, Neighbor
+
+MAGIC = b"IPND"
+VERSION = 1
+# Magic, version, record count, length of the records, CRC-32 of the
+# records, wall clock time of the write
+HEADER = struct.Struct("<4sB3xIIId")
+# Wall clock time last seen, period, sequence number, EID and CLA address
+# lengths, followed by the EID and CLA address
+RECORD = struct.Struct("<dIiHH")
+
+SNAPSHOT_INTERVAL = 10
+INITIAL_SIZE = 1 << 16
+
+WRITE_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1)
+
+
+class Snapshot:
+    """
+    Neighbor table saved to a memory-mapped file, to restore contacts
+    right after a restart instead of waiting for beacons.
+
+    `write` rewrites the file in place through the mapping, growing it as
+    needed, and the page cache keeps it across a crash of the process.
+    The header is written last with a checksum of the records, a snapshot
+    interrupted while being written is ignored. Times are saved on the
+    wall clock as the monotonic one does not survive a reboot.
+    """
+
+    def __init__(self, path: str, interval: float = SNAPSHOT_INTERVAL):
+        self.path = path
+        self.interval = interval
+        self.file = None
+        self.map = None
+        self.last_write = None
+        self.writes = 0
+        self.restored = 0
+        self.write_latency = Histogram(WRITE_BUCKETS)
+        # Seconds from startup until restored contacts were pushed
+        self.startup_to_routes = None
+
+    def open(self):
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o600)
+        self.file = os.fdopen(fd, "r+b")
+
+        if os.fstat(fd).st_size < HEADER.size:
+            self.file.truncate(INITIAL_SIZE)
+
+        self.map = mmap.mmap(fd, 0)
+
+    def due(self, now: float = None) -> bool:
+        if now is None:
+            now = time.monotonic()
+        return self.last_write is None or now - self.last_write >= self.interval
+
+    def write(self, table: NeighborTable, now: float = None, wall: float = None):
+        if now is None:
+            now = time.monotonic()
+        if wall is None:
+            wall = time.time()
+
+        start = time.perf_counter()
+        offset = HEADER.size
+        count = 0
+
+        for neighbor in table.neighbors.values():
+            if neighbor.cla_address is None:
+                continue
+
+            eid = neighbor.eid.encode()
+            cla_address = neighbor.cla_address.encode()
+            end = offset + RECORD.size + len(eid) + len(cla_address)
+
+            if end > len(self.map):
+                self.map.resize(max(end, 2 * len(self.map)))
+
+            sequence_number = neighbor.sequence_number
+            RECORD.pack_into(self.map, offset, wall - (now - neighbor.last_seen), neighbor.period,
+                             -1 if sequence_number is None else sequence_number,
+                             len(eid), len(cla_address))
+            offset += RECORD.size
+            self.map[offset:offset+len(eid)] = eid
+            offset += len(eid)
+            self.map[offset:end] = cla_address
+            offset = end
+            count += 1
+
+        with memoryview(self.map) as view:
+            crc = zlib.crc32(view[HEADER.size:offset])
+        HEADER.pack_into(self.map, 0, MAGIC, VERSION, count, offset - HEADER.size, crc, wall)
+
+        self.last_write = now
+        self.writes += 1
+        self.write_latency.observe(time.perf_counter() - start)
+
+    def read(self) -> list:
+        # (eid, cla_address, period, last seen on the wall clock, sequence
+        # number) of each saved neighbor, none when the snapshot is not valid
+        (magic, version, count, length, crc, _) = HEADER.unpack_from(self.map, 0)
+
+        if magic != MAGIC or version != VERSION or HEADER.size + length > len(self.map):
+            return []
+
+        with memoryview(self.map) as view:
+            if zlib.crc32(view[HEADER.size:HEADER.size+length]) != crc:
+                print("Ignoring corrupted snapshot {}".format(self.path))
+                return []
+
+        records = []
+        offset = HEADER.size
+
+        for _ in range(count):
+            (last_seen, period, sequence_number, eid_length, cla_length) = \
+                RECORD.unpack_from(self.map, offset)
+            offset += RECORD.size
+            eid = self.map[offset:offset+eid_length].decode()
+            offset += eid_length
+            cla_address = self.map[offset:offset+cla_length].decode()
+            offset += cla_length
+            records.append((eid, cla_address, period, last_seen,
+                            None if sequence_number < 0 else sequence_number))
+
+        return records
+
+    def restore(self, table: NeighborTable, now: float = None, wall: float = None) -> list[Neighbor]:
+        # Neighbors of the snapshot not expired since, added back to table
+        if now is None:
+            now = time.monotonic()
+        if wall is None:
+            wall = time.time()
+
+        restored = []
+
+        for (eid, cla_address, period, last_seen, sequence_number) in self.read():
+            age = max(0.0, wall - last_seen)
+            neighbor = table.restore(eid, cla_address, period, now - age, sequence_number, now)
+            if neighbor is not None:
+                restored.append(neighbor)
+
+        self.restored = len(restored)
+        return restored
+
+    def close(self):
+        if self.map is not None:
+            self.map.flush()
+            self.map.close()
+            self.map = None
+        if self.file is not None:
+            self.file.close()
+            self.file = None
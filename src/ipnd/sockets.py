@@ -0,0 +1,61 @@
+import socket
+import struct
+
+
+def multicast_sender(family, ttl: int = 1, interface: str = None) -> socket.socket:
+    sock = socket.socket(family, socket.SOCK_DGRAM)
+    ifindex = socket.if_nametoindex(interface) if interface is not None else 0
+
+    if family == socket.AF_INET6:
+        sock.setsockopt(socket.IPPROTO_IPV6, socket.IPV6_MULTICAST_HOPS, ttl)
+        sock.setsockopt(socket.IPPROTO_IPV6, socket.IPV6_MULTICAST_LOOP, 0)
+        if ifindex:
+            sock.setsockopt(socket.IPPROTO_IPV6, socket.IPV6_MULTICAST_IF, ifindex)
+    else:
+        sock.setsockopt(socket.IPPROTO_IP, socket.IP_MULTICAST_TTL,
+                        struct.pack('b', ttl))
+        if ifindex:
+            # struct ip_mreqn, selecting the interface by index
+            sock.setsockopt(socket.IPPROTO_IP, socket.IP_MULTICAST_IF,
+                            struct.pack('=4s4si', bytes(4), bytes(4), ifindex))
+
+    return sock
+
+
+def membership(family, group: str, interface: str = None) -> tuple:
+    # Option level and value joining group on interface, on any when None
+    ifindex = socket.if_nametoindex(interface) if interface is not None else 0
+
+    if family == socket.AF_INET6:
+        return (socket.IPPROTO_IPV6, socket.inet_pton(socket.AF_INET6, group) + struct.pack('@I', ifindex))
+    # struct ip_mreqn
+    return (socket.IPPROTO_IP, socket.inet_aton(group) + bytes(4) + struct.pack('=i', ifindex))
+
+
+def join_group(sock: socket.socket, family, group: str, interface: str = None):
+    (level, mreq) = membership(family, group, interface)
+    option = socket.IPV6_JOIN_GROUP if family == socket.AF_INET6 else socket.IP_ADD_MEMBERSHIP
+    sock.setsockopt(level, option, mreq)
+
+
+def leave_group(sock: socket.socket, family, group: str, interface: str = None):
+    (level, mreq) = membership(family, group, interface)
+    option = socket.IPV6_LEAVE_GROUP if family == socket.AF_INET6 else socket.IP_DROP_MEMBERSHIP
+    sock.setsockopt(level, option, mreq)
+
+
+def multicast_receiver(family, group: str, port: int, interfaces=None) -> socket.socket:
+    # Joins group on each of interfaces, or on any interface when None
+    sock = socket.socket(family, socket.SOCK_DGRAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+
+    if family == socket.AF_INET6:
+        sock.setsockopt(socket.IPPROTO_IPV6, socket.IPV6_V6ONLY, 1)
+        sock.bind(('::', port))
+    else:
+        sock.bind(('', port))
+
+    for interface in (interfaces if interfaces is not None else [None]):
+        join_group(sock, family, group, interface)
+
+    return sock
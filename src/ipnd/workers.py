@@ -0,0 +1,151 @@
+import multiprocessing
+import queue
+
+from .discovery import BeaconHandler
+from .neighbors import NeighborTable
+from .probe import CLASelector
+from .receiver import QUEUE_SIZE
+from .sdnv import SDNVUtil
+
+# Counters reported by each worker with every message to the coordinator
+WORKER_COUNTERS = ("received", "rejected", "self_echoed", "duplicates",
+                   "neighbors", "added", "updates", "skipped", "expired")
+
+
+def shard_key(data: bytes) -> bytes:
+    # The EID right after the version, flags and sequence number, read
+    # without decoding the beacon. Beacons without one all go to the
+    # same worker, which rejects them
+    try:
+        if data[1] & 0b00000001:
+            (eid_length, num_bytes) = SDNVUtil.decode(data, 4)
+            return data[4+num_bytes:4+num_bytes+eid_length]
+    except Exception:
+        pass
+
+    return b""
+
+
+def run_worker(index: int, own_eid: str, inbox, outbox, probe_cla: bool = False):
+    # Entry point of a worker process: decodes the batches of its shard
+    # and sends back (index, updates, deletions, counters) tuples
+    neighbors = NeighborTable()
+    cla_selector = None
+    if probe_cla:
+        cla_selector = CLASelector()
+        cla_selector.start()
+    handler = BeaconHandler(own_eid, neighbors, cla_selector=cla_selector)
+
+    # Tells the pool this worker is ready
+    outbox.put((index, [], [], (0,) * len(WORKER_COUNTERS)))
+
+    while True:
+        try:
+            batch = inbox.get(timeout=neighbors.next_expiry())
+        except queue.Empty:
+            batch = []
+
+        if batch is None:
+            return
+
+        changed = handler.probed()
+        for data in batch:
+            try:
+                neighbor = handler.handle(data)
+            except Exception as e:
+                print("Failed to handle beacon : {}".format(e))
+                continue
+            if neighbor is not None:
+                changed.append(neighbor)
+
+        updates = [(neighbor.eid, neighbor.cla_address, neighbors.contact_duration(neighbor.period))
+                   for neighbor in changed]
+
+        deletions = [(neighbor.eid, neighbor.cla_address) for neighbor in neighbors.expire()]
+
+        counters = (handler.received, handler.rejected, handler.self_echoed, handler.duplicates,
+                    len(neighbors), neighbors.added, neighbors.updates, neighbors.skipped,
+                    neighbors.expired)
+        outbox.put((index, updates, deletions, counters))
+
+
+class WorkerPool:
+    """
+    Beacon decoding spread over worker processes, each owning the
+    neighbors of one shard of the EIDs.
+
+    The pool stands for the queue of a `BatchReceiver`: `put_nowait`
+    splits each batch by EID and forwards it to the workers, so that all
+    beacons of a neighbor are handled by the same worker. Workers send
+    back neighbor updates as (eid, cla_address, contact_duration) and
+    expired neighbors as (eid, cla_address) on `outbox`, for a single
+    coordinator to push them to µPCN.
+    """
+
+    def __init__(self, own_eid: str, workers: int, queue_size: int = QUEUE_SIZE,
+                 probe_cla: bool = False):
+        context = multiprocessing.get_context("spawn")
+
+        self.inboxes = [context.Queue(queue_size) for _ in range(workers)]
+        self.outbox = context.Queue()
+        self.counters = [(0,) * len(WORKER_COUNTERS) for _ in range(workers)]
+        self.overflows = 0
+        self.processes = [
+            context.Process(target=run_worker, args=(index, own_eid, inbox, self.outbox, probe_cla),
+                            name="ipnd-worker-{}".format(index), daemon=True)
+            for (index, inbox) in enumerate(self.inboxes)]
+
+        for process in self.processes:
+            process.start()
+
+        for _ in self.processes:
+            self.outbox.get()
+
+    def put_nowait(self, batch: list):
+        shards = [[] for _ in self.inboxes]
+        for (data, _) in batch:
+            shards[hash(shard_key(data)) % len(shards)].append(data)
+
+        for (inbox, shard) in zip(self.inboxes, shards):
+            if len(shard) == 0:
+                continue
+            try:
+                inbox.put_nowait(shard)
+            except queue.Full:
+                self.overflows += len(shard)
+
+    def get(self, timeout: float = None) -> tuple:
+        # Updates and deletions of every message waiting on the outbox
+        (index, updates, deletions, counters) = self.outbox.get(timeout=timeout)
+        self.counters[index] = counters
+
+        while True:
+            try:
+                (index, more_updates, more_deletions, counters) = self.outbox.get_nowait()
+            except queue.Empty:
+                return (updates, deletions)
+            self.counters[index] = counters
+            updates += more_updates
+            deletions += more_deletions
+
+    def total(self, counter: str) -> int:
+        field = WORKER_COUNTERS.index(counter)
+        return sum(counters[field] for counters in self.counters)
+
+    def table_counters(self):
+        # Counters of the neighbor tables of all workers, as watched by a
+        # PeriodController
+        return lambda: (self.total("neighbors"), self.total("updates") + self.total("skipped"),
+                        self.total("added") + self.total("expired"))
+
+    def close(self):
+        for inbox in self.inboxes:
+            try:
+                inbox.put_nowait(None)
+            except queue.Full:
+                pass
+
+        for process in self.processes:
+            process.join(1)
+            if process.is_alive():
+                process.terminate()
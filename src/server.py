@@ -1,17 +1,31 @@
 #!/bin/env python3
 
+import argparse
+import asyncio
+import queue
+import select
+import signal
 import socket
-import struct
 import time
-from ipnd.message import IPNDMessage
-from ipnd.service import TCPCLService, CLAService, Service
+from ipnd.adaptive import PeriodController, table_counters
+from ipnd.admission import Admission, SOURCE_RATE
+from ipnd.neighbors import NeighborTable
+from ipnd.discovery import BeaconHandler
+from ipnd.engine import BeaconEngine
+from ipnd.fastdiscovery import FastDiscovery
+from ipnd.probe import CLASelector
+from ipnd.snapshot import Snapshot
+from ipnd.beacons import InterfaceBeacons
+from ipnd.netwatch import NetlinkWatcher
+from ipnd.receiver import BatchReceiver, QUEUE_SIZE
+from ipnd.scheduler import BeaconScheduler, JITTER
+from ipnd.workers import WorkerPool
+from ipnd import sockets, metrics
 import upcn
 from pyupcn.agents import make_contact
-from datetime import datetime, timedelta
 import threading
 import os
 import netifaces
-from dataclasses import dataclass
 
 PERIOD = 3
 DESTINATION_V4 = "224.0.0.26"
@@ -19,130 +33,400 @@ DESTINATION_V6 = "FF02::1"
 DESTINATION_PORT = 3003
 AAP_PREFIX = "ipcn"
 
-socket_path = "/var/run/user/{}/upcn.socket".format(os.getuid())
+STARTED = time.monotonic()
 
-def start_beacon_server():
+socket_path = "/var/run/user/{}/upcn.socket".format(os.getuid())
 
-    services:list[Service] = []
+def get_interfaces() -> dict:
+    interfaces = {}
 
     for iface_name in netifaces.interfaces():    
         if iface_name == "lo":
             continue
-        
-        addresses = netifaces.ifaddresses(iface_name)
 
-        if socket.AF_INET in addresses:
-            services += map(lambda it: TCPCLService(it["addr"], 4556), addresses[socket.AF_INET])
+        interfaces[iface_name] = netifaces.ifaddresses(iface_name)
 
-        if socket.AF_INET6 in addresses:
-            services += map(lambda it: TCPCLService(it["addr"], 4556), addresses[socket.AF_INET6])
+    return interfaces
 
-    print("Advertizing services :")
-    for it in services:
-        print("\t", it)
 
-    with upcn.upcn_sock(AAP_PREFIX+"/server", socket_path=socket_path) as aap:
+def make_beacons(eid: str, periods: dict = {}, jitter: float = JITTER,
+                 controller: PeriodController = None,
+                 fast_discovery: FastDiscovery = None) -> InterfaceBeacons:
+    beacons = InterfaceBeacons(eid, BeaconScheduler(jitter=jitter), {
+        socket.AF_INET: (DESTINATION_V4, DESTINATION_PORT),
+        socket.AF_INET6: (DESTINATION_V6, DESTINATION_PORT),
+    }, PERIOD, periods, controller, fast_discovery)
+    beacons.start(get_interfaces())
+    metrics.register_beacons(beacons)
+    return beacons
 
-        print("Advertizing {} (period: {}s)".format(aap.eid, PERIOD))
 
-        ttl = struct.pack('b', 1)
+def open_watcher():
+    # Watcher of address changes, None where rtnetlink is not available
+    try:
+        watcher = NetlinkWatcher()
+    except (AttributeError, OSError) as e:
+        print("Not watching network interfaces : {}".format(e))
+        return None
 
-        with socket.socket(socket.AF_INET6, socket.SOCK_DGRAM) as v6sock:
-            v6sock.setsockopt(socket.IPPROTO_IP, socket.IP_MULTICAST_TTL, ttl)
-            v6sock.setsockopt(socket.IPPROTO_IPV6, socket.IPV6_MULTICAST_LOOP, 0)
-            print("Emitting on {}:{}".format(DESTINATION_V4, DESTINATION_PORT))
+    print("Watching network interfaces")
+    metrics.register_watcher(watcher)
+    return watcher
 
-            with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as v4sock:
-                v4sock.setsockopt(socket.IPPROTO_IP, socket.IP_MULTICAST_TTL, ttl)
-                print("Emitting on {}:{}".format(DESTINATION_V6, DESTINATION_PORT))
 
-                message = IPNDMessage()
-                message.eid = aap.eid
-                message.period = PERIOD
-                message.sequence_number = 0
-                message.services = services
-                period_timeout = datetime.now()
+def watch_interfaces(beacons: InterfaceBeacons, watcher):
+    events = watcher.read()
+    resync = any(kind == "resync" for (kind, _, _, _) in events)
+    beacons.watch(events, get_interfaces() if resync else None)
 
-                while True:
 
-                    now = datetime.now()
+def start_beacon_server(periods: dict = {}, jitter: float = JITTER,
+                        controller: PeriodController = None, fast_discovery: FastDiscovery = None):
 
-                    if now > period_timeout:
-                        print("\rBeacon {} ".format(message.sequence_number), end="")
+    with upcn.upcn_sock(AAP_PREFIX+"/server", socket_path=socket_path) as aap:
 
-                        encoded_message = message.encode()
+        metrics.register_aap(aap)
+        beacons = make_beacons(aap.eid, periods, jitter, controller, fast_discovery)
+        watcher = open_watcher()
 
-                        v6sock.sendto(encoded_message,
-                                    (DESTINATION_V6, DESTINATION_PORT))
-                        
-                        v4sock.sendto(encoded_message,
-                                    (DESTINATION_V4, DESTINATION_PORT))
+        if watcher is None:
+            beacons.scheduler.run_forever()
+            return
 
-                        message.sequence_number += 1
+        def wait(delay):
+            (readable, _, _) = select.select([watcher], [], [], delay)
+            if len(readable) > 0:
+                watch_interfaces(beacons, watcher)
 
-                        period_timeout = now + timedelta(seconds=PERIOD)
+        beacons.scheduler.run_forever(sleep=wait)
 
-                    else:
-                        time.sleep((period_timeout - now).seconds)
 
+def start_beacon_client(workers: int = 0, source_rate: float = SOURCE_RATE,
+                        controller: PeriodController = None, fast_discovery: FastDiscovery = None,
+                        probe_cla: bool = False, snapshot: Snapshot = None):
+    neighbors = NeighborTable()
+    admission = Admission(source_rate, 2 * source_rate)
 
-def start_beacon_client():
     with upcn.upcn_sock(AAP_PREFIX+"/client", socket_path=socket_path) as aap:
-        with socket.socket(socket.AF_INET6, socket.SOCK_DGRAM) as sock:
-
-            sock.bind(('', DESTINATION_PORT))
-
-            if socket.has_ipv6:
-                group = socket.inet_pton(socket.AF_INET6, DESTINATION_V6)
-                sock.setsockopt(socket.IPPROTO_IP,
-                                socket.IPV6_JOIN_GROUP, group)
-                sock.setsockopt(socket.IPPROTO_IPV6,
-                                socket.IPV6_MULTICAST_LOOP, 0)
-                print("Listening on IPv6 {}:{}".format(
-                    DESTINATION_V6, DESTINATION_PORT))
-            else:
-                group = socket.inet_pton(socket.AF_INET, DESTINATION_V4)
-                sock.setsockopt(socket.IPPROTO_IP,
-                                socket.IP_ADD_MEMBERSHIP, group)
-                print("Listening on IPv4 {}:{}".format(
-                    DESTINATION_V4, DESTINATION_PORT))
-
-            while True:
-
-                mess = sock.recv(4096)
-
-                try:
-                    ipnd_mess = IPNDMessage.decode(mess)
-                except Exception as e:
-                    print("Invalid ipnd packet received : {}".format(e))
-
-                if ipnd_mess.eid is None:
-                    print("received message from unknown eid, skipping...")
-                    continue
-                
-                if ipnd_mess.eid == aap.eid:
-                    # Advertized myself, skipping
-                    continue
-
-                print("Received message from {}".format(
-                    ipnd_mess.eid))
-
-                cla_service = list(filter(lambda it: isinstance(
-                    it, CLAService), ipnd_mess.services))
-
-                if len(cla_service) == 0:
-                    print("No CLA Service available")
-                    continue
-
-                # TODO Do a better selectio of the best CLA
-                cla_address = cla_service[0].get_cla_address()
-
-                aap.set_contact(ipnd_mess.eid, cla_address, contacts=[
-                    make_contact(0, ipnd_mess.period+ipnd_mess.period/2, 1000)
-                ])
-
-server_thread = threading.Thread(target=start_beacon_server)
-client_thread = threading.Thread(target=start_beacon_client)
-
-server_thread.start()
-client_thread.start()
+
+        if workers > 0:
+            pool = WorkerPool(aap.eid, workers, probe_cla=probe_cla)
+            receiver = BatchReceiver(pool, admission=admission)
+        else:
+            receiver = BatchReceiver(queue.Queue(QUEUE_SIZE), admission=admission)
+
+        receiver.add_socket(sockets.multicast_receiver(
+            socket.AF_INET, DESTINATION_V4, DESTINATION_PORT))
+        print("Listening on IPv4 {}:{}".format(DESTINATION_V4, DESTINATION_PORT))
+
+        if socket.has_ipv6:
+            receiver.add_socket(sockets.multicast_receiver(
+                socket.AF_INET6, DESTINATION_V6, DESTINATION_PORT))
+            print("Listening on IPv6 [{}]:{}".format(DESTINATION_V6, DESTINATION_PORT))
+
+        metrics.register_aap(aap)
+        metrics.register_receiver(receiver)
+        metrics.register_admission(admission)
+
+        if workers > 0:
+            print("Decoding beacons in {} worker processes".format(workers))
+            metrics.register_pool(pool)
+            if controller is not None:
+                controller.watch(pool.table_counters())
+            try:
+                run_sharded_client(aap, receiver, pool)
+            finally:
+                receiver.close()
+                pool.close()
+            return
+
+        cla_selector = None
+        if probe_cla:
+            cla_selector = CLASelector()
+            cla_selector.start()
+            metrics.register_cla_selector(cla_selector)
+
+        handler = BeaconHandler(aap.eid, neighbors, cla_selector=cla_selector)
+        metrics.register_handler(handler)
+        if controller is not None:
+            controller.watch(table_counters(neighbors))
+        if fast_discovery is not None:
+            handler.on_new_neighbor = fast_discovery.reply
+            metrics.register_fast_discovery(fast_discovery)
+
+        try:
+            run_beacon_client(aap, receiver, handler, snapshot)
+        finally:
+            receiver.close()
+            if cla_selector is not None:
+                cla_selector.close()
+
+
+def run_beacon_client(aap, receiver: BatchReceiver, handler: BeaconHandler, snapshot: Snapshot = None):
+    neighbors = handler.neighbors
+
+    if snapshot is not None:
+        restored = snapshot.restore(neighbors)
+        if len(restored) > 0:
+            aap.set_contacts([(neighbor.eid, neighbor.cla_address, [
+                make_contact(0, neighbors.contact_duration(neighbor.period), 1000)
+            ]) for neighbor in restored])
+        snapshot.startup_to_routes = time.monotonic() - STARTED
+        print("Restored {} contacts from {} in {:.3f}ms".format(
+            len(restored), snapshot.path, snapshot.startup_to_routes * 1000))
+
+    threading.Thread(target=receiver.run_forever, daemon=True).start()
+
+    dropped = 0
+
+    while True:
+
+        try:
+            batch = receiver.queue.get(timeout=neighbors.next_expiry())
+        except queue.Empty:
+            batch = []
+        while not receiver.queue.empty():
+            batch += receiver.queue.get_nowait()
+
+        changed = handler.probed()
+        for (mess, source) in batch:
+            try:
+                neighbor = handler.handle(mess, source)
+            except Exception as e:
+                print("Failed to handle beacon from {} : {}".format(source[0], e))
+                continue
+
+            if neighbor is not None:
+                changed.append(neighbor)
+
+        updates = [(neighbor.eid, neighbor.cla_address, [
+            make_contact(0, neighbors.contact_duration(neighbor.period), 1000)
+        ]) for neighbor in changed]
+
+        deletions = []
+        for neighbor in neighbors.expire():
+            print("Neighbor {} expired".format(neighbor.eid))
+            deletions.append((neighbor.eid, neighbor.cla_address))
+
+        if snapshot is not None and snapshot.due():
+            snapshot.write(neighbors)
+
+        if receiver.kernel_drops + receiver.overflows > dropped:
+            dropped = receiver.kernel_drops + receiver.overflows
+            print("Beacons dropped : {} by the kernel, {} by the receive queue".format(
+                receiver.kernel_drops, receiver.overflows))
+
+        if len(updates) == 0 and len(deletions) == 0:
+            continue
+
+        aap.set_contacts(updates, deletions)
+
+        print("{} contacts pushed, last in {:.3f}ms ({:.3f}ms receiving)".format(
+            len(updates), aap.send_latency.last * 1000, aap.recv_latency.last * 1000))
+
+
+def run_sharded_client(aap, receiver: BatchReceiver, pool: WorkerPool):
+    # Beacons are decoded by the workers, only their neighbor updates
+    # reach this thread which owns the AAP connection
+    threading.Thread(target=receiver.run_forever, daemon=True).start()
+
+    dropped = 0
+
+    while True:
+
+        (updates, deletions) = pool.get()
+
+        if receiver.kernel_drops + pool.overflows > dropped:
+            dropped = receiver.kernel_drops + pool.overflows
+            print("Beacons dropped : {} by the kernel, {} by the worker queues".format(
+                receiver.kernel_drops, pool.overflows))
+
+        if len(updates) == 0 and len(deletions) == 0:
+            continue
+
+        aap.set_contacts([
+            (eid, cla_address, [make_contact(0, duration, 1000)])
+            for (eid, cla_address, duration) in updates
+        ], deletions)
+
+        print("{} contacts pushed, {} withdrawn, last in {:.3f}ms ({:.3f}ms receiving)".format(
+            len(updates), len(deletions), aap.send_latency.last * 1000, aap.recv_latency.last * 1000))
+
+
+async def run_daemon(periods: dict = {}, jitter: float = JITTER, source_rate: float = SOURCE_RATE,
+                     controller: PeriodController = None, fast_discovery: FastDiscovery = None,
+                     probe_cla: bool = False, snapshot: Snapshot = None):
+    neighbors = NeighborTable()
+
+    async with upcn.upcn_async_sock(AAP_PREFIX+"/daemon", socket_path=socket_path) as aap:
+
+        beacons = make_beacons(aap.eid, periods, jitter, controller, fast_discovery)
+        scheduler = beacons.scheduler
+        if controller is not None:
+            controller.watch(table_counters(neighbors))
+
+        async def push(neighbor):
+            await aap.set_contact(neighbor.eid, neighbor.cla_address, contacts=[
+                make_contact(0, neighbors.contact_duration(neighbor.period), 1000)
+            ])
+
+        async def withdraw(neighbor):
+            await aap.delete_contact(neighbor.eid, neighbor.cla_address)
+
+        cla_selector = None
+        if probe_cla:
+            cla_selector = CLASelector()
+            cla_selector.start()
+            metrics.register_cla_selector(cla_selector)
+
+        admission = Admission(source_rate, 2 * source_rate)
+        handler = BeaconHandler(aap.eid, neighbors, cla_selector=cla_selector)
+        engine = BeaconEngine(scheduler, handler, push, withdraw, admission=admission)
+
+        metrics.register_aap(aap)
+        metrics.register_receiver(engine.receiver)
+        metrics.register_admission(admission)
+        metrics.register_handler(engine.handler)
+
+        if fast_discovery is not None:
+            engine.handler.on_new_neighbor = fast_discovery.reply
+            metrics.register_fast_discovery(fast_discovery)
+
+        # Groups are joined on the interfaces beacons are sent on
+        receiver = sockets.multicast_receiver(socket.AF_INET, DESTINATION_V4, DESTINATION_PORT, ())
+        engine.add_receiver(receiver)
+        beacons.add_receiver(socket.AF_INET, receiver)
+        print("Listening on IPv4 {}:{}".format(DESTINATION_V4, DESTINATION_PORT))
+
+        if socket.has_ipv6:
+            receiver = sockets.multicast_receiver(socket.AF_INET6, DESTINATION_V6, DESTINATION_PORT, ())
+            engine.add_receiver(receiver)
+            beacons.add_receiver(socket.AF_INET6, receiver)
+            print("Listening on IPv6 [{}]:{}".format(DESTINATION_V6, DESTINATION_PORT))
+
+        if snapshot is not None:
+            restored = snapshot.restore(neighbors)
+            await engine.apply(push, restored, "restore contact with")
+            snapshot.startup_to_routes = time.monotonic() - STARTED
+            print("Restored {} contacts from {} in {:.3f}ms".format(
+                len(restored), snapshot.path, snapshot.startup_to_routes * 1000))
+            scheduler.add("snapshot", snapshot.interval, lambda: snapshot.write(neighbors))
+
+        loop = asyncio.get_running_loop()
+        for signum in (signal.SIGINT, signal.SIGTERM):
+            loop.add_signal_handler(signum, engine.stop)
+
+        watcher = open_watcher()
+        if watcher is not None:
+            loop.add_reader(watcher.fileno(), watch_interfaces, beacons, watcher)
+
+        # Without µPCN every push fails, stop instead
+        aap.confirm_task.add_done_callback(lambda task: engine.stop())
+
+        try:
+            await engine.run()
+            if aap.error is not None:
+                raise aap.lost()
+        finally:
+            if watcher is not None:
+                loop.remove_reader(watcher.fileno())
+                watcher.close()
+            if cla_selector is not None:
+                cla_selector.close()
+            if snapshot is not None:
+                snapshot.write(neighbors)
+                snapshot.close()
+
+
+def parse_interface_period(value: str):
+    (iface_name, _, period) = value.partition("=")
+    return (iface_name, int(period))
+
+
+def parse_period_bounds(value: str):
+    (min_period, _, max_period) = value.partition(":")
+    return (int(min_period), int(max_period))
+
+
+def main():
+    global PERIOD
+
+    parser = argparse.ArgumentParser(description="DTN IP Neighbor Discovery for µPCN")
+    parser.add_argument("--asyncio", action="store_true",
+                        help="run emitter, receivers and AAP on a single event loop")
+    parser.add_argument("--period", type=int, default=PERIOD,
+                        help="beacon period in seconds (default: %(default)s)")
+    parser.add_argument("--interface-period", type=parse_interface_period, action="append",
+                        default=[], metavar="IFACE=SECONDS",
+                        help="beacon period of a given interface")
+    parser.add_argument("--adaptive", type=parse_period_bounds, metavar="MIN:MAX",
+                        help="adapt the beacon period to the neighborhood, within these bounds in seconds")
+    parser.add_argument("--fast-discovery", action="store_true",
+                        help="answer the first beacon of a new neighbor with ours, by unicast")
+    parser.add_argument("--probe-cla", action="store_true",
+                        help="use the CLA address of each neighbor answering TCP connections fastest")
+    parser.add_argument("--snapshot", metavar="PATH",
+                        help="save known neighbors to this file, and push their contacts again on startup")
+    parser.add_argument("--jitter", type=float, default=JITTER,
+                        help="random delay added to each beacon, as a fraction of its period (default: %(default)s)")
+    parser.add_argument("--source-rate", type=float, default=SOURCE_RATE,
+                        help="beacons per second accepted from a source address, in bursts of twice that (default: %(default)s)")
+    parser.add_argument("--workers", type=int, default=0,
+                        help="decode beacons in this many worker processes (default: in the client thread)")
+    parser.add_argument("--metrics", metavar="[HOST:]PORT|PATH",
+                        help="serve Prometheus metrics over HTTP on this TCP port or UNIX socket")
+    args = parser.parse_args()
+
+    # Timers divide by their period
+    if args.period < 1:
+        parser.error("--period must be at least 1 second")
+    if any(period < 1 for (_, period) in args.interface_period):
+        parser.error("--interface-period must be at least 1 second")
+    if args.adaptive is not None and not 1 <= args.adaptive[0] <= args.adaptive[1]:
+        parser.error("--adaptive bounds must satisfy 1 <= MIN <= MAX")
+
+    PERIOD = args.period
+    periods = dict(args.interface_period)
+
+    if args.metrics is not None:
+        metrics.serve_metrics(args.metrics)
+        print("Serving metrics on {}".format(args.metrics))
+
+    controller = None
+    if args.adaptive is not None:
+        controller = PeriodController(PERIOD, *args.adaptive)
+
+    if args.asyncio and args.workers > 0:
+        parser.error("--workers is not supported with --asyncio")
+
+    fast_discovery = None
+    if args.fast_discovery:
+        if args.workers > 0:
+            parser.error("--fast-discovery is not supported with --workers")
+        fast_discovery = FastDiscovery(DESTINATION_PORT)
+
+    snapshot = None
+    if args.snapshot is not None:
+        if args.workers > 0:
+            parser.error("--snapshot is not supported with --workers")
+        snapshot = Snapshot(args.snapshot)
+        snapshot.open()
+        metrics.register_snapshot(snapshot)
+
+    if args.asyncio:
+        asyncio.run(run_daemon(periods, args.jitter, args.source_rate, controller, fast_discovery,
+                               args.probe_cla, snapshot))
+        return
+
+    server_thread = threading.Thread(target=start_beacon_server,
+                                     args=(periods, args.jitter, controller, fast_discovery))
+    client_thread = threading.Thread(target=start_beacon_client,
+                                     args=(args.workers, args.source_rate, controller, fast_discovery,
+                                           args.probe_cla, snapshot))
+
+    server_thread.start()
+    client_thread.start()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,8 +1,16 @@
 import socket
 from .aap import UPCNAAP
+from .aio import AsyncUPCNAAP
 
 
 def upcn_sock(eid_suffix, socket_path: str = "/tmp/upcn.socket"):
     sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
     sock.connect(socket_path)
     return UPCNAAP(sock, eid_suffix)
+
+
+def upcn_async_sock(eid_suffix, socket_path: str = "/tmp/upcn.socket"):
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    sock.connect(socket_path)
+    sock.setblocking(False)
+    return AsyncUPCNAAP(sock, eid_suffix)
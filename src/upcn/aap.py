@@ -1,15 +1,89 @@
+import bisect
 import socket
+import time
 import uuid
-from pyupcn.aap import AAPMessage, AAPMessageType, InsufficientAAPDataError
+from collections import deque
+from pyupcn.aap import AAPMessage, AAPMessageType
 from pyupcn.agents import ConfigMessage, RouterCommand
 
+RECV_BUFSIZE = 4096
+PIPELINE_WINDOW = 16
+# Histogram bucket upper bounds in seconds, from 100us to 5s
+LATENCY_BUCKETS = (1e-4, 2.5e-4, 5e-4, 1e-3, 2.5e-3, 5e-3, 1e-2,
+                   2.5e-2, 5e-2, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+EID_MESSAGE_TYPES = (AAPMessageType.REGISTER, AAPMessageType.SENDBUNDLE,
+                     AAPMessageType.RECVBUNDLE, AAPMessageType.WELCOME)
+PAYLOAD_MESSAGE_TYPES = (AAPMessageType.SENDBUNDLE, AAPMessageType.RECVBUNDLE)
+BUNDLE_ID_MESSAGE_TYPES = (AAPMessageType.SENDCONFIRM, AAPMessageType.CANCELBUNDLE)
+
+
+def aap_frame_length(buf):
+    # Length of the AAP message at the start of buf, or None while the
+    # header fields giving it are not fully received
+    if len(buf) < 1:
+        return None
+
+    msg_type = buf[0] & 0x0F
+    length = 1
+
+    if msg_type in EID_MESSAGE_TYPES:
+        if len(buf) < length + 2:
+            return None
+        length += 2 + int.from_bytes(buf[length:length+2], 'big')
+
+    if msg_type in PAYLOAD_MESSAGE_TYPES:
+        if len(buf) < length + 8:
+            return None
+        length += 8 + int.from_bytes(buf[length:length+8], 'big')
+
+    if msg_type in BUNDLE_ID_MESSAGE_TYPES:
+        length += 8
+
+    return length
+
+
+class LatencyStats:
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.last = 0.0
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+
+    def add(self, seconds: float):
+        self.counts[bisect.bisect_left(self.buckets, seconds)] += 1
+        self.count += 1
+        self.total += seconds
+        self.last = seconds
+        if seconds > self.max:
+            self.max = seconds
+
+    @property
+    def mean(self) -> float:
+        return self.total / self.count if self.count > 0 else 0.0
+
+    def __repr__(self):
+        return "LatencyStats {{ count={}, mean={:.3f}ms, max={:.3f}ms, last={:.3f}ms }}".format(
+            self.count, self.mean * 1000, self.max * 1000, self.last * 1000)
+
 
 class UPCNAAP:
 
-    def __init__(self, socket, eid_suffix=None):
+    def __init__(self, socket, eid_suffix=None, window=PIPELINE_WINDOW):
         self.socket = socket
         self.eid_suffix = eid_suffix if eid_suffix is not None else str(
             uuid.uuid4())
+        self.buffer = bytearray()
+        self.window = window
+        # Send times of bundles still waiting for their SENDCONFIRM, µPCN
+        # confirms them in the order they were sent
+        self.pending = deque()
+        self.confirmed = []
+        self.recv_latency = LatencyStats()
+        self.send_latency = LatencyStats()
 
     def __enter__(self):
         msg_welcome = self.recv()
@@ -30,24 +104,58 @@ class UPCNAAP:
         return self
 
     def recv(self):
-        buf = bytearray()
-        msg = None
-        while msg is None:
-            buf += self.socket.recv(1)
-            try:
-                msg = AAPMessage.parse(buf)
-            except InsufficientAAPDataError:
-                continue
+        start = time.monotonic()
+
+        length = aap_frame_length(self.buffer)
+        while length is None or len(self.buffer) < length:
+            data = self.socket.recv(RECV_BUFSIZE)
+            if not data:
+                raise ConnectionError("AAP connection closed by µPCN")
+            self.buffer += data
+            length = aap_frame_length(self.buffer)
+
+        msg = AAPMessage.parse(bytes(self.buffer[:length]))
+        del self.buffer[:length]
+
+        self.recv_latency.add(time.monotonic() - start)
         return msg
 
     def send(self, destination, bundle):
+        self.flush()
+
+        start = time.monotonic()
         self.socket.send(AAPMessage(AAPMessageType.SENDBUNDLE,
                                     destination,
                                     bundle).serialize())
         msg_sendconfirm = self.recv()
         assert msg_sendconfirm.msg_type == AAPMessageType.SENDCONFIRM
+        self.send_latency.add(time.monotonic() - start)
+
+    def send_pipelined(self, destination, bundle):
+        while len(self.pending) >= self.window:
+            self.wait_confirm()
 
-    def set_contact(self, other_eid: str, cla_address: str, contacts=[], reachable_eids=[]):
+        self.socket.send(AAPMessage(AAPMessageType.SENDBUNDLE,
+                                    destination,
+                                    bundle).serialize())
+        self.pending.append(time.monotonic())
+
+    def wait_confirm(self):
+        msg_sendconfirm = self.recv()
+        assert msg_sendconfirm.msg_type == AAPMessageType.SENDCONFIRM
+        self.send_latency.add(time.monotonic() - self.pending.popleft())
+        self.confirmed.append(msg_sendconfirm.bundle_id)
+
+    def flush(self):
+        # Returns the ids of the bundles confirmed since the last flush
+        while len(self.pending) > 0:
+            self.wait_confirm()
+
+        bundle_ids = self.confirmed
+        self.confirmed = []
+        return bundle_ids
+
+    def set_contact(self, other_eid: str, cla_address: str, contacts=[], reachable_eids=[], pipelined=False):
         config_msg = bytes(ConfigMessage(
             other_eid,
             cla_address,
@@ -55,4 +163,33 @@ class UPCNAAP:
             reachable_eids=reachable_eids,
             type=RouterCommand.UPDATE
         ))
-        self.send(self.eid + "/config", config_msg)
+
+        if pipelined:
+            self.send_pipelined(self.eid + "/config", config_msg)
+        else:
+            self.send(self.eid + "/config", config_msg)
+
+    def delete_contact(self, other_eid: str, cla_address: str, pipelined=False):
+        # Removes the node and its remaining contacts from the µPCN router
+        config_msg = bytes(ConfigMessage(
+            other_eid,
+            cla_address,
+            type=RouterCommand.DELETE
+        ))
+
+        if pipelined:
+            self.send_pipelined(self.eid + "/config", config_msg)
+        else:
+            self.send(self.eid + "/config", config_msg)
+
+    def set_contacts(self, updates, deletions=()):
+        # updates are (other_eid, cla_address, contacts) tuples, deletions
+        # (other_eid, cla_address) tuples, all pushed before waiting for
+        # their confirmations
+        for (other_eid, cla_address, contacts) in updates:
+            self.set_contact(other_eid, cla_address, contacts, pipelined=True)
+
+        for (other_eid, cla_address) in deletions:
+            self.delete_contact(other_eid, cla_address, pipelined=True)
+
+        return self.flush()
@@ -0,0 +1,131 @@
+import asyncio
+import time
+import uuid
+from collections import deque
+from pyupcn.aap import AAPMessage, AAPMessageType
+from pyupcn.agents import ConfigMessage, RouterCommand
+from .aap import aap_frame_length, LatencyStats, RECV_BUFSIZE, PIPELINE_WINDOW
+
+
+class AsyncUPCNAAP:
+    """
+    asyncio counterpart of `UPCNAAP`.
+
+    Once registered, a reader task resolves the SENDCONFIRM of each
+    bundle in send order, so concurrent `send` calls are pipelined up to
+    `window` outstanding bundles. When the reader fails, its error is kept
+    in `error` and every pending or later `send` raises it.
+    """
+
+    def __init__(self, socket, eid_suffix=None, window=PIPELINE_WINDOW):
+        self.socket = socket
+        self.eid_suffix = eid_suffix if eid_suffix is not None else str(
+            uuid.uuid4())
+        self.buffer = bytearray()
+        self.window = asyncio.Semaphore(window)
+        self.pending = deque()
+        self.recv_latency = LatencyStats()
+        self.send_latency = LatencyStats()
+        self.reader = None
+        self.writer = None
+        self.confirm_task = None
+        self.error = None
+
+    async def __aenter__(self):
+        (self.reader, self.writer) = await asyncio.open_unix_connection(sock=self.socket)
+
+        msg_welcome = await self.recv()
+        assert msg_welcome.msg_type == AAPMessageType.WELCOME
+        self.eid = msg_welcome.eid
+
+        self.writer.write(AAPMessage(AAPMessageType.REGISTER,
+                                     self.eid_suffix).serialize())
+        msg_ack = await self.recv()
+        assert msg_ack.msg_type == AAPMessageType.ACK
+
+        self.confirm_task = asyncio.create_task(self.read_confirms())
+
+        return self
+
+    async def __aexit__(self, *args):
+        self.confirm_task.cancel()
+        self.writer.close()
+        await self.writer.wait_closed()
+
+        return False
+
+    async def recv(self):
+        start = time.monotonic()
+
+        length = aap_frame_length(self.buffer)
+        while length is None or len(self.buffer) < length:
+            data = await self.reader.read(RECV_BUFSIZE)
+            if not data:
+                raise ConnectionError("AAP connection closed by µPCN")
+            self.buffer += data
+            length = aap_frame_length(self.buffer)
+
+        msg = AAPMessage.parse(bytes(self.buffer[:length]))
+        del self.buffer[:length]
+
+        self.recv_latency.add(time.monotonic() - start)
+        return msg
+
+    async def read_confirms(self):
+        try:
+            while True:
+                msg = await self.recv()
+                if msg.msg_type != AAPMessageType.SENDCONFIRM:
+                    print("Unexpected AAP message {}".format(msg.msg_type))
+                    continue
+
+                (future, start) = self.pending.popleft()
+                self.send_latency.add(time.monotonic() - start)
+                if not future.done():
+                    future.set_result(msg.bundle_id)
+
+        except Exception as e:
+            print("AAP connection lost : {}".format(e))
+            self.error = e
+            while len(self.pending) > 0:
+                (future, _) = self.pending.popleft()
+                if not future.done():
+                    future.set_exception(self.lost())
+
+    def lost(self):
+        return ConnectionError("AAP connection lost : {}".format(self.error))
+
+    async def send(self, destination, bundle):
+        if self.error is not None:
+            raise self.lost()
+
+        async with self.window:
+            if self.error is not None:
+                raise self.lost()
+            future = asyncio.get_running_loop().create_future()
+
+            self.writer.write(AAPMessage(AAPMessageType.SENDBUNDLE,
+                                         destination,
+                                         bundle).serialize())
+            self.pending.append((future, time.monotonic()))
+
+            await self.writer.drain()
+            return await future
+
+    async def set_contact(self, other_eid: str, cla_address: str, contacts=[], reachable_eids=[]):
+        config_msg = bytes(ConfigMessage(
+            other_eid,
+            cla_address,
+            contacts=contacts,
+            reachable_eids=reachable_eids,
+            type=RouterCommand.UPDATE
+        ))
+        return await self.send(self.eid + "/config", config_msg)
+
+    async def delete_contact(self, other_eid: str, cla_address: str):
+        config_msg = bytes(ConfigMessage(
+            other_eid,
+            cla_address,
+            type=RouterCommand.DELETE
+        ))
+        return await self.send(self.eid + "/config", config_msg)
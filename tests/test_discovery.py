@@ -0,0 +1,99 @@
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+from ipnd.admission import check_header
+from ipnd.discovery import BeaconHandler, DuplicateFilter
+from ipnd.message import IPNDMessage
+from ipnd.neighbors import NeighborTable
+from ipnd.service import TCPCLService
+
+
+def make_beacon(eid: str, period: int = None, sequence_number: int = 1) -> bytes:
+    message = IPNDMessage()
+    message.eid = eid
+    message.period = period
+    message.sequence_number = sequence_number
+    message.services = (TCPCLService("10.0.0.1", 4556),)
+    return message.encode()
+
+
+class PeriodlessBeaconTest(unittest.TestCase):
+
+    def test_rejected_by_admission(self):
+        self.assertEqual(check_header(make_beacon("dtn://neighbor.dtn")), "period")
+        self.assertIsNone(check_header(make_beacon("dtn://neighbor.dtn", 3)))
+
+    def test_shortest_beacon_has_a_period(self):
+        # Version, EID and period flags, sequence number, one byte EID
+        self.assertEqual(check_header(bytes([0x04, 0b00001001, 0, 1, 1]) + b"a"), "length")
+        self.assertIsNone(check_header(bytes([0x04, 0b00001001, 0, 1, 1]) + b"a" + bytes([3])))
+
+    def test_rejected_by_handler(self):
+        neighbors = NeighborTable()
+        handler = BeaconHandler("dtn://self.dtn", neighbors)
+
+        self.assertIsNone(handler.handle(make_beacon("dtn://neighbor.dtn"), ("127.0.0.1", 3003)))
+        self.assertEqual(handler.rejected, 1)
+        self.assertNotIn("dtn://neighbor.dtn", neighbors)
+        self.assertEqual(neighbors.expiry_heap, [])
+
+        # The next beacon of the neighbor is still handled
+        neighbor = handler.handle(make_beacon("dtn://neighbor.dtn", 3), ("127.0.0.1", 3003))
+        self.assertEqual(neighbor.eid, "dtn://neighbor.dtn")
+        self.assertEqual(neighbor.period, 3)
+
+    def test_table_raises_without_period(self):
+        neighbors = NeighborTable()
+
+        with self.assertRaises(Exception):
+            neighbors.update("dtn://neighbor.dtn", "tcpclv3:10.0.0.1:4556", None)
+        self.assertEqual(len(neighbors), 0)
+
+
+class DuplicateTest(unittest.TestCase):
+
+    def test_restarted_neighbor_is_not_a_duplicate(self):
+        neighbors = NeighborTable()
+        handler = BeaconHandler("dtn://self.dtn", neighbors)
+
+        for i in range(100):
+            handler.handle(make_beacon("dtn://neighbor.dtn", 3, i), ("127.0.0.1", 3003))
+        last_seen = neighbors.get("dtn://neighbor.dtn").last_seen
+
+        # Sequence numbers start over from 0
+        for i in range(20):
+            handler.handle(make_beacon("dtn://neighbor.dtn", 3, i), ("127.0.0.1", 3003))
+
+        neighbor = neighbors.get("dtn://neighbor.dtn")
+        self.assertEqual(handler.duplicates, 0)
+        self.assertEqual(neighbor.sequence_number, 19)
+        self.assertGreater(neighbor.last_seen, last_seen)
+
+    def test_copies_refresh_the_neighbor(self):
+        neighbors = NeighborTable()
+        handler = BeaconHandler("dtn://self.dtn", neighbors)
+        beacon = make_beacon("dtn://neighbor.dtn", 3)
+
+        self.assertIsNotNone(handler.handle(beacon, ("127.0.0.1", 3003)))
+        last_seen = neighbors.get("dtn://neighbor.dtn").last_seen
+        # Its contact is about to expire, the copy is not skipped by refresh
+        neighbors.get("dtn://neighbor.dtn").contact_expiry = last_seen
+
+        self.assertIsNone(handler.handle(beacon, ("::1", 3003)))
+        self.assertEqual(handler.duplicates, 1)
+        self.assertGreater(neighbors.get("dtn://neighbor.dtn").last_seen, last_seen)
+
+    def test_keys_expire(self):
+        duplicates = DuplicateFilter()
+
+        self.assertFalse(duplicates.seen("key", 0.0, 3))
+        self.assertTrue(duplicates.seen("key", 2.0, 3))
+        self.assertFalse(duplicates.seen("key", 3.5, 3))
+        self.assertTrue(duplicates.seen("key", 4.0, 3))
+
+
+if __name__ == "__main__":
+    unittest.main()
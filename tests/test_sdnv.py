@@ -0,0 +1,47 @@
+import os
+import random
+import sys
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+from ipnd.sdnv import SDNV, SDNVUtil, SDNVValueError
+
+
+class DecodeManyTest(unittest.TestCase):
+
+    def test_matches_decode(self):
+        rng = random.Random(1)
+        values = [0, 1, 127, 128, 16383, 16384, 2**32 - 1] + [rng.randrange(2**32) for _ in range(200)]
+        encoded = b"\x07" + b"".join(SDNVUtil.encode(value) for value in values) + b"\x07"
+
+        (numbers, offset) = SDNVUtil.decode_many(encoded, 1, len(values))
+
+        self.assertEqual(numbers, values)
+        self.assertEqual(offset, len(encoded) - 1)
+
+        expected = []
+        offset = 1
+        for _ in values:
+            (number, num_bytes) = SDNVUtil.decode(encoded, offset)
+            expected.append(number)
+            offset += num_bytes
+        self.assertEqual(numbers, expected)
+
+    def test_no_values(self):
+        self.assertEqual(SDNVUtil.decode_many(b"", 0, 0), ([], 0))
+
+    def test_raises_above_max(self):
+        sdnv = SDNV(1000)
+
+        self.assertEqual(sdnv.decode_many(sdnv.encode(1000) * 2, 0, 2), ([1000, 1000], 4))
+        for value in (1001, 2**20, 2**40):
+            encoded = sdnv.encode(3) + SDNV(2**64).encode(value)
+            with self.assertRaises(SDNVValueError):
+                sdnv.decode(encoded, 1)
+            with self.assertRaises(SDNVValueError):
+                sdnv.decode_many(encoded, 0, 2)
+
+
+if __name__ == "__main__":
+    unittest.main()